@@ -0,0 +1,70 @@
+"""Benchmark Database.insert_offers_bulk throughput on a file database.
+
+Inserts --offers generated offers between 200 cities in batches of
+--batch-size, as the ingest pipeline does, into a fresh database in a
+temporary directory, and reports offers per second. Afterwards the
+per-city daily counts in city_offer_counts are checked against a direct
+COUNT over offers.
+
+Usage: python benchmarks/bulk_insert.py [--offers 200000] [--batch-size 1000] [--runs 3]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+
+def generate_offers(city_ids, count, seed):
+    """Offers with distinct LF numbers, so none of them is a duplicate."""
+    rng = random.Random(seed)
+    offers = []
+    for i in range(count):
+        a, b = rng.sample(city_ids, 2)
+        offers.append({"source": "whatsapp", "sender": f"Group {i % 50}", "loading_city_id": a,
+                       "unloading_city_id": b, "price": rng.randint(200, 2500), "lf_number": f"LF{seed}-{i}",
+                       "distance": rng.uniform(50, 900), "additional_info": "tail lift"})
+    return offers
+
+def run(workdir, offers, batch_size, seed):
+    """Insert the offers into a new database and return (seconds, counts consistent)."""
+    db = Database(os.path.join(workdir, f"bulk_{seed}.db"))
+    rng = random.Random(seed)
+    city_ids = [db.insert_city(f"City {i}", "DE", rng.uniform(47.5, 54.5), rng.uniform(6.0, 14.5))
+                for i in range(200)]
+    rows = generate_offers(city_ids, offers, seed)
+    start = time.perf_counter()
+    for i in range(0, len(rows), batch_size):
+        db.insert_offers_bulk(rows[i:i + batch_size])
+    elapsed = time.perf_counter() - start
+    db.cursor.execute("SELECT loading_city_id, substr(timestamp, 1, 10), COUNT(*) FROM offers GROUP BY 1, 2")
+    actual = set(db.cursor.fetchall())
+    db.cursor.execute("SELECT city_id, day, count FROM city_offer_counts WHERE count > 0")
+    consistent = set(db.cursor.fetchall()) == actual
+    db.close()
+    return elapsed, consistent
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--offers", type=int, default=200000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        results = [run(workdir, args.offers, args.batch_size, seed) for seed in range(args.runs)]
+    rates = [args.offers / elapsed for elapsed, _ in results]
+    print(f"{args.offers} offers in batches of {args.batch_size}: median {statistics.median(rates):,.0f} offers/s"
+          f"  (min {min(rates):,.0f}, max {max(rates):,.0f})")
+    if not all(consistent for _, consistent in results):
+        print("city_offer_counts does not match the offers")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+"""Benchmark CLI start-up: time to import main and time until the menu is shown.
+
+Starts main.py in a fresh interpreter several times against a database in
+a temporary directory holding --offers active offers between 200 cities,
+so start-up work that grows with the data shows up, with the mail, routing
+and geocoding
+servers pointed at unreachable addresses, and measures how long it takes
+until the menu is printed. Start-up must not touch the network, so this
+also checks that the menu comes up offline. The slowest imports of one
+run are listed from python -X importtime.
+
+Exits with status 1 if the median time to the menu exceeds the budget.
+
+Usage: python benchmarks/startup.py [--runs 5] [--budget-ms 200] [--offers 100000]
+"""
+import argparse
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+MENU_MARKER = "=== CargoBot Menu ==="
+
+def offline_env(workdir):
+    """Environment for a child process that cannot reach any server."""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [ROOT, env.get("PYTHONPATH")]))
+    env.update({
+        "CARGO_DB_PATH": os.path.join(workdir, "startup.db"),
+        "EMAIL_SERVER": "127.0.0.1.invalid",
+        "OSRM_URL": "http://127.0.0.1:9",
+        "WEB_PLATFORM_URL": "http://127.0.0.1:9",
+        "LLM_CACHE_DIR": os.path.join(workdir, "llm_cache"),
+    })
+    return env
+
+def populate(path, offers, cities=200):
+    """Fill a new database with cities and active offers between them."""
+    from database import Database
+
+    rng = random.Random(42)
+    db = Database(path)
+    city_ids = [db.insert_city(f"City {i}", "DE", rng.uniform(47.5, 54.5), rng.uniform(6.0, 14.5))
+                for i in range(cities)]
+    rows = []
+    for i in range(offers):
+        a, b = rng.sample(city_ids, 2)
+        rows.append({"source": "whatsapp", "sender": f"Group {i % 50}", "loading_city_id": a,
+                     "unloading_city_id": b, "price": rng.randint(200, 2500), "lf_number": f"LF{i}",
+                     "distance": rng.uniform(50, 900)})
+    db.insert_offers_bulk(rows)
+    db.close()
+
+def time_to_menu(workdir, env):
+    """Seconds from process start until the menu is printed, then exit through option 0."""
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-u", os.path.join(ROOT, "main.py")], cwd=workdir, env=env,
+                               stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                               text=True)
+    elapsed = None
+    for line in process.stdout:
+        if MENU_MARKER in line:
+            elapsed = time.perf_counter() - start
+            break
+    process.communicate("0\n", timeout=30)
+    if elapsed is None:
+        raise RuntimeError("main.py exited without showing the menu")
+    return elapsed
+
+def time_to_run(workdir, env, code):
+    """Seconds to start an interpreter and run a snippet."""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], cwd=workdir, env=env, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+def slowest_imports(workdir, env, count=8):
+    """Top-level-ish modules with the largest cumulative import time, from -X importtime."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], cwd=workdir, env=env,
+                            capture_output=True, text=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        rows.append((int(cumulative), name.rstrip()))
+    return sorted(rows, reverse=True)[:count]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=200)
+    parser.add_argument("--offers", type=int, default=100000, help="active offers in the benchmark database")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        env = offline_env(workdir)
+        populate(env["CARGO_DB_PATH"], args.offers)
+        print(f"database: {args.offers} offers, {os.path.getsize(env['CARGO_DB_PATH']) / 2 ** 20:.1f} MiB")
+        time_to_menu(workdir, env)  # first run compiles bytecode
+        baseline = [time_to_run(workdir, env, "pass") for _ in range(args.runs)]
+        imports = [time_to_run(workdir, env, "import main") for _ in range(args.runs)]
+        menus = [time_to_menu(workdir, env) for _ in range(args.runs)]
+        print(f"interpreter:  median {1000 * statistics.median(baseline):6.1f} ms  max {1000 * max(baseline):6.1f} ms")
+        print(f"import main:  median {1000 * statistics.median(imports):6.1f} ms  max {1000 * max(imports):6.1f} ms")
+        print(f"menu shown:   median {1000 * statistics.median(menus):6.1f} ms  max {1000 * max(menus):6.1f} ms"
+              f"  (budget {args.budget_ms:.0f} ms)")
+        print("slowest imports (cumulative):")
+        for micros, name in slowest_imports(workdir, env):
+            print(f"  {micros / 1000:7.1f} ms  {name}")
+    if 1000 * statistics.median(menus) > args.budget_ms:
+        print("over budget")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+"""Benchmark sequential vs. parallel parsing of a large WhatsApp export.
+
+Generates a synthetic export and times the streaming line parser (one core)
+against parse_whatsapp_file_parallel for 1, 2, 4, ... workers up to the
+core count, checking that every run returns the same offers in order.
+
+With --sizes, exports of each size in MiB are timed instead, sequential
+against parallel with the default worker count, and the smallest size from
+which the parallel parser stays at least MARGIN faster is suggested as
+WHATSAPP_PARALLEL_MIN_BYTES.
+
+Usage: python benchmarks/whatsapp_parse.py [--messages 1000000] [--max-workers N]
+       python benchmarks/whatsapp_parse.py --sizes 1,4,16,64,256 [--repeat 3]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import config
+from whatsapp_parser import iter_messages, parse_whatsapp_file_parallel, parse_whatsapp_message
+
+MARGIN = 0.1  # speed-up the parallel parser needs over the sequential one to count as faster
+CITIES = ["Berlin", "Hamburg", "Munich", "Cologne", "Frankfurt", "Stuttgart", "Leipzig", "Dresden", "Vienna", "Prague"]
+
+def write_export(path, messages):
+    """Write a synthetic export with a mix of offers, chatter and multi-line messages."""
+    rng = random.Random(42)
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(messages):
+            kind = rng.random()
+            if kind < 0.6:
+                a, b = rng.sample(CITIES, 2)
+                f.write(f"[Group {i % 50}] Load from {a} to {b}, {rng.randint(200, 2500)}€, LF{rng.randint(1, 13)}, today, tail lift\n")
+            elif kind < 0.8:
+                f.write(f"[Group {i % 50}] Anyone with a free truck near {rng.choice(CITIES)} tomorrow?\n")
+            else:
+                a, b = rng.sample(CITIES, 2)
+                f.write(f"[Group {i % 50}] Load from {a} to {b}, {rng.randint(200, 2500)}€\nloading ramp available\ncall before 10\n")
+
+def parse_sequential(path):
+    """Parse an export the way stream_whatsapp_offers reads it, one message at a time."""
+    with open(path, "rb") as f:
+        return [offer for offer in map(parse_whatsapp_message, (m for m, _ in iter_messages(f))) if offer]
+
+def best_time(function, path, repeat):
+    """Fastest of repeat runs of function(path), and its last result."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(path)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def sweep(path, sizes, repeat):
+    """Time both parsers on exports of the given sizes and print the suggested threshold."""
+    write_export(path, 10000)
+    bytes_per_message = os.path.getsize(path) / 10000
+    workers = config["whatsapp_workers"] or os.cpu_count() or 1
+    print(f"{os.cpu_count()} cores, {workers} workers, best of {repeat}")
+    faster = []
+    for size in sizes:
+        write_export(path, max(1, int(size * 2 ** 20 / bytes_per_message)))
+        sequential, expected = best_time(parse_sequential, path, repeat)
+        parallel, (offers, _) = best_time(lambda p: parse_whatsapp_file_parallel(p, workers=workers), path, repeat)
+        status = "ok" if offers == expected else "MISMATCH"
+        print(f"{os.path.getsize(path) / 2 ** 20:8.1f} MiB: sequential {sequential:7.3f}s  "
+              f"parallel {parallel:7.3f}s  speed-up {sequential / parallel:4.2f}x  {status}")
+        faster.append((os.path.getsize(path), sequential / parallel >= 1 + MARGIN))
+    threshold = None
+    for size, parallel_faster in reversed(faster):
+        if not parallel_faster:
+            break
+        threshold = size
+    if threshold is None:
+        print(f"The parallel parser was not {MARGIN:.0%} faster at the largest size; keep the threshold above it.")
+    else:
+        print(f"Suggested WHATSAPP_PARALLEL_MIN_BYTES={threshold}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=1000000)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--sizes", help="comma-separated export sizes in MiB to sweep")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per size in the sweep, the fastest counts")
+    args = parser.parse_args()
+
+    fd, path = tempfile.mkstemp(suffix=".txt")
+    os.close(fd)
+    try:
+        if args.sizes:
+            sweep(path, [float(size) for size in args.sizes.split(",")], args.repeat)
+            return
+        write_export(path, args.messages)
+        print(f"{args.messages} messages, {os.path.getsize(path) / 2 ** 20:.1f} MiB, {os.cpu_count()} cores")
+        start = time.perf_counter()
+        expected = parse_sequential(path)
+        baseline = time.perf_counter() - start
+        print(f"{'sequential':>12}: {baseline:6.2f}s  {len(expected)} offers")
+        workers = 1
+        while workers <= args.max_workers:
+            start = time.perf_counter()
+            offers, _ = parse_whatsapp_file_parallel(path, workers=workers)
+            elapsed = time.perf_counter() - start
+            status = "ok" if offers == expected else "MISMATCH"
+            print(f"{workers:>4} workers: {elapsed:6.2f}s  speed-up {baseline / elapsed:4.1f}x  {status}")
+            workers *= 2
+    finally:
+        os.remove(path)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+from config import config
+from fuzzy_matcher import TrigramIndex, normalize_name
+import logging
+import threading
+import time
+import weakref
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(levelname)s - %(message)s",
+    handlers=[logging.FileHandler("cargobot.log"), logging.StreamHandler()]
+)
+
+_geolocator = None
+_resolvers = weakref.WeakKeyDictionary()
+_resolvers_lock = threading.Lock()
+
+def get_city_resolver(db):
+    """Return the process-wide CityResolver for a database, creating it on first use.
+
+    Args:
+        db (Database): Database instance.
+
+    Returns:
+        CityResolver: Shared resolver.
+    """
+    with _resolvers_lock:
+        resolver = _resolvers.get(db)
+        if resolver is None:
+            resolver = CityResolver(db)
+            _resolvers[db] = resolver
+        return resolver
+
+def get_geolocator():
+    """Return the shared Nominatim geocoder, creating it on first use.
+
+    geopy is only imported here, so start-up does not pay for it until a
+    name actually has to be geocoded.
+
+    Returns:
+        Nominatim: Geocoder.
+    """
+    global _geolocator
+    with _resolvers_lock:
+        if _geolocator is None:
+            from geopy.geocoders import Nominatim
+            _geolocator = Nominatim(user_agent="cargobot", timeout=config["geocode_timeout"])
+        return _geolocator
+
+class CityResolver:
+    """Resolves city names to city rows, shared by everything in the process.
+
+    All cities and aliases are bulk-loaded into memory on the first lookup,
+    so known names never touch the database. A name missing from memory is
+    looked up in the database before anything else, in case another
+    process stored it since. Unknown names go to Nominatim at most
+    once per min_interval seconds, and names Nominatim cannot resolve are
+    remembered for negative_ttl seconds so a misspelling does not trigger a
+    lookup every time it appears.
+
+    Before geocoding, a name is matched against normalized keys and a
+    trigram index of every known name and alias. A known normalized key
+    always matches; an approximate trigram match is only accepted if it
+    scores at least fuzzy_threshold, beats the best other city by
+    fuzzy_margin, the name has at least fuzzy_min_length characters and
+    is not just the first word(s) of a longer known name ("Frankfurt" vs.
+    "Frankfurt (Oder)"). Fuzzy matches are not stored as aliases; only a
+    geocoder answer is.
+    """
+    def __init__(self, db, geocoder=None, negative_ttl=None, min_interval=None, fuzzy_threshold=None,
+                 fuzzy_margin=None, fuzzy_min_length=None):
+        """Initialize the resolver; cities and aliases are loaded on first use.
+
+        Args:
+            db (Database): Database instance.
+            geocoder (optional): geopy-style geocoder, defaults to Nominatim.
+            negative_ttl (float, optional): Seconds an unresolved name is remembered.
+            min_interval (float, optional): Minimum seconds between geocoder requests.
+            fuzzy_threshold (float, optional): Minimum trigram similarity for a local match.
+            fuzzy_margin (float, optional): Minimum lead of a local match over the
+                best match to another city.
+            fuzzy_min_length (int, optional): Shortest normalized name matched locally.
+        """
+        self.db = db
+        self.geocoder = geocoder
+        self.negative_ttl = config["geocode_negative_ttl"] if negative_ttl is None else negative_ttl
+        self.min_interval = config["geocode_min_interval"] if min_interval is None else min_interval
+        self.fuzzy_threshold = config["fuzzy_match_threshold"] if fuzzy_threshold is None else fuzzy_threshold
+        self.fuzzy_margin = config["fuzzy_match_margin"] if fuzzy_margin is None else fuzzy_margin
+        self.fuzzy_min_length = config["fuzzy_min_length"] if fuzzy_min_length is None else fuzzy_min_length
+        self.cities = {}  # city_id -> (id, name, country_code, lat, lon)
+        self.names = {}  # name or alias -> city_id
+        self.negative = {}  # name -> monotonic expiry
+        self.fuzzy = TrigramIndex()  # normalized name -> city_id
+        self.hits = 0
+        self.fuzzy_hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+        self.geocoded = 0
+        self._last_request = 0.0
+        self._lock = threading.RLock()
+        self._geocode_lock = threading.Lock()
+        self._loaded = False
+
+    def load(self):
+        """(Re)load all cities and aliases from the database."""
+        cities = self.db.get_all_cities()
+        aliases = self.db.get_all_aliases()
+        with self._lock:
+            self.cities = {city[0]: city for city in cities}
+            self.names = {}
+            for city in cities:
+                if city[1] is not None:
+                    self.names.setdefault(city[1], city[0])
+            # Aliases win over names, matching the alias-first lookup order.
+            for alias, city_id in aliases:
+                if city_id in self.cities:
+                    self.names[alias] = city_id
+            self.fuzzy = TrigramIndex()
+            for name, city_id in self.names.items():
+                self._index(name, city_id)
+            self._loaded = True
+        logging.info(f"City resolver loaded {len(self.cities)} cities and {len(aliases)} aliases.")
+
+    def resolve(self, city_name):
+        """Resolve a city name from memory, falling back to the geocoder.
+
+        Args:
+            city_name (str): The name of the city to resolve.
+
+        Returns:
+            tuple: City data (id, name, country_code, lat, lon) or None if not found.
+        """
+        with self._lock:
+            if not self._loaded:
+                self.load()
+            city = self._lookup(city_name) or self._lookup_db(city_name)
+            if city:
+                self.hits += 1
+                return city
+            city = self._fuzzy_lookup(city_name)
+            if city:
+                self.fuzzy_hits += 1
+                return city
+            expiry = self.negative.get(city_name)
+            if expiry and expiry > time.monotonic():
+                self.negative_hits += 1
+                return None
+            self.misses += 1
+        return self._geocode(city_name)
+
+    def stats(self):
+        """Resolver counters.
+
+        Returns:
+            dict: Exact and fuzzy hits, misses, negative-cache hits, geocoder calls and known names.
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "fuzzy_hits": self.fuzzy_hits,
+                "misses": self.misses,
+                "negative_hits": self.negative_hits,
+                "geocoded": self.geocoded,
+                "names": len(self.names)
+            }
+
+    def _lookup(self, city_name):
+        """Look a name up in memory."""
+        city_id = self.names.get(city_name)
+        return self.cities.get(city_id) if city_id is not None else None
+
+    def _lookup_db(self, city_name):
+        """Look a name up in the database and keep what is found in memory.
+
+        Catches cities and aliases stored by another process, or by another
+        resolver, since the names were loaded.
+        """
+        city = self.db.get_city_by_alias(city_name) or self.db.get_city_by_name(city_name)
+        if city:
+            self._add_city(city)
+            self.names[city_name] = city[0]
+            self._index(city_name, city[0])
+        return city
+
+    def _add_city(self, city):
+        """Keep a city row in memory under its name."""
+        self.cities[city[0]] = city
+        if city[1] is not None:
+            self.names.setdefault(city[1], city[0])
+            self._index(city[1], city[0])
+
+    def _lookup_normalized(self, city_name):
+        """Look a name up by its normalized key only, without fuzzy matching."""
+        key = normalize_name(city_name)
+        city_id = self.fuzzy.values.get(key) if key else None
+        return self.cities.get(city_id) if city_id is not None else None
+
+    def _fuzzy_lookup(self, city_name):
+        """Match a name against the normalized-name index.
+
+        A name whose normalized key is known, such as "kiel" or "BONN ", is
+        matched however short it is; the length, score and ambiguity checks
+        only apply to approximate trigram matches. The match is not
+        remembered: a wrong alias would route a city to the wrong place for
+        good, so only geocoder answers become aliases.
+
+        Args:
+            city_name (str): Name without an exact match.
+
+        Returns:
+            tuple: City data or None if no known name is similar enough, or
+                the name is too short or ambiguous to match locally.
+        """
+        city = self._lookup_normalized(city_name)
+        if city:
+            return city
+        key = normalize_name(city_name)
+        if len(key) < self.fuzzy_min_length:
+            return None
+        matches = self.fuzzy.top(key, 2)
+        if not matches:
+            return None
+        city_id, score, matched = matches[0]
+        runner_up = matches[1][1] if len(matches) > 1 else 0.0
+        if score < self.fuzzy_threshold or score - runner_up < self.fuzzy_margin:
+            return None
+        if matched.startswith(f"{key} "):
+            return None  # a short form shared by several places, e.g. "Frankfurt"
+        logging.info(f"Matched city '{city_name}' to '{self.cities[city_id][1]}' locally (score {score:.2f}).")
+        return self.cities[city_id]
+
+    def _remember_alias(self, alias, city_id):
+        """Store a new alias in the database and in memory."""
+        self.db.insert_alias(alias, city_id)
+        self.names[alias] = city_id
+        self._index(alias, city_id)
+
+    def _index(self, name, city_id):
+        """Add a name to the normalized-name index."""
+        key = normalize_name(name)
+        if key:
+            self.fuzzy.add(key, city_id)
+
+    def _geocode(self, city_name):
+        """Geocode a name, store the result as a city and alias, or cache the failure."""
+        with self._geocode_lock:
+            with self._lock:
+                # Another thread or process may have resolved it while we waited for the geocoder.
+                city = self._lookup(city_name) or self._lookup_db(city_name)
+                if city:
+                    return city
+            wait = self._last_request + self.min_interval - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            self._last_request = time.monotonic()
+            try:
+                location = (self.geocoder or get_geolocator()).geocode(city_name)
+            except Exception as e:
+                logging.error(f"Error geocoding {city_name}: {e}")
+                location = None
+            with self._lock:
+                self.geocoded += 1
+                if not location:
+                    now = time.monotonic()
+                    if len(self.negative) >= 10000:
+                        self.negative = {name: expiry for name, expiry in self.negative.items() if expiry > now}
+                    self.negative[city_name] = now + self.negative_ttl
+                    return None
+                city_name_clean = location.address.split(",")[0]
+                city = (self._lookup(city_name_clean) or self._lookup_normalized(city_name_clean)
+                        or self.db.get_city_by_name(city_name_clean))
+                if not city:
+                    city_id = self.db.insert_city(city_name_clean, "XX", location.latitude, location.longitude)
+                    if city_id is None:
+                        return None
+                    city = (city_id, city_name_clean, "XX", location.latitude, location.longitude)
+                self._add_city(city)
+                self._remember_alias(city_name, city[0])
+                self.negative.pop(city_name, None)
+                return city
@@ -7,18 +7,68 @@ def get_config():
     """Load configuration settings from environment variables."""
     return {
         "db_path": os.getenv("CARGO_DB_PATH", "cargobot.db"),
+        "db_pooled": os.getenv("CARGO_DB_POOLED", "0") == "1",
+        "db_cache_size_kb": int(os.getenv("CARGO_DB_CACHE_SIZE_KB", "65536")),
+        "db_mmap_size": int(os.getenv("CARGO_DB_MMAP_SIZE", "268435456")),
+        "dedup_window_hours": float(os.getenv("DEDUP_WINDOW_HOURS", "24")),
         "email_server": os.getenv("EMAIL_SERVER", "imap.gmail.com"),
         "email_user": os.getenv("EMAIL_USER", ""),
         "email_pass": os.getenv("EMAIL_PASSWORD", ""),
         "email_folder": os.getenv("EMAIL_FOLDER", "INBOX"),
+        "email_folders": [f.strip() for f in os.getenv("EMAIL_FOLDERS", os.getenv("EMAIL_FOLDER", "INBOX")).split(",") if f.strip()],
+        "email_fetch_chunk": int(os.getenv("EMAIL_FETCH_CHUNK", "200")),
+        "email_timeout": float(os.getenv("EMAIL_TIMEOUT", "30")),
+        "llm_workers": int(os.getenv("LLM_WORKERS", "4")),
+        "pipeline_queue_size": int(os.getenv("PIPELINE_QUEUE_SIZE", "8")),
         "gpt_api_key": os.getenv("GPT_API_KEY", ""),
+        "llm_model": os.getenv("LLM_MODEL", "gpt-4o-mini"),
+        "llm_cache_dir": os.getenv("LLM_CACHE_DIR", ".llm_cache"),
+        "llm_token_budget": int(os.getenv("LLM_TOKEN_BUDGET", "3000")),
+        "llm_max_batch": int(os.getenv("LLM_MAX_BATCH", "20")),
+        "llm_output_tokens_per_email": int(os.getenv("LLM_OUTPUT_TOKENS_PER_EMAIL", "150")),
+        "llm_requests_per_minute": float(os.getenv("LLM_REQUESTS_PER_MINUTE", "500")),
+        "llm_tokens_per_minute": float(os.getenv("LLM_TOKENS_PER_MINUTE", "200000")),
+        "llm_max_retries": int(os.getenv("LLM_MAX_RETRIES", "4")),
+        "llm_retry_base_delay": float(os.getenv("LLM_RETRY_BASE_DELAY", "1.0")),
+        "llm_timeout": float(os.getenv("LLM_TIMEOUT", "60")),
         "osrm_url": os.getenv("OSRM_URL", "http://router.project-osrm.org"),
+        "osrm_timeout": float(os.getenv("OSRM_TIMEOUT", "10")),
+        "osrm_table_max_locations": int(os.getenv("OSRM_TABLE_MAX_LOCATIONS", "100")),
+        "osrm_max_workers": int(os.getenv("OSRM_MAX_WORKERS", "4")),
+        "osrm_retry_after": float(os.getenv("OSRM_RETRY_AFTER", "60")),
+        "geocode_negative_ttl": float(os.getenv("GEOCODE_NEGATIVE_TTL", "86400")),
+        "geocode_min_interval": float(os.getenv("GEOCODE_MIN_INTERVAL", "1.0")),
+        "geocode_timeout": float(os.getenv("GEOCODE_TIMEOUT", "10")),
+        "fuzzy_match_threshold": float(os.getenv("FUZZY_MATCH_THRESHOLD", "0.8")),
+        "fuzzy_match_margin": float(os.getenv("FUZZY_MATCH_MARGIN", "0.1")),
+        "fuzzy_min_length": int(os.getenv("FUZZY_MIN_LENGTH", "5")),
+        "distance_cache_size": int(os.getenv("DISTANCE_CACHE_SIZE", "10000")),
+        "distance_cache_ttl": float(os.getenv("DISTANCE_CACHE_TTL", "86400")),
         "default_rate": float(os.getenv("DEFAULT_RATE", "1.7")),
         "bad_rate": float(os.getenv("BAD_RATE", "1.5")),
         "high_demand_rate": float(os.getenv("HIGH_DEMAND_RATE", "2.0")),
         "search_radius": float(os.getenv("SEARCH_RADIUS", "200")),
+        "route_top_k": int(os.getenv("ROUTE_TOP_K", "5")),
+        "route_beam_width": int(os.getenv("ROUTE_BEAM_WIDTH", "200")),
+        "route_branching": int(os.getenv("ROUTE_BRANCHING", "25")),
         "whatsapp_export_path": os.getenv("WHATSAPP_EXPORT_PATH", "whatsapp_export.txt"),
+        "whatsapp_workers": int(os.getenv("WHATSAPP_WORKERS", "0")),
+        "whatsapp_parallel_min_bytes": int(os.getenv("WHATSAPP_PARALLEL_MIN_BYTES", "67108864")),
         "web_platform_url": os.getenv("WEB_PLATFORM_URL", "http://example.com"),
+        "web_max_workers": int(os.getenv("WEB_MAX_WORKERS", "4")),
+        "web_timeout": float(os.getenv("WEB_TIMEOUT", "10")),
+        "web_max_pages": int(os.getenv("WEB_MAX_PAGES", "20")),
+        "web_page_param": os.getenv("WEB_PAGE_PARAM", "page"),
+        "ingest_sources": [s.strip() for s in os.getenv("INGEST_SOURCES", "email,whatsapp,web").split(",") if s.strip()],
+        "ingest_batch_size": int(os.getenv("INGEST_BATCH_SIZE", "500")),
+        "ingest_batch_linger": float(os.getenv("INGEST_BATCH_LINGER", "0.5")),
+        "ingest_queue_size": int(os.getenv("INGEST_QUEUE_SIZE", "2000")),
+        "ingest_interval_email": float(os.getenv("INGEST_INTERVAL_EMAIL", "300")),
+        "ingest_interval_whatsapp": float(os.getenv("INGEST_INTERVAL_WHATSAPP", "60")),
+        "ingest_interval_web": float(os.getenv("INGEST_INTERVAL_WEB", "900")),
+        "ingest_poll_jitter": float(os.getenv("INGEST_POLL_JITTER", "0.1")),
+        "ingest_drain_timeout": float(os.getenv("INGEST_DRAIN_TIMEOUT", "60")),
+        "ingest_stats_interval": float(os.getenv("INGEST_STATS_INTERVAL", "600")),
     }
 
 config = get_config()
\ No newline at end of file
@@ -1,7 +1,11 @@
-from geopy.geocoders import Nominatim
-from routingpy import OSRM
+from concurrent.futures import ThreadPoolExecutor
+from city_resolver import get_city_resolver
 from config import config
+from distance_cache import DistanceCache
+from distance_estimator import DistanceEstimator
 import logging
+import threading
+import time
 
 logging.basicConfig(
     level=logging.INFO,
@@ -9,22 +13,53 @@ logging.basicConfig(
     handlers=[logging.FileHandler("cargobot.log"), logging.StreamHandler()]
 )
 
-geolocator = Nominatim(user_agent="cargobot")
-osrm = OSRM(base_url=config["osrm_url"])
+_osrm = None
+_osrm_lock = threading.Lock()
+
+def get_osrm():
+    """Return the shared OSRM client for the configured server, creating it on first use.
+
+    Returns:
+        OSRM: routingpy OSRM client.
+    """
+    global _osrm
+    with _osrm_lock:
+        if _osrm is None:
+            from routingpy import OSRM
+            _osrm = OSRM(base_url=config["osrm_url"], timeout=config["osrm_timeout"])
+        return _osrm
 
 class DataNormalizer:
     """Normalizes offer data, including city names and distances."""
-    def __init__(self, db):
+    def __init__(self, db, distance_cache=None, router=None, estimator=None):
         """Initialize DataNormalizer with a database connection.
 
         Args:
             db (Database): Database instance.
+            distance_cache (DistanceCache, optional): Road distance cache.
+                Built on top of the database if not given.
+            router (optional): Routing client with routingpy's OSRM `route` and
+                `matrix` interface. Defaults to the configured OSRM server; pass
+                a local stand-in to run offline.
+            estimator (DistanceEstimator, optional): Offline fallback used when
+                the router cannot answer. Built on top of the database if not given.
         """
         self.db = db
-        self.city_cache = {}
+        self.resolver = get_city_resolver(db)
+        self._router = router
+        self.estimator = estimator or DistanceEstimator(db)
+        self._router_down_until = 0.0
+        self.distance_cache = distance_cache or DistanceCache(
+            db, max_size=config["distance_cache_size"], ttl=config["distance_cache_ttl"]
+        )
+
+    @property
+    def router(self):
+        """Routing client in use, the configured OSRM server unless one was passed in."""
+        return self._router or get_osrm()
 
     def normalize_city(self, city_name):
-        """Normalize city name using cache, database, or geocoding API.
+        """Normalize city name using the shared city resolver.
 
         Args:
             city_name (str): The name of the city to normalize.
@@ -32,26 +67,25 @@ class DataNormalizer:
         Returns:
             tuple: City data (id, name, country_code, lat, lon) or None if not found.
         """
-        if city_name in self.city_cache:
-            return self.city_cache[city_name]
+        return self.resolver.resolve(city_name)
 
-        city = self.db.get_city_by_alias(city_name) or self.db.get_city_by_name(city_name)
-        if city:
-            self.city_cache[city_name] = city
-            return city
+    def get_distance(self, loading_city, unloading_city):
+        """Road distance between two cities, from the cache, the router or the offline estimate.
 
-        try:
-            location = geolocator.geocode(city_name)
-            if location:
-                city_name_clean = location.address.split(",")[0]
-                city_id = self.db.insert_city(city_name_clean, "XX", location.latitude, location.longitude)
-                self.db.insert_alias(city_name, city_id)
-                city = (city_id, city_name_clean, "XX", location.latitude, location.longitude)
-                self.city_cache[city_name] = city
-                return city
-        except Exception as e:
-            logging.error(f"Error geocoding {city_name}: {e}")
-        return None
+        Args:
+            loading_city (tuple): City data (id, name, country_code, lat, lon).
+            unloading_city (tuple): City data (id, name, country_code, lat, lon).
+
+        Returns:
+            float: Distance in km or None if it cannot be determined.
+        """
+        distance = self.distance_cache.get(loading_city[0], unloading_city[0])
+        if distance is None:
+            distance = self._route_distance(loading_city, unloading_city)
+            self.distance_cache.put(loading_city[0], unloading_city[0], distance)
+        if distance is None:
+            distance = self.estimator.estimate([(loading_city, unloading_city)])[0]
+        return distance
 
     def process_offer(self, offer_data, raw_message=None):
         """Process offer data, normalizing cities and calculating distance.
@@ -69,15 +103,162 @@ class DataNormalizer:
             logging.warning(f"Failed to normalize cities: {offer_data['loading_city']} to {offer_data['unloading_city']}")
             return None
 
-        coords1 = (loading_city[4], loading_city[3])  # lon, lat
-        coords2 = (unloading_city[4], unloading_city[3])  # lon, lat
-        distance = None
+        distance = self.get_distance(loading_city, unloading_city)
+        return self._build_offer(offer_data, loading_city, unloading_city, distance, raw_message)
+
+    def process_offers(self, offers_data, raw_messages=None):
+        """Process a batch of offers, resolving all missing distances together.
+
+        Unlike calling process_offer in a loop, city pairs missing from the
+        distance cache are collected first and resolved with a few OSRM table
+        requests (falling back to parallel route requests, then to the offline
+        estimate), then every offer is filled in.
+
+        Args:
+            offers_data (list): Offer dicts as accepted by process_offer.
+            raw_messages (list, optional): Raw message texts aligned with offers_data.
+
+        Returns:
+            list: Processed offer dicts aligned with the input, None where normalization failed.
+        """
+        raw_messages = raw_messages or [None] * len(offers_data)
+        resolved = []
+        for offer_data in offers_data:
+            loading_city = self.normalize_city(offer_data["loading_city"])
+            unloading_city = self.normalize_city(offer_data["unloading_city"])
+            if not loading_city or not unloading_city:
+                logging.warning(f"Failed to normalize cities: {offer_data['loading_city']} to {offer_data['unloading_city']}")
+                resolved.append(None)
+            else:
+                resolved.append((loading_city, unloading_city))
+
+        distances = {}
+        missing = {}
+        for cities in filter(None, resolved):
+            key = (cities[0][0], cities[1][0])
+            if key in distances or key in missing:
+                continue
+            distance = self.distance_cache.get(*key)
+            if distance is None:
+                missing[key] = cities
+            else:
+                distances[key] = distance
+        if missing:
+            computed = self.resolve_distances(list(missing.values()))
+            self.distance_cache.put_many(computed)
+            distances.update(computed)
+            # Estimates are not cached, so they never feed back into the detour fit.
+            unresolved = [key for key in missing if key not in computed]
+            estimates = self.estimator.estimate([missing[key] for key in unresolved])
+            distances.update((key, d) for key, d in zip(unresolved, estimates) if d is not None)
+
+        return [
+            self._build_offer(offer_data, cities[0], cities[1],
+                              distances.get((cities[0][0], cities[1][0])), raw_message) if cities else None
+            for offer_data, cities, raw_message in zip(offers_data, resolved, raw_messages)
+        ]
+
+    def resolve_distances(self, city_pairs):
+        """Compute road distances for many city pairs with as few router calls as possible.
+
+        Pairs are grouped into OSRM table requests of at most
+        osrm_table_max_locations coordinates each. If a table request fails,
+        its pairs are resolved with parallel route requests instead.
+
+        Args:
+            city_pairs (list): (loading_city, unloading_city) city tuples.
+
+        Returns:
+            dict: (loading_city_id, unloading_city_id) -> distance in km, for the pairs that resolved.
+        """
+        max_locations = max(config["osrm_table_max_locations"], 2)
+        distances = {}
+        block, sources, destinations = [], {}, {}
+        for pair in sorted(city_pairs, key=lambda p: (p[0][0], p[1][0])):
+            new_locations = (pair[0][0] not in sources) + (pair[1][0] not in destinations)
+            if block and len(sources) + len(destinations) + new_locations > max_locations:
+                distances.update(self._resolve_block(block, sources, destinations))
+                block, sources, destinations = [], {}, {}
+            sources.setdefault(pair[0][0], pair[0])
+            destinations.setdefault(pair[1][0], pair[1])
+            block.append(pair)
+        if block:
+            distances.update(self._resolve_block(block, sources, destinations))
+        return distances
+
+    def _resolve_block(self, block, sources, destinations):
+        """Resolve one group of city pairs with a single OSRM table request.
+
+        Args:
+            block (list): (loading_city, unloading_city) pairs in this group.
+            sources (dict): Loading city ID -> city tuple.
+            destinations (dict): Unloading city ID -> city tuple.
+
+        Returns:
+            dict: (loading_city_id, unloading_city_id) -> distance in km.
+        """
+        if self._router_unavailable():
+            return {}
+        source_ids = list(sources)
+        destination_ids = list(destinations)
+        locations = [(c[4], c[3]) for c in sources.values()] + [(c[4], c[3]) for c in destinations.values()]
         try:
-            route = osrm.route(locations=[coords1, coords2], profile="driving")
-            distance = route.distance / 1000  # Convert meters to km
+            matrix = self.router.matrix(
+                locations=locations,
+                profile="driving",
+                sources=list(range(len(source_ids))),
+                destinations=list(range(len(source_ids), len(locations))),
+                annotations=["distance"]
+            )
+            row_of = {city_id: i for i, city_id in enumerate(source_ids)}
+            column_of = {city_id: j for j, city_id in enumerate(destination_ids)}
+            distances = {}
+            for loading_city, unloading_city in block:
+                meters = matrix.distances[row_of[loading_city[0]]][column_of[unloading_city[0]]]
+                if meters is not None:
+                    distances[(loading_city[0], unloading_city[0])] = meters / 1000  # Convert meters to km
+            return distances
+        except Exception as e:
+            logging.error(f"Error calculating distance table, falling back to single routes: {e}")
+        with ThreadPoolExecutor(max_workers=config["osrm_max_workers"]) as executor:
+            results = executor.map(lambda pair: self._route_distance(*pair), block)
+            return {
+                (pair[0][0], pair[1][0]): distance
+                for pair, distance in zip(block, results) if distance is not None
+            }
+
+    def _route_distance(self, loading_city, unloading_city):
+        """Road distance in km from a single route request, without touching the cache."""
+        if self._router_unavailable():
+            return None
+        try:
+            route = self.router.route(
+                locations=[(loading_city[4], loading_city[3]), (unloading_city[4], unloading_city[3])],
+                profile="driving"
+            )
+            return route.distance / 1000  # Convert meters to km
         except Exception as e:
             logging.error(f"Error calculating route: {e}")
+            self._router_down_until = time.monotonic() + config["osrm_retry_after"]
+            return None
+
+    def _router_unavailable(self):
+        """Whether the router failed recently enough that we skip it and estimate instead."""
+        return time.monotonic() < self._router_down_until
 
+    def _build_offer(self, offer_data, loading_city, unloading_city, distance, raw_message):
+        """Assemble the processed offer dict.
+
+        Args:
+            offer_data (dict): Parsed offer details.
+            loading_city (tuple): Normalized loading city.
+            unloading_city (tuple): Normalized unloading city.
+            distance (float): Road distance in km, or None.
+            raw_message (str): Raw message text for reference.
+
+        Returns:
+            dict: Processed offer data.
+        """
         return {
             "source": offer_data.get("source", "unknown"),
             "sender": offer_data.get("sender", "unknown"),
@@ -90,4 +271,4 @@ class DataNormalizer:
             "estimated_price": distance * config["default_rate"] if distance and not offer_data.get("price") else None,
             "additional_info": offer_data.get("additional_info"),
             "raw_message": raw_message
-        }
\ No newline at end of file
+        }
@@ -1,6 +1,11 @@
 import sqlite3
+from collections import Counter
+from contextlib import contextmanager
 from datetime import datetime, timedelta
+from fingerprint import content_hash, offer_fingerprint, offer_fingerprints
 import logging
+import threading
+import weakref
 
 logging.basicConfig(
     level=logging.INFO,
@@ -8,63 +13,437 @@ logging.basicConfig(
     handlers=[logging.FileHandler("cargobot.log"), logging.StreamHandler()]
 )
 
+DUPLICATE_OFFER = "duplicate offer"  # insert_offers_bulk failure message for duplicates
+DUPLICATE_RAW_DATA = "duplicate raw data"  # insert_raw_data_bulk failure message for duplicates
+
+def _add_fingerprints(db, cursor):
+    """Add offer fingerprints and raw data content hashes behind unique indexes.
+
+    Existing rows are backfilled oldest first; later duplicates keep a NULL
+    fingerprint or hash so the unique indexes can be built over old data.
+
+    Args:
+        db (Database): Database being migrated.
+        cursor (sqlite3.Cursor): Writer cursor inside the migration transaction.
+    """
+    cursor.execute("ALTER TABLE offers ADD COLUMN fingerprint TEXT")
+    cursor.execute("ALTER TABLE raw_data ADD COLUMN content_hash TEXT")
+    seen = set()
+    updates = []
+    cursor.execute("SELECT id, loading_city_id, unloading_city_id, price, lf_number, timestamp FROM offers ORDER BY id")
+    for row in cursor.fetchall():
+        fingerprint = offer_fingerprint(*row[1:], window_hours=db.dedup_window_hours)
+        if fingerprint not in seen:
+            seen.add(fingerprint)
+            updates.append((fingerprint, row[0]))
+    cursor.executemany("UPDATE offers SET fingerprint = ? WHERE id = ?", updates)
+    seen.clear()
+    updates.clear()
+    cursor.execute("SELECT id, raw_content FROM raw_data ORDER BY id")
+    for row in cursor.fetchall():
+        digest = content_hash(row[1])
+        if digest not in seen:
+            seen.add(digest)
+            updates.append((digest, row[0]))
+    cursor.executemany("UPDATE raw_data SET content_hash = ? WHERE id = ?", updates)
+    cursor.execute("CREATE UNIQUE INDEX idx_offers_fingerprint ON offers (fingerprint)")
+    cursor.execute("CREATE UNIQUE INDEX idx_raw_data_content_hash ON raw_data (content_hash)")
+
+def _add_city_offer_counts(db, cursor):
+    """Add per-city, per-day offer counts kept up to date by triggers.
+
+    Counts are keyed by loading city and calendar day of the offer
+    timestamp, so counting a city's offers over any window reads one row
+    per day instead of scanning offers. Triggers maintain the counts on
+    every insert, delete and change of an offer's loading city or
+    timestamp, whichever code path writes the offer. Existing offers are
+    backfilled. Migration 4 replaces the insert trigger by one upsert per
+    insert statement or batch, see Database._count_new_offers.
+
+    Args:
+        db (Database): Database being migrated.
+        cursor (sqlite3.Cursor): Writer cursor inside the migration transaction.
+    """
+    cursor.execute("""
+        CREATE TABLE city_offer_counts (
+            city_id INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (city_id, day)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+        CREATE TRIGGER offers_count_insert AFTER INSERT ON offers
+        WHEN NEW.loading_city_id IS NOT NULL
+        BEGIN
+            INSERT INTO city_offer_counts (city_id, day, count)
+            VALUES (NEW.loading_city_id, substr(NEW.timestamp, 1, 10), 1)
+            ON CONFLICT (city_id, day) DO UPDATE SET count = count + 1;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER offers_count_delete AFTER DELETE ON offers
+        WHEN OLD.loading_city_id IS NOT NULL
+        BEGIN
+            UPDATE city_offer_counts SET count = count - 1
+            WHERE city_id = OLD.loading_city_id AND day = substr(OLD.timestamp, 1, 10);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER offers_count_update AFTER UPDATE OF loading_city_id, timestamp ON offers
+        WHEN OLD.loading_city_id IS NOT NEW.loading_city_id
+            OR substr(OLD.timestamp, 1, 10) IS NOT substr(NEW.timestamp, 1, 10)
+        BEGIN
+            UPDATE city_offer_counts SET count = count - 1
+            WHERE city_id = OLD.loading_city_id AND day = substr(OLD.timestamp, 1, 10);
+            INSERT INTO city_offer_counts (city_id, day, count)
+            SELECT NEW.loading_city_id, substr(NEW.timestamp, 1, 10), 1 WHERE NEW.loading_city_id IS NOT NULL
+            ON CONFLICT (city_id, day) DO UPDATE SET count = count + 1;
+        END
+    """)
+    cursor.execute("""
+        INSERT INTO city_offer_counts (city_id, day, count)
+        SELECT loading_city_id, substr(timestamp, 1, 10), COUNT(*) FROM offers
+        WHERE loading_city_id IS NOT NULL GROUP BY 1, 2
+    """)
+
+class _Reader:
+    """A thread's reader connection, held in thread-local storage.
+
+    Thread-local storage is cleared when its thread exits, which drops the
+    last reference to this object and lets a finalizer close the connection.
+    """
+    __slots__ = ("conn", "cursor", "__weakref__")
+
+    def __init__(self, conn):
+        """Wrap a reader connection.
+
+        Args:
+            conn (sqlite3.Connection): Connection opened for the thread.
+        """
+        self.conn = conn
+        self.cursor = conn.cursor()
+
+def _close_reader(conn, readers, lock):
+    """Close a reader connection whose thread has exited and forget it."""
+    with lock:
+        readers.discard(conn)
+    try:
+        conn.close()
+    except Exception as e:
+        logging.error(f"Error closing reader connection: {e}")
+
+# Schema migrations applied on top of create_tables, tracked in PRAGMA user_version.
+# A migration is either an SQL script or a callable taking (db, cursor).
+MIGRATIONS = [
+    (1, """
+        CREATE INDEX IF NOT EXISTS idx_offers_loading_city_timestamp ON offers (loading_city_id, timestamp);
+        CREATE INDEX IF NOT EXISTS idx_offers_timestamp ON offers (timestamp);
+        CREATE INDEX IF NOT EXISTS idx_city_aliases_alias ON city_aliases (alias);
+        CREATE INDEX IF NOT EXISTS idx_cities_name ON cities (name);
+    """),
+    (2, _add_fingerprints),
+    (3, _add_city_offer_counts),
+    # Inserts now update the counts once per statement or batch, see Database._count_new_offers.
+    (4, "DROP TRIGGER IF EXISTS offers_count_insert;"),
+]
+
+# Hot-path queries and the index each of them must use: name -> (sql, params, index).
+HOT_QUERIES = {
+    "get_offers_by_loading_city": (
+        "SELECT * FROM offers WHERE loading_city_id = ? AND timestamp >= ?", (0, ""),
+        "idx_offers_loading_city_timestamp"),
+    "count_offers_from_city": (
+        "SELECT COUNT(*) FROM offers WHERE loading_city_id = ? AND timestamp >= ? AND timestamp < ?", (0, "", ""),
+        "idx_offers_loading_city_timestamp"),
+    "city_offer_counts": (
+        "SELECT SUM(count) FROM city_offer_counts WHERE city_id = ? AND day > ?", (0, ""),
+        "PRIMARY KEY"),
+    "get_all_offers": (
+        "SELECT * FROM offers ORDER BY timestamp DESC LIMIT ?", (10,),
+        "idx_offers_timestamp"),
+    "get_active_offers": (
+        "SELECT * FROM offers WHERE timestamp >= ? ORDER BY timestamp", ("",),
+        "idx_offers_timestamp"),
+    "get_city_by_alias": (
+        "SELECT c.* FROM cities c JOIN city_aliases ca ON c.id = ca.city_id WHERE ca.alias = ?", ("",),
+        "idx_city_aliases_alias"),
+    "get_city_by_name": (
+        "SELECT * FROM cities WHERE name = ?", ("",),
+        "idx_cities_name"),
+    "get_known_raw_hashes": (
+        "SELECT content_hash FROM raw_data WHERE content_hash IN (?)", ("",),
+        "idx_raw_data_content_hash"),
+    "offer_fingerprint": (
+        "SELECT id FROM offers WHERE fingerprint = ?", ("",),
+        "idx_offers_fingerprint"),
+}
+
 class Database:
     """Manages SQLite database operations for CargoBot."""
-    def __init__(self, db_path):
+    def __init__(self, db_path, pooled=False, cache_size_kb=65536, mmap_size=268435456, dedup_window_hours=24):
         """Initialize database connection and create tables.
 
+        File databases run in WAL mode with synchronous=NORMAL. In pooled mode
+        every thread reads through its own connection, while all writes go
+        through a single shared writer connection guarded by a lock, so an
+        ingester and the route planner can work in parallel without
+        "database is locked" errors.
+
         Args:
             db_path (str): Path to the SQLite database file.
+            pooled (bool): Use per-thread reader connections plus a single writer.
+            cache_size_kb (int): Page cache size per connection in KiB.
+            mmap_size (int): Maximum bytes of the database file to memory-map.
+            dedup_window_hours (float): Time window within which offers for the
+                same load are treated as duplicates.
         """
-        self.conn = sqlite3.connect(db_path)
-        self.cursor = self.conn.cursor()
+        self.db_path = db_path
+        self.pooled = pooled and db_path != ":memory:"
+        if pooled and not self.pooled:
+            logging.warning("Pooled mode needs a file database; using a single connection.")
+        self.cache_size_kb = cache_size_kb
+        self.mmap_size = mmap_size
+        self.dedup_window_hours = dedup_window_hours
+        self._local = threading.local()
+        self._readers = set()
+        self._readers_lock = threading.Lock()
+        self._write_lock = threading.RLock()
+        self._write_conn = self._connect(check_same_thread=not self.pooled)
+        self._write_cursor = self._write_conn.cursor()
+        self.offer_listeners = []
+        self.city_listeners = []
         self.create_tables()
+        self.migrate()
+
+    def _connect(self, check_same_thread=True):
+        """Open a connection with the tuned pragmas applied.
+
+        Args:
+            check_same_thread (bool): Restrict the connection to the creating thread.
+
+        Returns:
+            sqlite3.Connection: New connection.
+        """
+        conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=check_same_thread)
+        if self.db_path != ":memory:":
+            conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute(f"PRAGMA cache_size = {-int(self.cache_size_kb)}")
+        conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        return conn
+
+    @property
+    def conn(self):
+        """Connection for reads in the calling thread.
+
+        In pooled mode each thread gets its own reader on first use; it is
+        closed when the thread exits, so short-lived threads do not pile up
+        open connections.
+        """
+        if not self.pooled:
+            return self._write_conn
+        return self._reader().conn
+
+    @property
+    def cursor(self):
+        """Cursor for reads in the calling thread."""
+        if not self.pooled:
+            return self._write_cursor
+        return self._reader().cursor
+
+    def _reader(self):
+        """The calling thread's reader, opening it on first use."""
+        reader = getattr(self._local, "reader", None)
+        if reader is None:
+            # Only this thread uses it, but close() or the finalizer may run from another one.
+            reader = _Reader(self._connect(check_same_thread=False))
+            with self._readers_lock:
+                self._readers.add(reader.conn)
+            weakref.finalize(reader, _close_reader, reader.conn, self._readers, self._readers_lock)
+            self._local.reader = reader
+        return reader
+
+    @contextmanager
+    def _writer(self):
+        """Hold the writer connection for one transaction.
+
+        Yields:
+            sqlite3.Cursor: Writer cursor; the transaction commits on exit
+                and rolls back if the block raises.
+        """
+        with self._write_lock:
+            try:
+                yield self._write_cursor
+                self._write_conn.commit()
+            except Exception:
+                self._write_conn.rollback()
+                raise
+
+    def add_offer_listener(self, callback):
+        """Register a callback invoked with the offer row after every insert or update.
+
+        Args:
+            callback (callable): Function taking the offer tuple.
+        """
+        self.offer_listeners.append(callback)
+
+    def add_city_listener(self, callback):
+        """Register a callback invoked with the city row after every insert.
+
+        Args:
+            callback (callable): Function taking the city tuple.
+        """
+        self.city_listeners.append(callback)
+
+    def _notify_city(self, city):
+        """Pass an inserted city row to all registered listeners.
+
+        Args:
+            city (tuple): City data.
+        """
+        for callback in self.city_listeners:
+            try:
+                callback(city)
+            except Exception as e:
+                logging.error(f"Error notifying city listener: {e}")
+
+    def _notify_offer(self, offer):
+        """Pass an inserted or updated offer row to all registered listeners.
+
+        Args:
+            offer (tuple): Offer data.
+        """
+        for callback in self.offer_listeners:
+            try:
+                callback(offer)
+            except Exception as e:
+                logging.error(f"Error notifying offer listener: {e}")
 
     def create_tables(self):
         """Create necessary tables if they do not exist."""
-        self.cursor.executescript("""
-            CREATE TABLE IF NOT EXISTS cities (
-                id INTEGER PRIMARY KEY,
-                name TEXT,
-                country_code TEXT,
-                lat REAL,
-                lon REAL
-            );
-            CREATE TABLE IF NOT EXISTS city_aliases (
-                id INTEGER PRIMARY KEY,
-                alias TEXT,
-                city_id INTEGER,
-                FOREIGN KEY (city_id) REFERENCES cities(id)
-            );
-            CREATE TABLE IF NOT EXISTS raw_data (
-                id INTEGER PRIMARY KEY,
-                source TEXT,
-                timestamp DATETIME,
-                raw_content TEXT
-            );
-            CREATE TABLE IF NOT EXISTS offers (
-                id INTEGER PRIMARY KEY,
-                source TEXT,
-                timestamp DATETIME,
-                sender TEXT,
-                loading_city_id INTEGER,
-                unloading_city_id INTEGER,
-                price REAL,
-                lf_number TEXT,
-                urgency TEXT,
-                distance REAL,
-                estimated_price REAL,
-                additional_info TEXT,
-                raw_message TEXT,
-                FOREIGN KEY (loading_city_id) REFERENCES cities(id),
-                FOREIGN KEY (unloading_city_id) REFERENCES cities(id)
-            );
-            CREATE TABLE IF NOT EXISTS unverified_offers (
-                offer_id INTEGER PRIMARY KEY,
-                FOREIGN KEY (offer_id) REFERENCES offers(id)
-            );
-        """)
-        self.conn.commit()
+        with self._writer() as cursor:
+            cursor.executescript("""
+                CREATE TABLE IF NOT EXISTS cities (
+                    id INTEGER PRIMARY KEY,
+                    name TEXT,
+                    country_code TEXT,
+                    lat REAL,
+                    lon REAL
+                );
+                CREATE TABLE IF NOT EXISTS city_aliases (
+                    id INTEGER PRIMARY KEY,
+                    alias TEXT,
+                    city_id INTEGER,
+                    FOREIGN KEY (city_id) REFERENCES cities(id)
+                );
+                CREATE TABLE IF NOT EXISTS raw_data (
+                    id INTEGER PRIMARY KEY,
+                    source TEXT,
+                    timestamp DATETIME,
+                    raw_content TEXT
+                );
+                CREATE TABLE IF NOT EXISTS offers (
+                    id INTEGER PRIMARY KEY,
+                    source TEXT,
+                    timestamp DATETIME,
+                    sender TEXT,
+                    loading_city_id INTEGER,
+                    unloading_city_id INTEGER,
+                    price REAL,
+                    lf_number TEXT,
+                    urgency TEXT,
+                    distance REAL,
+                    estimated_price REAL,
+                    additional_info TEXT,
+                    raw_message TEXT,
+                    FOREIGN KEY (loading_city_id) REFERENCES cities(id),
+                    FOREIGN KEY (unloading_city_id) REFERENCES cities(id)
+                );
+                CREATE TABLE IF NOT EXISTS unverified_offers (
+                    offer_id INTEGER PRIMARY KEY,
+                    FOREIGN KEY (offer_id) REFERENCES offers(id)
+                );
+                CREATE TABLE IF NOT EXISTS email_sync_state (
+                    folder TEXT PRIMARY KEY,
+                    uidvalidity INTEGER,
+                    last_uid INTEGER,
+                    updated_at DATETIME
+                );
+                CREATE TABLE IF NOT EXISTS file_checkpoints (
+                    path TEXT PRIMARY KEY,
+                    device INTEGER,
+                    inode INTEGER,
+                    head_hash TEXT,
+                    offset INTEGER,
+                    updated_at DATETIME
+                );
+                CREATE TABLE IF NOT EXISTS web_pages (
+                    url TEXT PRIMARY KEY,
+                    etag TEXT,
+                    last_modified TEXT,
+                    checksum TEXT,
+                    page_count INTEGER,
+                    updated_at DATETIME
+                );
+                CREATE TABLE IF NOT EXISTS city_distances (
+                    loading_city_id INTEGER,
+                    unloading_city_id INTEGER,
+                    distance REAL,
+                    updated_at DATETIME,
+                    PRIMARY KEY (loading_city_id, unloading_city_id),
+                    FOREIGN KEY (loading_city_id) REFERENCES cities(id),
+                    FOREIGN KEY (unloading_city_id) REFERENCES cities(id)
+                );
+            """)
+
+    def migrate(self):
+        """Apply pending schema migrations in order, recording progress in user_version."""
+        version = self.cursor.execute("PRAGMA user_version").fetchone()[0]
+        for target, script in MIGRATIONS:
+            if target <= version:
+                continue
+            try:
+                with self._writer() as cursor:
+                    if callable(script):
+                        cursor.execute("BEGIN")  # keep schema changes and backfill in one transaction
+                        script(self, cursor)
+                    else:
+                        cursor.executescript(script)
+                    cursor.execute(f"PRAGMA user_version = {target}")
+                logging.info(f"Database migrated to schema version {target}.")
+            except Exception as e:
+                logging.error(f"Error applying migration {target}: {e}")
+                raise
+
+    def explain(self, sql=None, params=()):
+        """Show the query plan for a query, or check that all hot queries use their indexes.
+
+        Args:
+            sql (str, optional): Query to explain. If omitted, every query in
+                HOT_QUERIES is explained and checked.
+            params (tuple): Query parameters.
+
+        Returns:
+            list or dict: Plan details for the query, or a mapping of hot query
+                name to plan details.
+
+        Raises:
+            AssertionError: If a hot query does not use its expected index.
+        """
+        if sql is not None:
+            self.cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            return [row[3] for row in self.cursor.fetchall()]
+        plans = {}
+        missing = []
+        for name, (query, query_params, index) in HOT_QUERIES.items():
+            plans[name] = self.explain(query, query_params)
+            if not any(index in detail for detail in plans[name]):
+                missing.append(f"{name} does not use {index}: {plans[name]}")
+        if missing:
+            raise AssertionError("; ".join(missing))
+        return plans
 
     def insert_raw_data(self, source, raw_content):
         """Insert raw data into the database.
@@ -74,19 +453,139 @@ class Database:
             raw_content (str): Raw content to store.
 
         Returns:
-            int: ID of the inserted raw data.
+            int: ID of the inserted raw data, or None if it failed or the same
+                content is already stored.
         """
         try:
-            self.cursor.execute(
-                "INSERT INTO raw_data (source, timestamp, raw_content) VALUES (?, ?, ?)",
-                (source, datetime.now(), raw_content)
-            )
-            self.conn.commit()
-            return self.cursor.lastrowid
+            with self._writer() as cursor:
+                cursor.execute(
+                    "INSERT INTO raw_data (source, timestamp, raw_content, content_hash) VALUES (?, ?, ?, ?)",
+                    (source, datetime.now(), raw_content, content_hash(raw_content))
+                )
+                return cursor.lastrowid
+        except sqlite3.IntegrityError:
+            logging.info(f"Skipped duplicate raw data from {source}.")
+            return None
         except Exception as e:
             logging.error(f"Error inserting raw data: {e}")
             return None
 
+    def insert_raw_data_bulk(self, entries, chunk_size=1000):
+        """Insert many raw data entries in a single transaction.
+
+        Args:
+            entries (iterable): (source, raw_content) tuples.
+            chunk_size (int): Number of rows handed to executemany at a time.
+
+        Returns:
+            tuple: (list of inserted IDs aligned with the input, None for failed
+                or duplicate rows; list of (index, error message) for those rows,
+                with DUPLICATE_RAW_DATA as the message for content already stored).
+        """
+        timestamp = datetime.now()
+        ids, failures, _ = self._insert_bulk(
+            "INSERT INTO raw_data (source, timestamp, raw_content, content_hash) VALUES (?, ?, ?, ?)",
+            entries, lambda entry: (entry[0], timestamp, entry[1], content_hash(entry[1])), chunk_size
+        )
+        failures = [(index, DUPLICATE_RAW_DATA if "raw_data.content_hash" in error else error)
+                    for index, error in failures]
+        return ids, failures
+
+    def get_known_raw_hashes(self, hashes):
+        """Find which content hashes are already stored in raw_data.
+
+        Args:
+            hashes (iterable): Content hashes as returned by fingerprint.content_hash.
+
+        Returns:
+            set: The hashes that are already stored.
+        """
+        hashes = list(hashes)
+        known = set()
+        try:
+            for i in range(0, len(hashes), 500):
+                chunk = hashes[i:i + 500]
+                self.cursor.execute(
+                    f"SELECT content_hash FROM raw_data WHERE content_hash IN ({','.join('?' * len(chunk))})",
+                    chunk
+                )
+                known.update(row[0] for row in self.cursor.fetchall())
+        except Exception as e:
+            logging.error(f"Error looking up raw data hashes: {e}")
+        return known
+
+    def _insert_bulk(self, sql, items, build_row, chunk_size, after=None):
+        """Insert rows with executemany in one transaction, isolating failing rows.
+
+        Each chunk runs inside a savepoint nested in the one transaction. If
+        the chunk fails it is rolled back to its savepoint and replayed row by
+        row, so one bad row only costs its own insert. Items that build_row
+        rejects are recorded as failures without touching the database.
+
+        Args:
+            sql (str): Parameterised INSERT statement.
+            items (iterable): Input items.
+            build_row (callable): Turns an item into a parameter tuple; may raise.
+            chunk_size (int): Number of rows per executemany call.
+            after (callable, optional): Called with the writer cursor and the
+                (ID, params) pairs of the inserted rows before the transaction
+                commits.
+
+        Returns:
+            tuple: (IDs aligned with the input, (index, error) failures,
+                (ID, params) pairs for the inserted rows).
+        """
+        ids = []
+        failures = []
+        inserted = []
+        chunk = []
+
+        def flush(cursor):
+            if not chunk:
+                return
+            params = [row for _, row in chunk]
+            cursor.execute("SAVEPOINT bulk_chunk")
+            try:
+                cursor.executemany(sql, params)
+                # Rowids are assigned consecutively within our write transaction.
+                last_id = cursor.execute("SELECT last_insert_rowid()").fetchone()[0]
+                for offset, (index, row) in enumerate(chunk):
+                    ids[index] = last_id - len(chunk) + 1 + offset
+                    inserted.append((ids[index], row))
+            except sqlite3.Error:
+                cursor.execute("ROLLBACK TO bulk_chunk")
+                for index, row in chunk:
+                    try:
+                        cursor.execute(sql, row)
+                        ids[index] = cursor.lastrowid
+                        inserted.append((ids[index], row))
+                    except sqlite3.Error as e:
+                        failures.append((index, str(e)))
+            cursor.execute("RELEASE bulk_chunk")
+            chunk.clear()
+
+        try:
+            with self._writer() as cursor:
+                cursor.execute("BEGIN")  # otherwise each chunk savepoint would commit on release
+                for index, item in enumerate(items):
+                    ids.append(None)
+                    try:
+                        chunk.append((index, build_row(item)))
+                    except Exception as e:
+                        failures.append((index, str(e)))
+                        continue
+                    if len(chunk) >= chunk_size:
+                        flush(cursor)
+                flush(cursor)
+                if after and inserted:
+                    after(cursor, inserted)
+        except Exception as e:
+            logging.error(f"Error in bulk insert: {e}")
+            return [None] * len(ids), [(index, str(e)) for index in range(len(ids))], []
+        if failures:
+            logging.warning(f"Bulk insert skipped {len(failures)} of {len(ids)} rows.")
+        return ids, failures, inserted
+
     def get_raw_data(self, limit=10):
         """Retrieve raw data entries.
 
@@ -116,12 +615,14 @@ class Database:
             int: ID of the inserted city.
         """
         try:
-            self.cursor.execute(
-                "INSERT INTO cities (name, country_code, lat, lon) VALUES (?, ?, ?, ?)",
-                (name, country_code, lat, lon)
-            )
-            self.conn.commit()
-            return self.cursor.lastrowid
+            with self._writer() as cursor:
+                cursor.execute(
+                    "INSERT INTO cities (name, country_code, lat, lon) VALUES (?, ?, ?, ?)",
+                    (name, country_code, lat, lon)
+                )
+                city_id = cursor.lastrowid
+            self._notify_city((city_id, name, country_code, lat, lon))
+            return city_id
         except Exception as e:
             logging.error(f"Error inserting city: {e}")
             return None
@@ -134,14 +635,27 @@ class Database:
             city_id (int): ID of the city this alias refers to.
         """
         try:
-            self.cursor.execute(
-                "INSERT INTO city_aliases (alias, city_id) VALUES (?, ?)",
-                (alias, city_id)
-            )
-            self.conn.commit()
+            with self._writer() as cursor:
+                cursor.execute(
+                    "INSERT INTO city_aliases (alias, city_id) VALUES (?, ?)",
+                    (alias, city_id)
+                )
         except Exception as e:
             logging.error(f"Error inserting alias: {e}")
 
+    def get_all_aliases(self):
+        """Retrieve all city aliases.
+
+        Returns:
+            list: List of (alias, city_id) tuples.
+        """
+        try:
+            self.cursor.execute("SELECT alias, city_id FROM city_aliases")
+            return self.cursor.fetchall()
+        except Exception as e:
+            logging.error(f"Error retrieving city aliases: {e}")
+            return []
+
     def get_city_by_name(self, name):
         """Retrieve a city by its name.
 
@@ -193,6 +707,141 @@ class Database:
             logging.error(f"Error retrieving city by ID: {e}")
             return None
 
+    def get_cities_by_ids(self, city_ids):
+        """Retrieve many cities by ID with a few IN queries.
+
+        Args:
+            city_ids (iterable): City IDs; duplicates and None are ignored.
+
+        Returns:
+            dict: City ID -> city data (id, name, country_code, lat, lon) for the IDs found.
+        """
+        city_ids = list({city_id for city_id in city_ids if city_id is not None})
+        cities = {}
+        try:
+            for i in range(0, len(city_ids), 500):
+                chunk = city_ids[i:i + 500]
+                self.cursor.execute(f"SELECT * FROM cities WHERE id IN ({','.join('?' * len(chunk))})", chunk)
+                cities.update((row[0], row) for row in self.cursor.fetchall())
+        except Exception as e:
+            logging.error(f"Error retrieving cities by ID: {e}")
+        return cities
+
+    def get_all_cities(self):
+        """Retrieve all cities.
+
+        Returns:
+            list: List of city tuples (id, name, country_code, lat, lon).
+        """
+        try:
+            self.cursor.execute("SELECT * FROM cities")
+            return self.cursor.fetchall()
+        except Exception as e:
+            logging.error(f"Error retrieving cities: {e}")
+            return []
+
+    def get_city_distance(self, loading_city_id, unloading_city_id):
+        """Retrieve the cached road distance between two cities.
+
+        Args:
+            loading_city_id (int): ID of the loading city.
+            unloading_city_id (int): ID of the unloading city.
+
+        Returns:
+            float: Distance in km or None if not cached.
+        """
+        try:
+            self.cursor.execute(
+                "SELECT distance FROM city_distances WHERE loading_city_id = ? AND unloading_city_id = ?",
+                (loading_city_id, unloading_city_id)
+            )
+            row = self.cursor.fetchone()
+            return row[0] if row else None
+        except Exception as e:
+            logging.error(f"Error retrieving city distance: {e}")
+            return None
+
+    def get_city_distance_entry(self, loading_city_id, unloading_city_id):
+        """Retrieve the cached road distance between two cities with the time it was stored.
+
+        Args:
+            loading_city_id (int): ID of the loading city.
+            unloading_city_id (int): ID of the unloading city.
+
+        Returns:
+            tuple: (distance in km, datetime it was stored or None) or None if not cached.
+        """
+        try:
+            self.cursor.execute(
+                "SELECT distance, updated_at FROM city_distances WHERE loading_city_id = ? AND unloading_city_id = ?",
+                (loading_city_id, unloading_city_id)
+            )
+            row = self.cursor.fetchone()
+            if not row:
+                return None
+            return row[0], datetime.fromisoformat(row[1]) if row[1] else None
+        except Exception as e:
+            logging.error(f"Error retrieving city distance: {e}")
+            return None
+
+    def get_city_distance_samples(self, limit=100000):
+        """Retrieve cached road distances together with both cities' coordinates.
+
+        Args:
+            limit (int): Maximum number of samples to return.
+
+        Returns:
+            list: (distance, lat1, lon1, lat2, lon2) tuples.
+        """
+        try:
+            self.cursor.execute(
+                """SELECT d.distance, a.lat, a.lon, b.lat, b.lon FROM city_distances d
+                   JOIN cities a ON a.id = d.loading_city_id
+                   JOIN cities b ON b.id = d.unloading_city_id
+                   WHERE d.distance IS NOT NULL AND a.lat IS NOT NULL AND b.lat IS NOT NULL
+                   LIMIT ?""",
+                (limit,)
+            )
+            return self.cursor.fetchall()
+        except Exception as e:
+            logging.error(f"Error retrieving city distance samples: {e}")
+            return []
+
+    def insert_city_distance(self, loading_city_id, unloading_city_id, distance):
+        """Store the road distance between two cities, replacing any previous value.
+
+        Args:
+            loading_city_id (int): ID of the loading city.
+            unloading_city_id (int): ID of the unloading city.
+            distance (float): Distance in km.
+        """
+        try:
+            with self._writer() as cursor:
+                cursor.execute(
+                    """INSERT OR REPLACE INTO city_distances (loading_city_id, unloading_city_id, distance, updated_at)
+                       VALUES (?, ?, ?, ?)""",
+                    (loading_city_id, unloading_city_id, distance, datetime.now())
+                )
+        except Exception as e:
+            logging.error(f"Error inserting city distance: {e}")
+
+    def insert_city_distances_bulk(self, distances):
+        """Store many road distances in a single transaction.
+
+        Args:
+            distances (iterable): (loading_city_id, unloading_city_id, distance) tuples.
+        """
+        try:
+            now = datetime.now()
+            with self._writer() as cursor:
+                cursor.executemany(
+                    """INSERT OR REPLACE INTO city_distances (loading_city_id, unloading_city_id, distance, updated_at)
+                       VALUES (?, ?, ?, ?)""",
+                    [(a, b, d, now) for a, b, d in distances]
+                )
+        except Exception as e:
+            logging.error(f"Error inserting city distances: {e}")
+
     def insert_offer(self, source, sender, loading_city_id, unloading_city_id, price=None, 
                     lf_number=None, urgency=None, distance=None, estimated_price=None, 
                     additional_info=None, raw_message=None):
@@ -212,18 +861,37 @@ class Database:
             raw_message (str, optional): Raw message content.
 
         Returns:
-            int: ID of the inserted offer.
+            int: ID of the inserted offer, or None if it failed or duplicates an
+                offer received within the dedup window (see fingerprint.offer_fingerprints).
         """
         try:
-            self.cursor.execute(
-                """INSERT INTO offers (source, timestamp, sender, loading_city_id, unloading_city_id, 
-                   price, lf_number, urgency, distance, estimated_price, additional_info, raw_message) 
-                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-                (source, datetime.now(), sender, loading_city_id, unloading_city_id, price, 
-                 lf_number, urgency, distance, estimated_price, additional_info, raw_message)
-            )
-            self.conn.commit()
-            return self.cursor.lastrowid
+            timestamp = datetime.now()
+            fingerprint, previous = offer_fingerprints(loading_city_id, unloading_city_id, price, lf_number,
+                                                       timestamp, self.dedup_window_hours)
+            with self._writer() as cursor:
+                cursor.execute(
+                    "SELECT 1 FROM offers WHERE fingerprint = ? AND timestamp >= ?",
+                    (previous, timestamp - timedelta(hours=self.dedup_window_hours))
+                )
+                if cursor.fetchone():
+                    logging.info(f"Skipped duplicate {source} offer {loading_city_id} -> {unloading_city_id}.")
+                    return None
+                cursor.execute(
+                    """INSERT INTO offers (source, timestamp, sender, loading_city_id, unloading_city_id, 
+                       price, lf_number, urgency, distance, estimated_price, additional_info, raw_message, fingerprint) 
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                    (source, timestamp, sender, loading_city_id, unloading_city_id, price, 
+                     lf_number, urgency, distance, estimated_price, additional_info, raw_message, fingerprint)
+                )
+                offer_id = cursor.lastrowid
+                self._count_new_offers(cursor, [(loading_city_id, timestamp)])
+            self._notify_offer((offer_id, source, str(timestamp), sender, loading_city_id, unloading_city_id,
+                                price, lf_number, urgency, distance, estimated_price, additional_info, raw_message,
+                                fingerprint))
+            return offer_id
+        except sqlite3.IntegrityError:
+            logging.info(f"Skipped duplicate {source} offer {loading_city_id} -> {unloading_city_id}.")
+            return None
         except Exception as e:
             logging.error(f"Error inserting offer: {e}")
             return None
@@ -249,9 +917,130 @@ class Database:
             logging.error(f"Error retrieving offers by loading city: {e}")
             return []
 
+    def insert_offers_bulk(self, offers, chunk_size=1000):
+        """Insert many offers in a single transaction.
+
+        Args:
+            offers (iterable): Offer dicts with the same keys as the insert_offer
+                arguments; loading_city_id and unloading_city_id are required.
+            chunk_size (int): Number of rows handed to executemany at a time.
+
+        Offers repeating one received within the dedup window, or an earlier
+        offer of the same call, count as failed rows.
+
+        Returns:
+            tuple: (list of inserted IDs aligned with the input, None for failed
+                or duplicate rows; list of (index, error message) for those rows,
+                with DUPLICATE_OFFER as the message for duplicates).
+        """
+        timestamp = datetime.now()
+        offers = list(offers)
+        fingerprints = [
+            offer_fingerprints(offer.get("loading_city_id"), offer.get("unloading_city_id"), offer.get("price"),
+                               offer.get("lf_number"), timestamp, self.dedup_window_hours)
+            for offer in offers
+        ]
+        # Reject known duplicates up front; a chunk that hits the unique index
+        # would otherwise be replayed row by row.
+        seen = self.get_known_fingerprints({current for current, _ in fingerprints})
+        seen |= self.get_known_fingerprints({previous for _, previous in fingerprints},
+                                            since=timestamp - timedelta(hours=self.dedup_window_hours))
+
+        def build_row(item):
+            offer, (fingerprint, previous) = item
+            if offer.get("loading_city_id") is None or offer.get("unloading_city_id") is None:
+                raise ValueError("loading_city_id and unloading_city_id are required")
+            if fingerprint in seen or previous in seen:
+                raise ValueError(DUPLICATE_OFFER)
+            seen.add(fingerprint)
+            return (offer.get("source"), timestamp, offer.get("sender"), offer["loading_city_id"],
+                    offer["unloading_city_id"], offer.get("price"), offer.get("lf_number"),
+                    offer.get("urgency"), offer.get("distance"), offer.get("estimated_price"),
+                    offer.get("additional_info"), offer.get("raw_message"), fingerprint)
+
+        ids, failures, inserted = self._insert_bulk(
+            """INSERT INTO offers (source, timestamp, sender, loading_city_id, unloading_city_id, 
+               price, lf_number, urgency, distance, estimated_price, additional_info, raw_message, fingerprint) 
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            zip(offers, fingerprints), build_row, chunk_size,
+            after=lambda cursor, rows: self._count_new_offers(cursor, [(row[3], row[1]) for _, row in rows])
+        )
+        # An offer stored concurrently since the lookup only shows up as a unique index error.
+        failures = [(index, DUPLICATE_OFFER if "offers.fingerprint" in error else error) for index, error in failures]
+        if self.offer_listeners:
+            for offer_id, row in inserted:
+                self._notify_offer((offer_id, row[0], str(row[1])) + row[2:])
+        return ids, failures
+
+    def _count_new_offers(self, cursor, offers):
+        """Add newly inserted offers to city_offer_counts, one upsert per city and day.
+
+        Inserts are counted here rather than by a trigger, which would run
+        an upsert for every row of a bulk insert; deletes and updates are
+        still counted by triggers.
+
+        Args:
+            cursor (sqlite3.Cursor): Writer cursor inside the inserting transaction.
+            offers (list): (loading city ID, timestamp) pairs of the inserted offers.
+        """
+        counts = Counter((city_id, str(timestamp)[:10]) for city_id, timestamp in offers if city_id is not None)
+        cursor.executemany(
+            """INSERT INTO city_offer_counts (city_id, day, count) VALUES (?, ?, ?)
+               ON CONFLICT (city_id, day) DO UPDATE SET count = count + excluded.count""",
+            [(city_id, day, count) for (city_id, day), count in counts.items()]
+        )
+
+    def get_known_fingerprints(self, fingerprints, since=None):
+        """Find which offer fingerprints are already stored.
+
+        Args:
+            fingerprints (iterable): Offer fingerprints as returned by
+                fingerprint.offer_fingerprint.
+            since (datetime, optional): Only count offers received at or after this time.
+
+        Returns:
+            set: The fingerprints that are already stored.
+        """
+        fingerprints = list(fingerprints)
+        known = set()
+        try:
+            for i in range(0, len(fingerprints), 500):
+                chunk = fingerprints[i:i + 500]
+                query = f"SELECT fingerprint FROM offers WHERE fingerprint IN ({','.join('?' * len(chunk))})"
+                if since is not None:
+                    query += " AND timestamp >= ?"
+                    chunk = chunk + [since]
+                self.cursor.execute(query, chunk)
+                known.update(row[0] for row in self.cursor.fetchall())
+        except Exception as e:
+            logging.error(f"Error looking up offer fingerprints: {e}")
+        return known
+
+    def get_active_offers(self, days=7):
+        """Retrieve all offers within a time range, oldest first.
+
+        Args:
+            days (int): Number of days to look back.
+
+        Returns:
+            list: List of offers.
+        """
+        try:
+            cutoff = datetime.now() - timedelta(days=days)
+            self.cursor.execute(
+                "SELECT * FROM offers WHERE timestamp >= ? ORDER BY timestamp",
+                (cutoff,)
+            )
+            return self.cursor.fetchall()
+        except Exception as e:
+            logging.error(f"Error retrieving active offers: {e}")
+            return []
+
     def count_offers_from_city(self, city_id, days=7):
         """Count offers originating from a city within a time range.
 
+        Reads the per-day aggregates, see count_offers_from_cities.
+
         Args:
             city_id (int): ID of the city.
             days (int): Number of days to look back.
@@ -262,14 +1051,57 @@ class Database:
         try:
             cutoff = datetime.now() - timedelta(days=days)
             self.cursor.execute(
-                "SELECT COUNT(*) FROM offers WHERE loading_city_id = ? AND timestamp >= ?",
-                (city_id, cutoff)
+                """SELECT (SELECT COALESCE(SUM(count), 0) FROM city_offer_counts WHERE city_id = ? AND day > ?)
+                        + (SELECT COUNT(*) FROM offers WHERE loading_city_id = ? AND timestamp >= ? AND timestamp < ?)""",
+                (city_id, cutoff.date().isoformat(), city_id, cutoff, (cutoff.date() + timedelta(days=1)).isoformat())
             )
             return self.cursor.fetchone()[0]
         except Exception as e:
             logging.error(f"Error counting offers from city: {e}")
             return 0
 
+    def count_offers_from_cities(self, city_ids, days=7):
+        """Count offers originating from each of many cities within a time range.
+
+        Whole days after the cutoff are summed from city_offer_counts; only
+        the part of the cutoff day after the cutoff time is counted from
+        offers, through the (loading_city_id, timestamp) index. The cost
+        therefore grows with the number of days, not the number of offers.
+
+        Args:
+            city_ids (iterable): City IDs.
+            days (int): Number of days to look back.
+
+        Returns:
+            dict: City ID -> number of offers, for every requested city.
+        """
+        city_ids = list(dict.fromkeys(city_ids))
+        counts = dict.fromkeys(city_ids, 0)
+        cutoff = datetime.now() - timedelta(days=days)
+        cutoff_day = cutoff.date().isoformat()
+        next_day = (cutoff.date() + timedelta(days=1)).isoformat()
+        try:
+            for i in range(0, len(city_ids), 500):
+                chunk = city_ids[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                self.cursor.execute(
+                    f"""SELECT city_id, SUM(count) FROM city_offer_counts
+                        WHERE city_id IN ({placeholders}) AND day > ? GROUP BY city_id""",
+                    chunk + [cutoff_day]
+                )
+                rows = self.cursor.fetchall()
+                self.cursor.execute(
+                    f"""SELECT loading_city_id, COUNT(*) FROM offers
+                        WHERE loading_city_id IN ({placeholders}) AND timestamp >= ? AND timestamp < ?
+                        GROUP BY loading_city_id""",
+                    chunk + [cutoff, next_day]
+                )
+                for city_id, count in rows + self.cursor.fetchall():
+                    counts[city_id] += count
+        except Exception as e:
+            logging.error(f"Error counting offers from cities: {e}")
+        return counts
+
     def get_all_offers(self, limit=10):
         """Retrieve all offers, most recent first.
 
@@ -297,6 +1129,112 @@ class Database:
         """
         return self.get_all_offers(limit)
 
+    def get_email_sync_state(self, folder):
+        """Retrieve the incremental sync position of a mail folder.
+
+        Args:
+            folder (str): IMAP folder name.
+
+        Returns:
+            tuple: (uidvalidity, last_uid) or None if the folder was never synced.
+        """
+        try:
+            self.cursor.execute("SELECT uidvalidity, last_uid FROM email_sync_state WHERE folder = ?", (folder,))
+            return self.cursor.fetchone()
+        except Exception as e:
+            logging.error(f"Error retrieving email sync state for {folder}: {e}")
+            return None
+
+    def set_email_sync_state(self, folder, uidvalidity, last_uid):
+        """Store the incremental sync position of a mail folder.
+
+        Args:
+            folder (str): IMAP folder name.
+            uidvalidity (int): UIDVALIDITY of the folder.
+            last_uid (int): Highest UID processed.
+        """
+        try:
+            with self._writer() as cursor:
+                cursor.execute(
+                    """INSERT OR REPLACE INTO email_sync_state (folder, uidvalidity, last_uid, updated_at)
+                       VALUES (?, ?, ?, ?)""",
+                    (folder, uidvalidity, last_uid, datetime.now())
+                )
+        except Exception as e:
+            logging.error(f"Error storing email sync state for {folder}: {e}")
+
+    def get_file_checkpoint(self, path):
+        """Retrieve how far an append-only input file has been processed.
+
+        Args:
+            path (str): Absolute path of the file.
+
+        Returns:
+            tuple: (device, inode, head_hash, offset) or None if the file was never processed.
+        """
+        try:
+            self.cursor.execute("SELECT device, inode, head_hash, offset FROM file_checkpoints WHERE path = ?", (path,))
+            return self.cursor.fetchone()
+        except Exception as e:
+            logging.error(f"Error retrieving file checkpoint for {path}: {e}")
+            return None
+
+    def set_file_checkpoint(self, path, device, inode, head_hash, offset):
+        """Store how far an append-only input file has been processed.
+
+        Args:
+            path (str): Absolute path of the file.
+            device (int): st_dev of the file.
+            inode (int): st_ino of the file.
+            head_hash (str): Hash of the file's first bytes, to detect replaced files.
+            offset (int): Byte offset up to which the file has been processed.
+        """
+        try:
+            with self._writer() as cursor:
+                cursor.execute(
+                    """INSERT OR REPLACE INTO file_checkpoints (path, device, inode, head_hash, offset, updated_at)
+                       VALUES (?, ?, ?, ?, ?, ?)""",
+                    (path, device, inode, head_hash, offset, datetime.now())
+                )
+        except Exception as e:
+            logging.error(f"Error storing file checkpoint for {path}: {e}")
+
+    def get_web_page_state(self, url):
+        """Retrieve the validators of a crawled web page.
+
+        Args:
+            url (str): Page URL.
+
+        Returns:
+            tuple: (etag, last_modified, checksum, page_count) or None if the page was never crawled.
+        """
+        try:
+            self.cursor.execute("SELECT etag, last_modified, checksum, page_count FROM web_pages WHERE url = ?", (url,))
+            return self.cursor.fetchone()
+        except Exception as e:
+            logging.error(f"Error retrieving web page state for {url}: {e}")
+            return None
+
+    def set_web_page_state(self, url, etag, last_modified, checksum, page_count=None):
+        """Store the validators of a crawled web page.
+
+        Args:
+            url (str): Page URL.
+            etag (str): ETag header of the last response.
+            last_modified (str): Last-Modified header of the last response.
+            checksum (str): SHA-256 of the last response body.
+            page_count (int, optional): Number of result pages, for the first page.
+        """
+        try:
+            with self._writer() as cursor:
+                cursor.execute(
+                    """INSERT OR REPLACE INTO web_pages (url, etag, last_modified, checksum, page_count, updated_at)
+                       VALUES (?, ?, ?, ?, ?, ?)""",
+                    (url, etag, last_modified, checksum, page_count, datetime.now())
+                )
+        except Exception as e:
+            logging.error(f"Error storing web page state for {url}: {e}")
+
     def log_unverified_offer(self, offer_id):
         """Log an offer as unverified for later correction.
 
@@ -304,8 +1242,8 @@ class Database:
             offer_id (int): ID of the offer to log.
         """
         try:
-            self.cursor.execute("INSERT OR IGNORE INTO unverified_offers (offer_id) VALUES (?)", (offer_id,))
-            self.conn.commit()
+            with self._writer() as cursor:
+                cursor.execute("INSERT OR IGNORE INTO unverified_offers (offer_id) VALUES (?)", (offer_id,))
         except Exception as e:
             logging.error(f"Error logging unverified offer: {e}")
 
@@ -348,24 +1286,44 @@ class Database:
             new_price (float): New price in EUR.
         """
         try:
+            from city_resolver import get_city_resolver  # imported here to avoid a module cycle
+
             # Normalize new cities
-            loading_city = DataNormalizer(self).normalize_city(new_loading_city)
-            unloading_city = DataNormalizer(self).normalize_city(new_unloading_city)
+            resolver = get_city_resolver(self)
+            loading_city = resolver.resolve(new_loading_city)
+            unloading_city = resolver.resolve(new_unloading_city)
             if not loading_city or not unloading_city:
                 logging.warning(f"Could not normalize cities for offer {offer_id}")
                 return
-            self.cursor.execute(
-                "UPDATE offers SET loading_city_id = ?, unloading_city_id = ?, price = ? WHERE id = ?",
-                (loading_city[0], unloading_city[0], float(new_price) if new_price else None, offer_id)
-            )
-            self.cursor.execute("DELETE FROM unverified_offers WHERE offer_id = ?", (offer_id,))
-            self.conn.commit()
+            price = float(new_price) if new_price else None
+            with self._writer() as cursor:
+                cursor.execute("SELECT lf_number, timestamp FROM offers WHERE id = ?", (offer_id,))
+                row = cursor.fetchone()
+                if not row:
+                    logging.warning(f"Offer {offer_id} not found")
+                    return
+                fingerprint = offer_fingerprint(loading_city[0], unloading_city[0], price, row[0], row[1],
+                                                self.dedup_window_hours)
+                cursor.execute(
+                    "UPDATE offers SET loading_city_id = ?, unloading_city_id = ?, price = ?, fingerprint = ? WHERE id = ?",
+                    (loading_city[0], unloading_city[0], price, fingerprint, offer_id)
+                )
+                cursor.execute("DELETE FROM unverified_offers WHERE offer_id = ?", (offer_id,))
+            offer = self.get_offer_by_id(offer_id)
+            if offer:
+                self._notify_offer(offer)
+        except sqlite3.IntegrityError:
+            logging.warning(f"Corrected offer {offer_id} duplicates an existing offer; not updated.")
         except Exception as e:
             logging.error(f"Error updating offer {offer_id}: {e}")
 
     def close(self):
-        """Close the database connection."""
+        """Close the writer and all reader connections."""
         try:
-            self.conn.close()
+            with self._readers_lock:
+                for conn in self._readers:
+                    conn.close()
+                self._readers.clear()
+            self._write_conn.close()
         except Exception as e:
             logging.error(f"Error closing database: {e}")
\ No newline at end of file
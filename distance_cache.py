@@ -0,0 +1,130 @@
+from collections import OrderedDict
+from datetime import datetime
+import logging
+import threading
+import time
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(levelname)s - %(message)s",
+    handlers=[logging.FileHandler("cargobot.log"), logging.StreamHandler()]
+)
+
+class DistanceCache:
+    """Two-level cache of road distances keyed by (loading, unloading) city pair.
+
+    Lookups go to an in-process LRU first, then to the persistent
+    city_distances table; only a miss in both needs the router. A distance
+    expires ttl seconds after it was computed, in both tiers: a memory
+    entry loaded from the table only lives for what is left of the row's
+    ttl, and a table row older than ttl counts as a miss, so the router is
+    asked again and the row is refreshed.
+    """
+    def __init__(self, db, max_size=10000, ttl=86400):
+        """Initialize the cache.
+
+        Args:
+            db (Database): Database instance backing the cache.
+            max_size (int): Maximum number of city pairs kept in memory.
+            ttl (float): Seconds a computed distance stays valid, 0 for no expiry.
+        """
+        self.db = db
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, loading_city_id, unloading_city_id):
+        """Look up the distance between two cities.
+
+        Args:
+            loading_city_id (int): ID of the loading city.
+            unloading_city_id (int): ID of the unloading city.
+
+        Returns:
+            float: Distance in km or None on a miss.
+        """
+        key = (loading_city_id, unloading_city_id)
+        now = time.monotonic()
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry and entry[1] > now:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+        entry = self.db.get_city_distance_entry(loading_city_id, unloading_city_id)
+        remaining = self._remaining_ttl(entry[1]) if entry else 0
+        with self._lock:
+            if remaining <= 0 or entry[0] is None:
+                self.misses += 1
+                return None
+            self.db_hits += 1
+            self._remember(key, entry[0], now, remaining)
+        return entry[0]
+
+    def put(self, loading_city_id, unloading_city_id, distance):
+        """Store a freshly computed distance in memory and in the database.
+
+        Args:
+            loading_city_id (int): ID of the loading city.
+            unloading_city_id (int): ID of the unloading city.
+            distance (float): Distance in km.
+        """
+        if distance is None:
+            return
+        self.db.insert_city_distance(loading_city_id, unloading_city_id, distance)
+        with self._lock:
+            self._remember((loading_city_id, unloading_city_id), distance, time.monotonic())
+
+    def put_many(self, distances):
+        """Store many freshly computed distances with a single database write.
+
+        Args:
+            distances (dict): Mapping of (loading_city_id, unloading_city_id) to km.
+        """
+        distances = {key: d for key, d in distances.items() if d is not None}
+        if not distances:
+            return
+        self.db.insert_city_distances_bulk((a, b, d) for (a, b), d in distances.items())
+        now = time.monotonic()
+        with self._lock:
+            for key, distance in distances.items():
+                self._remember(key, distance, now)
+
+    def stats(self):
+        """Cache counters.
+
+        Returns:
+            dict: Memory hits, database hits, misses, hit ratio and current size.
+        """
+        with self._lock:
+            lookups = self.hits + self.db_hits + self.misses
+            return {
+                "hits": self.hits,
+                "db_hits": self.db_hits,
+                "misses": self.misses,
+                "hit_ratio": (self.hits + self.db_hits) / lookups if lookups else 0.0,
+                "size": len(self.entries)
+            }
+
+    def _remaining_ttl(self, updated_at):
+        """Seconds a distance stored at updated_at stays valid; 0 once it expired.
+
+        Without a ttl entries never expire; rows without a timestamp count as expired.
+        """
+        if not self.ttl:
+            return float("inf")
+        if updated_at is None:
+            return 0
+        return self.ttl - (datetime.now() - updated_at).total_seconds()
+
+    def _remember(self, key, distance, now, ttl=None):
+        """Insert into the LRU, evicting the least recently used entry when full."""
+        ttl = ttl if ttl is not None else self.ttl or float("inf")
+        self.entries[key] = (distance, now + ttl)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
@@ -0,0 +1,84 @@
+import logging
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(levelname)s - %(message)s",
+    handlers=[logging.FileHandler("cargobot.log"), logging.StreamHandler()]
+)
+
+EARTH_RADIUS_KM = 6371.0
+
+def haversine_km_array(lat1, lon1, lat2, lon2):
+    """Great-circle distances for arrays of coordinate pairs.
+
+    Args:
+        lat1 (array-like): Latitudes of the first points.
+        lon1 (array-like): Longitudes of the first points.
+        lat2 (array-like): Latitudes of the second points.
+        lon2 (array-like): Longitudes of the second points.
+
+    Returns:
+        numpy.ndarray: Distances in km.
+    """
+    import numpy as np  # imported on use so that importing this module stays cheap
+    phi1, lambda1, phi2, lambda2 = (np.radians(np.asarray(x, dtype=float)) for x in (lat1, lon1, lat2, lon2))
+    a = np.sin((phi2 - phi1) / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin((lambda2 - lambda1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+class DistanceEstimator:
+    """Estimates road distances offline as great-circle distance times a detour factor.
+
+    The detour factor is the median ratio of road to great-circle distance
+    over the OSRM results already cached in city_distances, so estimates
+    track the real road network of the lanes we actually see.
+    """
+    def __init__(self, db, default_factor=1.3, min_samples=20):
+        """Initialize the estimator.
+
+        Args:
+            db (Database): Database instance with cached road distances.
+            default_factor (float): Detour factor used until enough samples exist.
+            min_samples (int): Cached distances needed before the factor is fitted.
+        """
+        self.db = db
+        self.default_factor = default_factor
+        self.min_samples = min_samples
+        self.factor = None
+
+    def fit(self):
+        """Fit the detour factor from cached road distances.
+
+        Returns:
+            float: The fitted (or default) detour factor.
+        """
+        import numpy as np
+        samples = np.array(self.db.get_city_distance_samples(), dtype=float).reshape(-1, 5)
+        great_circle = haversine_km_array(samples[:, 1], samples[:, 2], samples[:, 3], samples[:, 4])
+        usable = great_circle > 1.0
+        if usable.sum() < self.min_samples:
+            self.factor = self.default_factor
+        else:
+            self.factor = float(np.median(samples[usable, 0] / great_circle[usable]))
+        logging.info(f"Distance estimator detour factor {self.factor:.3f} from {int(usable.sum())} samples.")
+        return self.factor
+
+    def estimate(self, city_pairs):
+        """Estimate road distances for many city pairs at once.
+
+        Args:
+            city_pairs (list): (loading_city, unloading_city) city tuples
+                (id, name, country_code, lat, lon).
+
+        Returns:
+            list: Distances in km aligned with city_pairs, None where a city has no coordinates.
+        """
+        if self.factor is None:
+            self.fit()
+        if not city_pairs:
+            return []
+        import numpy as np
+        coords = np.array(
+            [(a[3], a[4], b[3], b[4]) for a, b in city_pairs], dtype=float
+        )  # None coordinates become NaN
+        distances = haversine_km_array(coords[:, 0], coords[:, 1], coords[:, 2], coords[:, 3]) * self.factor
+        return [None if np.isnan(d) else float(d) for d in distances]
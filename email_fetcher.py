@@ -1,10 +1,16 @@
 import imaplib
 import email
 from email.header import decode_header
-from gpt_api import parse_emails
+from concurrent.futures import FIRST_COMPLETED, wait
+from fingerprint import content_hash
+from gpt_api import estimate_tokens
+from llm_engine import get_llm_engine
+from template_extractor import TemplateExtractor
 from config import config
 import logging
+import queue
 import re
+import threading
 
 logging.basicConfig(
     level=logging.INFO,
@@ -12,38 +18,165 @@ logging.basicConfig(
     handlers=[logging.FileHandler("cargobot.log"), logging.StreamHandler()]
 )
 
+_DONE = object()  # end-of-stream marker between pipeline stages
+
+class FolderSync:
+    """UID high-water mark of one mail folder, advanced as its messages are acknowledged.
+
+    The stored mark only moves up to the highest UID below which every
+    fetched message has been acknowledged, so a message whose extraction
+    failed, or whose offer was never handed on, is fetched again by the
+    next sync.
+    """
+    def __init__(self, db, folder, uidvalidity, uids):
+        """Start tracking the messages fetched from a folder.
+
+        Args:
+            db (Database): Database holding the sync state.
+            folder (str): IMAP folder name.
+            uidvalidity (int): UIDVALIDITY of the folder.
+            uids (list): UIDs fetched in this sync.
+        """
+        self.db = db
+        self.folder = folder
+        self.uidvalidity = uidvalidity
+        self.uids = sorted(int(uid) for uid in uids)
+        self.done = set()
+        self._next = 0  # index of the first UID not yet acknowledged in order
+        self._lock = threading.Lock()
+
+    def ack(self, uid):
+        """Mark a message as processed.
+
+        Args:
+            uid (bytes or int): UID of the message.
+        """
+        with self._lock:
+            self.done.add(int(uid))
+
+    def hold(self, uid=None):
+        """Leave a message unprocessed; the mark already stays below every UID not acknowledged.
+
+        Args:
+            uid (bytes or int): UID of the message.
+        """
+
+    def save(self):
+        """Store the highest UID below which every message was acknowledged, if it moved up."""
+        with self._lock:
+            start = self._next
+            while self._next < len(self.uids) and self.uids[self._next] in self.done:
+                self._next += 1
+            if self._next == start:
+                return
+            mark = self.uids[self._next - 1]
+        state = self.db.get_email_sync_state(self.folder)
+        if state and state[0] == self.uidvalidity and state[1] >= mark:
+            return  # a later sync of the same folder got further already
+        self.db.set_email_sync_state(self.folder, self.uidvalidity, mark)
+
 class EmailFetcher:
     """Fetches and processes emails using IMAP."""
-    def __init__(self, db):
+    def __init__(self, db, mail=None):
         """Initialize EmailFetcher with a database connection.
 
         Args:
             db (Database): Database instance.
+            mail (optional): Logged-in imaplib-compatible client to use instead
+                of connecting to the configured server, e.g. a local stand-in.
         """
         self.db = db
+        self.templates = TemplateExtractor()
+        self.owns_connection = mail is None
+        if mail is not None:
+            self.mail = mail
+            return
         try:
-            self.mail = imaplib.IMAP4_SSL(config["email_server"])
-            self.mail.login(config["email_user"], config["email_pass"])
-            self.mail.select(config["email_folder"])
+            self._connect()
         except Exception as e:
             logging.error(f"Error initializing EmailFetcher: {e}")
             raise
 
-    def fetch_new_emails(self):
-        """Fetch new email IDs.
+    def _connect(self):
+        """Open and log in to the configured IMAP server."""
+        self.mail = imaplib.IMAP4_SSL(config["email_server"], timeout=config["email_timeout"])
+        self.mail.login(config["email_user"], config["email_pass"])
+        self.mail.select(config["email_folder"])
+
+    def ensure_connected(self):
+        """Check the IMAP connection with a NOOP and reconnect if the server dropped it.
+
+        Lets a long-running process keep one connection across polls instead
+        of logging in for every one. A client passed in by the caller is
+        left alone.
+        """
+        if not self.owns_connection:
+            return
+        try:
+            self.mail.noop()
+            return
+        except Exception as e:
+            logging.warning(f"IMAP connection lost ({e}); reconnecting.")
+        try:
+            self.mail.logout()
+        except Exception:
+            pass
+        self._connect()
+
+    def select_folder(self, folder):
+        """Select a mail folder and read its UIDVALIDITY.
+
+        Args:
+            folder (str): IMAP folder name.
+
+        Returns:
+            int: UIDVALIDITY of the folder, or None if it could not be selected.
+        """
+        try:
+            status, _ = self.mail.select(folder, readonly=True)
+            if status != "OK":
+                logging.warning(f"Failed to select folder {folder}.")
+                return None
+            _, data = self.mail.response("UIDVALIDITY")
+            if not data or data[0] is None:
+                _, data = self.mail.status(folder, "(UIDVALIDITY)")
+                data = re.findall(rb"UIDVALIDITY (\d+)", data[0])
+            return int(data[0])
+        except Exception as e:
+            logging.error(f"Error selecting folder {folder}: {e}")
+            return None
+
+    def fetch_new_emails(self, folder=None):
+        """Fetch the UIDs of messages newer than the folder's stored high-water mark.
+
+        The folder is selected as a side effect. If its UIDVALIDITY changed
+        since the last sync, stored UIDs are meaningless and the whole
+        folder is fetched again.
+
+        Args:
+            folder (str, optional): IMAP folder name, defaults to the configured folder.
 
         Returns:
-            list: List of email IDs.
+            tuple: (list of UIDs as bytes, UIDVALIDITY); ([], None) on failure.
         """
+        folder = folder or config["email_folder"]
+        uidvalidity = self.select_folder(folder)
+        if uidvalidity is None:
+            return [], None
+        state = self.db.get_email_sync_state(folder)
+        last_uid = state[1] if state and state[0] == uidvalidity else 0
+        if state and state[0] != uidvalidity:
+            logging.warning(f"UIDVALIDITY of {folder} changed, resyncing the folder.")
         try:
-            status, messages = self.mail.search(None, '(SINCE "1-Jan-2024")')
+            status, messages = self.mail.uid("SEARCH", None, f"UID {last_uid + 1}:*")
             if status != "OK":
                 logging.warning("Failed to fetch email IDs.")
-                return []
-            return messages[0].split()
+                return [], None
+            # "n:*" always matches the newest message, even when its UID is below n.
+            return [uid for uid in messages[0].split() if int(uid) > last_uid], uidvalidity
         except Exception as e:
             logging.error(f"Error fetching email IDs: {e}")
-            return []
+            return [], None
 
     def clean_email_body(self, body):
         """Clean email body by removing signatures and noise.
@@ -68,58 +201,303 @@ class EmailFetcher:
         """Process a single email to extract its body.
 
         Args:
-            email_id (str): Email ID.
+            email_id (str): Email UID in the selected folder.
 
         Returns:
             tuple: (cleaned body, raw body) or (None, None) if failed.
         """
         try:
-            status, msg_data = self.mail.fetch(email_id, '(BODY.PEEK[])')
+            status, msg_data = self.mail.uid("FETCH", email_id, '(BODY.PEEK[])')
             if status != "OK":
                 logging.warning(f"Failed to fetch email {email_id}.")
                 return None, None
-            raw_email = msg_data[0][1]
+            return self._parse_message(email_id, msg_data[0][1])
+        except Exception as e:
+            logging.error(f"Error processing email {email_id}: {e}")
+            return None, None
+
+    def fetch_messages(self, email_ids, chunk_size=None):
+        """Fetch raw messages many at a time using IMAP UID sets.
+
+        Args:
+            email_ids (list): Email UIDs in the selected folder.
+            chunk_size (int, optional): Messages per FETCH round-trip.
+
+        Yields:
+            tuple: (email ID, raw message bytes), in the order of email_ids.
+        """
+        chunk_size = chunk_size or config["email_fetch_chunk"]
+        for i in range(0, len(email_ids), chunk_size):
+            chunk = email_ids[i:i + chunk_size]
+            try:
+                status, msg_data = self.mail.uid("FETCH", self._message_set(chunk), '(BODY.PEEK[])')
+                if status != "OK":
+                    logging.warning(f"Failed to fetch emails {chunk[0]}..{chunk[-1]}.")
+                    continue
+            except Exception as e:
+                logging.error(f"Error fetching emails {chunk[0]}..{chunk[-1]}: {e}")
+                continue
+            messages = {}
+            for part in msg_data:
+                if isinstance(part, tuple):
+                    match = re.search(rb"UID (\d+)", part[0])
+                    if match:
+                        messages[match.group(1)] = part[1]
+            for email_id in chunk:
+                key = email_id if isinstance(email_id, bytes) else str(email_id).encode()
+                if key in messages:
+                    yield email_id, messages[key]
+                else:
+                    logging.warning(f"Email {email_id} missing from FETCH response.")
+
+    def fetch_and_process_emails(self, batch_size=None, folders=None):
+        """Fetch and process new emails from every configured folder.
+
+        Args:
+            batch_size (int, optional): Maximum number of emails per LLM call,
+                defaults to llm_max_batch.
+            folders (list, optional): Folders to sync, defaults to the configured folders.
+
+        Returns:
+            tuple: (list of parsed offers, list of raw messages).
+        """
+        parsed_offers = []
+        raw_messages = []
+        for parsed, raw in self.stream_emails(batch_size, folders):
+            parsed_offers.append(parsed)
+            raw_messages.append(raw)
+        return parsed_offers, raw_messages
+
+    def stream_emails(self, batch_size=None, folders=None):
+        """Fetch and process new emails, yielding offers as soon as they are extracted.
+
+        A message counts as processed once the caller has consumed its
+        offer, or right away if it has none: only then is its raw content
+        stored and the folder's UID mark moved past it, see iter_emails.
+
+        Args:
+            batch_size (int, optional): Maximum number of emails per LLM call,
+                defaults to llm_max_batch.
+            folders (list, optional): Folders to sync, defaults to the configured folders.
+
+        Yields:
+            tuple: (parsed offer, raw message), in completion order.
+        """
+        syncs = {}
+        try:
+            for parsed, raw, sync, uid in self.iter_emails(batch_size, folders):
+                if parsed:
+                    yield parsed, raw
+                if raw is not None:
+                    self.db.insert_raw_data("email", raw)
+                sync.ack(uid)
+                syncs[sync.folder] = sync
+        finally:
+            for sync in syncs.values():
+                sync.save()
+
+    def iter_emails(self, batch_size=None, folders=None):
+        """Fetch and process new emails, leaving raw storage and sync progress to the caller.
+
+        Only messages above each folder's stored UID high-water mark are
+        fetched. Every message that was processed is yielded, with or
+        without an offer; the caller stores its raw content once it is done
+        with it and acknowledges its UID on the folder's FolderSync, whose
+        save() advances the stored mark. Messages whose fetch or LLM
+        extraction failed are not yielded, so the mark stays below them and
+        the next sync fetches them again.
+
+        Args:
+            batch_size (int, optional): Maximum number of emails per LLM call,
+                defaults to llm_max_batch.
+            folders (list, optional): Folders to sync, defaults to the configured folders.
+
+        Yields:
+            tuple: (parsed offer or None, raw message or None if it needs no
+                storing, FolderSync, UID), in completion order.
+        """
+        batch_size = batch_size or config["llm_max_batch"]
+        for folder in folders or config["email_folders"]:
+            uids, uidvalidity = self.fetch_new_emails(folder)
+            if not uids:
+                continue
+            logging.info(f"Fetching {len(uids)} new emails from {folder}.")
+            sync = FolderSync(self.db, folder, uidvalidity, uids)
+            for parsed, raw, uid in self._process_emails(uids, batch_size):
+                yield parsed, raw, sync, uid
+
+    def _process_emails(self, email_ids, batch_size):
+        """Fetch and process emails of the selected folder through a pipelined set of stages.
+
+        A fetch thread pulls messages in IMAP UID-set chunks, a parse
+        thread cleans them into batches of up to llm_token_budget estimated
+        tokens, and the batches are handed to the shared LLM engine. Stages
+        are connected by bounded queues and at most llm_workers batches are
+        outstanding, so network round-trips overlap with parsing and
+        extraction without unbounded buffering. Messages whose raw content
+        is already stored are passed over, and messages matching a known
+        template are extracted locally; only the rest reach the LLM.
+
+        Args:
+            email_ids (list): Email UIDs to process.
+            batch_size (int): Maximum number of emails per batch.
+
+        Yields:
+            tuple: (parsed offer or None, raw message or None, UID) for every
+                message processed, in completion order. The raw message is
+                None for messages already stored or that could not be read.
+        """
+        fetched = queue.Queue(maxsize=config["pipeline_queue_size"] * batch_size)
+        batches = queue.Queue(maxsize=config["pipeline_queue_size"])
+
+        def fetch_stage():
+            try:
+                for item in self.fetch_messages(email_ids):
+                    fetched.put(item)
+            except Exception as e:
+                logging.error(f"Error in email fetch stage: {e}")
+            finally:
+                fetched.put(_DONE)
+
+        def parse_stage():
+            batch = []
+            tokens = 0
+            try:
+                while (item := fetched.get()) is not _DONE:
+                    cleaned_body, raw = self._parse_message(*item)
+                    cost = estimate_tokens(cleaned_body) if cleaned_body else 0
+                    if batch and (tokens + cost > config["llm_token_budget"] or len(batch) >= batch_size):
+                        batches.put(batch)
+                        batch, tokens = [], 0
+                    batch.append((cleaned_body, raw, item[0]))
+                    tokens += cost
+            except Exception as e:
+                logging.error(f"Error in email parse stage: {e}")
+                while fetched.get() is not _DONE:  # drain so the fetch stage can finish
+                    pass
+            finally:
+                if batch:
+                    batches.put(batch)
+                batches.put(_DONE)
+
+        def collect(future, batch):
+            try:
+                results = future.result()
+            except Exception as e:
+                logging.error(f"Error extracting email batch; its {len(batch)} emails stay unsynced: {e}")
+                return
+            for parsed, (_, raw, uid) in zip(results, batch):
+                if parsed:
+                    parsed["source"] = "email"
+                yield parsed or None, raw, uid
+
+        stages = [threading.Thread(target=fetch_stage, daemon=True), threading.Thread(target=parse_stage, daemon=True)]
+        for stage in stages:
+            stage.start()
+        engine = get_llm_engine()
+        pending = {}
+        while (batch := batches.get()) is not _DONE:
+            unread = [item for item in batch if not item[0]]
+            for _, _, uid in unread:
+                yield None, None, uid  # unreadable or empty; fetching it again will not help
+            batch = self._skip_known([item for item in batch if item[0]])
+            llm_batch = []
+            for body, raw, uid in batch:
+                if raw is None:
+                    yield None, None, uid  # already stored by an earlier run
+                    continue
+                # Templates describe the message body; the subject would keep them from matching it whole.
+                parsed = self.templates.extract(self.clean_email_body(raw.partition("\n\n")[2]))
+                if parsed:
+                    parsed["source"] = "email"
+                    yield parsed, raw, uid
+                else:
+                    llm_batch.append((body, raw, uid))
+            if not llm_batch:
+                continue
+            pending[engine.submit([body for body, _, _ in llm_batch])] = llm_batch
+            # Hand out finished batches right away; block only when too many are outstanding.
+            finished, _ = wait(pending, timeout=0 if len(pending) <= config["llm_workers"] else None,
+                               return_when=FIRST_COMPLETED)
+            for future in finished:
+                yield from collect(future, pending.pop(future))
+        while pending:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                yield from collect(future, pending.pop(future))
+        for stage in stages:
+            stage.join()
+
+    def _skip_known(self, batch):
+        """Mark messages whose raw content was already stored by an earlier run.
+
+        Args:
+            batch (list): (cleaned body, raw body, UID) tuples.
+
+        Returns:
+            list: The same messages in order, with the raw body set to None
+                for those seen before.
+        """
+        hashes = [content_hash(raw) for _, raw, _ in batch]
+        known = self.db.get_known_raw_hashes(hashes)
+        marked = []
+        for (body, raw, uid), digest in zip(batch, hashes):
+            if digest in known:
+                raw = None
+            known.add(digest)
+            marked.append((body, raw, uid))
+        skipped = sum(raw is None for _, raw, _ in marked)
+        if skipped:
+            logging.info(f"Skipped {skipped} already processed emails.")
+        return marked
+
+    def _parse_message(self, email_id, raw_email):
+        """Turn a raw message into its cleaned and raw body text.
+
+        The raw body starts with the message's Message-ID and Date headers,
+        so a mail that recurs word for word is still stored, and deduplicated,
+        as a message of its own.
+
+        Args:
+            email_id (str): Email ID, for logging.
+            raw_email (bytes): Raw RFC 822 message.
+
+        Returns:
+            tuple: (cleaned body, raw body) or (None, None) if failed.
+        """
+        try:
             msg = email.message_from_bytes(raw_email)
             subject = decode_header(msg.get("Subject", ""))[0][0]
             if isinstance(subject, bytes):
                 subject = subject.decode()
             body = self._get_email_body(msg)
             cleaned_body = self.clean_email_body(f"{subject}\n\n{body}")
-            return cleaned_body, f"{subject}\n\n{body}"
+            headers = "".join(f"{name}: {' '.join(str(msg[name]).split())}\n"
+                              for name in ("Message-ID", "Date") if msg[name])
+            return cleaned_body, f"{headers}{subject}\n\n{body}"
         except Exception as e:
             logging.error(f"Error processing email {email_id}: {e}")
             return None, None
 
-    def fetch_and_process_emails(self, batch_size=3):
-        """Fetch and process emails in batches.
+    def _message_set(self, email_ids):
+        """Compress email UIDs into an IMAP UID set such as "1:200,205".
 
         Args:
-            batch_size (int): Number of emails to process per batch.
+            email_ids (list): Email UIDs (bytes or str).
 
         Returns:
-            tuple: (list of parsed offers, list of raw messages).
+            str: IMAP UID set.
         """
-        email_ids = self.fetch_new_emails()
-        parsed_offers = []
-        raw_messages = []
-        for i in range(0, len(email_ids), batch_size):
-            batch_ids = email_ids[i:i + batch_size]
-            batch_bodies = []
-            batch_raw = []
-            for email_id in batch_ids:
-                cleaned_body, raw = self.process_email(email_id)
-                if cleaned_body:
-                    batch_bodies.append(cleaned_body)
-                    batch_raw.append(raw)
-                    self.db.insert_raw_data("email", raw)
-            if batch_bodies:
-                parsed_batch = parse_emails(batch_bodies)
-                for parsed, raw in zip(parsed_batch, batch_raw):
-                    if parsed:
-                        parsed["source"] = "email"
-                        parsed_offers.append(parsed)
-                        raw_messages.append(raw)
-        return parsed_offers, raw_messages
+        numbers = sorted({int(email_id) for email_id in email_ids})
+        ranges = []
+        start = prev = numbers[0]
+        for number in numbers[1:]:
+            if number != prev + 1:
+                ranges.append(f"{start}:{prev}" if start != prev else str(start))
+                start = number
+            prev = number
+        ranges.append(f"{start}:{prev}" if start != prev else str(start))
+        return ",".join(ranges)
 
     def _get_email_body(self, msg):
         """Extract the body from an email message.
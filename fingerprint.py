@@ -0,0 +1,80 @@
+from datetime import datetime
+import hashlib
+import re
+
+LF_SEPARATORS = re.compile(r"[\s_\-.]+")
+
+def content_hash(raw_content):
+    """Hash raw input so the same message can be recognised when it arrives again.
+
+    Whitespace runs are collapsed first, so re-exports that only differ in
+    line endings or indentation hash the same.
+
+    Args:
+        raw_content (str): Raw message or record text.
+
+    Returns:
+        str: Hex SHA-256 digest.
+    """
+    text = re.sub(r"\s+", " ", str(raw_content)).strip()
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def offer_fingerprint(loading_city_id, unloading_city_id, price, lf_number, timestamp, window_hours=24):
+    """Fingerprint of the load an offer describes, independent of where it was posted.
+
+    Two offers get the same fingerprint when they have the same normalized
+    cities, the same price rounded to whole euros, the same LF number
+    (ignoring case and separators) and were received in the same time
+    window.
+
+    Args:
+        loading_city_id (int): ID of the loading city.
+        unloading_city_id (int): ID of the unloading city.
+        price (float): Price in EUR or None.
+        lf_number (str): LF number or None.
+        timestamp (datetime or str): Time the offer was received.
+        window_hours (float): Length of the time window in hours.
+
+    Returns:
+        str: Hex SHA-1 digest.
+    """
+    key, window = _fingerprint_parts(loading_city_id, unloading_city_id, price, lf_number, timestamp, window_hours)
+    return _fingerprint(key, window)
+
+def offer_fingerprints(loading_city_id, unloading_city_id, price, lf_number, timestamp, window_hours=24):
+    """Fingerprints of an offer in its own time window and in the one before.
+
+    Windows are fixed, so an offer repeated shortly after a window boundary
+    lands in a new window; checking the previous window's fingerprint too,
+    against offers received less than window_hours ago, makes the window
+    slide with the offer.
+
+    Args:
+        loading_city_id (int): ID of the loading city.
+        unloading_city_id (int): ID of the unloading city.
+        price (float): Price in EUR or None.
+        lf_number (str): LF number or None.
+        timestamp (datetime): Time the offer was received.
+        window_hours (float): Length of the time window in hours.
+
+    Returns:
+        tuple: (fingerprint in the current window, fingerprint in the previous window).
+    """
+    key, window = _fingerprint_parts(loading_city_id, unloading_city_id, price, lf_number, timestamp, window_hours)
+    return _fingerprint(key, window), _fingerprint(key, window - 1 if window != "" else "")
+
+def _fingerprint_parts(loading_city_id, unloading_city_id, price, lf_number, timestamp, window_hours):
+    """Normalized load key and time window number of an offer, see offer_fingerprint."""
+    try:
+        price_key = str(round(float(price))) if price not in (None, "") else ""
+    except (TypeError, ValueError):
+        price_key = str(price).strip()
+    lf_key = LF_SEPARATORS.sub("", str(lf_number)).upper() if lf_number else ""
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp)
+    window = int(timestamp.timestamp() // (window_hours * 3600)) if timestamp else ""
+    return f"{loading_city_id}|{unloading_city_id}|{price_key}|{lf_key}", window
+
+def _fingerprint(key, window):
+    """Hash a load key together with its time window."""
+    return hashlib.sha1(f"{key}|{window}".encode("utf-8")).hexdigest()
@@ -0,0 +1,97 @@
+from collections import Counter, defaultdict
+import re
+import unicodedata
+
+TRANSLITERATIONS = str.maketrans({"ä": "ae", "ö": "oe", "ü": "ue", "ß": "ss"})
+
+def normalize_name(name):
+    """Reduce a place name to a comparison key.
+
+    Case, surrounding whitespace, punctuation and accents are dropped, and
+    German umlauts are transliterated, so "München", "muenchen" and
+    " MUENCHEN " all map to "muenchen".
+
+    Args:
+        name (str): Place name.
+
+    Returns:
+        str: Normalized key.
+    """
+    key = name.casefold().translate(TRANSLITERATIONS)
+    key = "".join(c for c in unicodedata.normalize("NFKD", key) if not unicodedata.combining(c))
+    return re.sub(r"[\W_]+", " ", key).strip()
+
+def trigrams(key):
+    """Padded character trigrams of a normalized key.
+
+    Args:
+        key (str): Normalized key.
+
+    Returns:
+        set: Trigrams.
+    """
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class TrigramIndex:
+    """Inverted trigram index for approximate matching of normalized names."""
+    def __init__(self):
+        """Initialize an empty index."""
+        self.postings = defaultdict(set)
+        self.grams = {}
+        self.values = {}
+
+    def add(self, key, value):
+        """Index a normalized key.
+
+        Args:
+            key (str): Normalized key.
+            value: Value returned when the key matches.
+        """
+        if key in self.values:
+            self.values[key] = value
+            return
+        grams = trigrams(key)
+        self.grams[key] = grams
+        self.values[key] = value
+        for gram in grams:
+            self.postings[gram].add(key)
+
+    def search(self, key):
+        """Find the closest indexed key.
+
+        Args:
+            key (str): Normalized key to look up.
+
+        Returns:
+            tuple: (value, score between 0 and 1), or (None, 0.0) if nothing overlaps.
+        """
+        matches = self.top(key, 1)
+        return matches[0][:2] if matches else (None, 0.0)
+
+    def top(self, key, count=2):
+        """Find the closest values for a key.
+
+        Candidates are the keys sharing at least one trigram; they are scored
+        with the Dice coefficient of the trigram sets. Keys with the same
+        value count once, with their best score, so the aliases of one city
+        do not crowd out a competing city.
+
+        Args:
+            key (str): Normalized key to look up.
+            count (int): Number of values to return.
+
+        Returns:
+            list: (value, score, matched key) tuples, best first.
+        """
+        grams = trigrams(key)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.postings.get(gram, ()))
+        best = {}
+        for candidate, overlap in shared.items():
+            score = 2 * overlap / (len(grams) + len(self.grams[candidate]))
+            value = self.values[candidate]
+            if value not in best or score > best[value][1]:
+                best[value] = (value, score, candidate)
+        return sorted(best.values(), key=lambda match: match[1], reverse=True)[:count]
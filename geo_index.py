@@ -0,0 +1,118 @@
+from collections import defaultdict
+import logging
+import math
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(levelname)s - %(message)s",
+    handlers=[logging.FileHandler("cargobot.log"), logging.StreamHandler()]
+)
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.32
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points.
+
+    Args:
+        lat1 (float): Latitude of the first point.
+        lon1 (float): Longitude of the first point.
+        lat2 (float): Latitude of the second point.
+        lon2 (float): Longitude of the second point.
+
+    Returns:
+        float: Distance in km.
+    """
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+class CityGridIndex:
+    """Uniform lat/lon grid over city coordinates for radius lookups.
+
+    Each city is bucketed into a cell of cell_km along the meridian; a radius
+    query only visits the cells overlapping the search box and checks exact
+    great-circle distance for the cities in them. Results are memoised until
+    the next city is added.
+    """
+    def __init__(self, db, cell_km=50.0):
+        """Initialize the index and load all cities with coordinates.
+
+        Args:
+            db (Database): Database instance.
+            cell_km (float): Grid cell size in km.
+        """
+        self.db = db
+        self.cell_deg = cell_km / KM_PER_DEGREE
+        self.cells = defaultdict(list)
+        self.coords = {}
+        self._neighbors = {}
+        self.load()
+        db.add_city_listener(self.add_city)
+
+    def load(self):
+        """(Re)load all cities from the database."""
+        self.cells.clear()
+        self.coords.clear()
+        self._neighbors.clear()
+        for city in self.db.get_all_cities():
+            self.add_city(city)
+        logging.info(f"City grid index loaded with {len(self.coords)} cities.")
+
+    def add_city(self, city):
+        """Add a city to the index.
+
+        Args:
+            city (tuple): City data (id, name, country_code, lat, lon).
+        """
+        city_id, lat, lon = city[0], city[3], city[4]
+        if lat is None or lon is None or city_id in self.coords:
+            return
+        self.coords[city_id] = (lat, lon)
+        self.cells[self._cell(lat, lon)].append(city_id)
+        self._neighbors.clear()
+
+    def neighbors(self, city_id, radius_km):
+        """Find cities within a radius of a city, excluding the city itself.
+
+        Args:
+            city_id (int): ID of the centre city.
+            radius_km (float): Search radius in km.
+
+        Returns:
+            list: (city_id, distance_km) tuples, nearest first.
+        """
+        if city_id not in self.coords or radius_km <= 0:
+            return []
+        key = (city_id, radius_km)
+        if key not in self._neighbors:
+            self._neighbors[key] = self._search(city_id, radius_km)
+        return self._neighbors[key]
+
+    def _search(self, city_id, radius_km):
+        """Scan the grid cells around a city for neighbours within a radius."""
+        lat, lon = self.coords[city_id]
+        lat_span = radius_km / KM_PER_DEGREE
+        cos_lat = math.cos(math.radians(min(abs(lat) + lat_span, 89.9)))
+        lon_span = radius_km / (KM_PER_DEGREE * cos_lat)
+        row, col = self._cell(lat, lon)
+        rows = math.ceil(lat_span / self.cell_deg)
+        cols = math.ceil(lon_span / self.cell_deg)
+        found = []
+        for r in range(row - rows, row + rows + 1):
+            for c in range(col - cols, col + cols + 1):
+                for other_id in self.cells.get((r, c), ()):
+                    if other_id == city_id:
+                        continue
+                    other_lat, other_lon = self.coords[other_id]
+                    distance = haversine_km(lat, lon, other_lat, other_lon)
+                    if distance <= radius_km:
+                        found.append((other_id, distance))
+        found.sort(key=lambda x: x[1])
+        return found
+
+    def _cell(self, lat, lon):
+        """Grid cell containing a coordinate."""
+        return (math.floor(lat / self.cell_deg), math.floor(lon / self.cell_deg))
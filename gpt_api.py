@@ -1,5 +1,8 @@
-import openai
+import hashlib
 import json
+import os
+import re
+import tempfile
 from config import config
 import logging
 
@@ -9,19 +12,11 @@ logging.basicConfig(
     handlers=[logging.FileHandler("cargobot.log"), logging.StreamHandler()]
 )
 
-openai.api_key = config["gpt_api_key"]
+PROMPT_VERSION = "2"  # part of the cache key; bump when the prompt changes
 
-def parse_emails(email_bodies):
-    """Parse multiple email bodies using GPT-4o Mini.
-
-    Args:
-        email_bodies (list): List of email bodies to parse.
-
-    Returns:
-        list: List of parsed offer data.
-    """
-    prompt = """
-    Extract the following information from each email below, separated by '---':
+PROMPT = """
+    Extract the following information from each email below. Every email starts
+    with a line "Email <index>:".
     - Sender's email
     - Loading city (required)
     - Unloading city (required)
@@ -34,16 +29,260 @@ def parse_emails(email_bodies):
 
     Emails:
     """
-    prompt += "\n---\n".join(email_bodies)
-    prompt += "\n\nProvide the output in JSON format as a list of objects."
-    try:
-        response = openai.Completion.create(
-            model="gpt-4o-mini",
+
+class OpenAIClient:
+    """LLM client backed by the OpenAI completions API."""
+    def __init__(self, model="gpt-4o-mini"):
+        """Initialize the client.
+
+        Args:
+            model (str): Model name.
+        """
+        import openai  # deferred: the SDK takes longer to import than the rest of the app
+        openai.api_key = config["gpt_api_key"]
+        self.openai = openai
+        self.model = model
+
+    def complete(self, prompt, max_tokens):
+        """Run a completion.
+
+        Args:
+            prompt (str): Prompt text.
+            max_tokens (int): Maximum number of tokens to generate.
+
+        Returns:
+            str: Completion text.
+        """
+        response = self.openai.Completion.create(
+            model=self.model,
             prompt=prompt,
-            max_tokens=1000,
-            temperature=0
+            max_tokens=max_tokens,
+            temperature=0,
+            request_timeout=config["llm_timeout"]
         )
-        return json.loads(response.choices[0].text.strip())
-    except Exception as e:
-        logging.error(f"Error parsing emails with GPT-4o Mini: {e}")
-        return []
\ No newline at end of file
+        return response.choices[0].text
+
+    async def acomplete(self, prompt, max_tokens):
+        """Run a completion without blocking the event loop.
+
+        Args:
+            prompt (str): Prompt text.
+            max_tokens (int): Maximum number of tokens to generate.
+
+        Returns:
+            str: Completion text.
+        """
+        response = await self.openai.Completion.acreate(
+            model=self.model,
+            prompt=prompt,
+            max_tokens=max_tokens,
+            temperature=0,
+            request_timeout=config["llm_timeout"]
+        )
+        return response.choices[0].text
+
+class ResponseCache:
+    """Content-addressed on-disk cache of per-email parse results.
+
+    Each result is a small JSON file named after the SHA-256 of the prompt
+    version, the model and the email body, so identical bodies are only
+    ever sent to the LLM once.
+    """
+    def __init__(self, cache_dir):
+        """Initialize the cache.
+
+        Args:
+            cache_dir (str): Directory holding the cache files.
+        """
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, model, email_body):
+        """Cache key of an email body.
+
+        Args:
+            model (str): Model name.
+            email_body (str): Cleaned email body.
+
+        Returns:
+            str: Hex digest.
+        """
+        return hashlib.sha256(f"{PROMPT_VERSION}\0{model}\0{email_body}".encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Look up a cached result.
+
+        Args:
+            key (str): Cache key.
+
+        Returns:
+            tuple: (True, result) on a hit, (False, None) on a miss.
+        """
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                result = json.load(f)["result"]
+            self.hits += 1
+            return True, result
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable LLM cache entry {key}: {e}")
+        self.misses += 1
+        return False, None
+
+    def put(self, key, result):
+        """Store a result.
+
+        Args:
+            key (str): Cache key.
+            result: JSON-serialisable parse result, may be None.
+        """
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"result": result}, f)
+            os.replace(tmp_path, path)  # atomic, so concurrent readers never see half a file
+        except Exception as e:
+            logging.error(f"Error writing LLM cache entry {key}: {e}")
+
+    def _path(self, key):
+        """File holding a cache entry, fanned out by the first two hex digits."""
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+_client = None
+_cache = None
+
+def set_llm_client(client):
+    """Replace the LLM client, e.g. with a local fake.
+
+    Args:
+        client: Object with a complete(prompt, max_tokens) method returning text,
+            or None to go back to the OpenAI client.
+    """
+    global _client
+    _client = client
+
+def get_llm_client():
+    """The LLM client in use, creating the OpenAI client on first use.
+
+    Returns:
+        object: LLM client.
+    """
+    global _client
+    if _client is None:
+        _client = OpenAIClient(config["llm_model"])
+    return _client
+
+def get_response_cache():
+    """The on-disk response cache, or None when caching is disabled.
+
+    Returns:
+        ResponseCache: Shared cache instance.
+    """
+    global _cache
+    if _cache is None and config["llm_cache_dir"]:
+        _cache = ResponseCache(config["llm_cache_dir"])
+    return _cache
+
+def estimate_tokens(text):
+    """Rough token count of a text, about four characters per token.
+
+    Args:
+        text (str): Text.
+
+    Returns:
+        int: Estimated number of tokens.
+    """
+    return len(text) // 4 + 1
+
+def pack_batches(email_bodies, token_budget=None, max_batch=None):
+    """Group emails into batches that fit a prompt token budget.
+
+    Emails are packed greedily in order; an email larger than the budget
+    gets a batch of its own.
+
+    Args:
+        email_bodies (list): Email bodies.
+        token_budget (int, optional): Maximum estimated email tokens per batch.
+        max_batch (int, optional): Maximum number of emails per batch.
+
+    Returns:
+        list: Batches as lists of indexes into email_bodies.
+    """
+    token_budget = token_budget or config["llm_token_budget"]
+    max_batch = max_batch or config["llm_max_batch"]
+    batches = []
+    batch, tokens = [], 0
+    for index, body in enumerate(email_bodies):
+        cost = estimate_tokens(body)
+        if batch and (tokens + cost > token_budget or len(batch) >= max_batch):
+            batches.append(batch)
+            batch, tokens = [], 0
+        batch.append(index)
+        tokens += cost
+    if batch:
+        batches.append(batch)
+    return batches
+
+def build_prompt(email_bodies):
+    """Build the extraction prompt for one batch.
+
+    Args:
+        email_bodies (list): Email bodies in the batch.
+
+    Returns:
+        str: Prompt text.
+    """
+    prompt = PROMPT
+    prompt += "\n---\n".join(f"Email {i}:\n{body}" for i, body in enumerate(email_bodies))
+    prompt += ("\n\nProvide the output in JSON format as a list of objects, one per email, "
+               'each with an "index" field holding the email number.')
+    return prompt
+
+def output_budget(batch_size):
+    """Completion token limit for a batch.
+
+    Args:
+        batch_size (int): Number of emails in the batch.
+
+    Returns:
+        int: Maximum number of tokens to generate.
+    """
+    return config["llm_output_tokens_per_email"] * batch_size + 50
+
+def map_results(text, batch_size):
+    """Map a completion back onto the emails of its batch.
+
+    Objects are matched by their "index" field. If the model left the
+    indexes out but returned exactly one entry per email, entries are
+    matched by position.
+
+    Args:
+        text (str): Completion text.
+        batch_size (int): Number of emails in the batch.
+
+    Returns:
+        list: Parsed offers aligned with the batch, or None if the completion
+            is malformed.
+    """
+    text = re.sub(r"^```(?:json)?|```$", "", text.strip()).strip()
+    try:
+        items = json.loads(text)
+    except ValueError:
+        return None
+    if not isinstance(items, list):
+        return None
+    indexed = [item for item in items if isinstance(item, dict) and isinstance(item.get("index"), int)]
+    if indexed and len(indexed) == len([item for item in items if item is not None]):
+        results = [None] * batch_size
+        for item in indexed:
+            if not 0 <= item["index"] < batch_size:
+                return None
+            results[item.pop("index")] = item
+        return results
+    if len(items) == batch_size and all(item is None or isinstance(item, dict) for item in items):
+        return items
+    return None
@@ -0,0 +1,533 @@
+from database import DUPLICATE_OFFER, Database
+from data_normalizer import DataNormalizer
+from fingerprint import content_hash
+from whatsapp_parser import iter_whatsapp_offers
+from config import config
+import argparse
+import logging
+import queue
+import random
+import signal
+import sys
+import threading
+import time
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(levelname)s - %(message)s",
+    handlers=[logging.FileHandler("cargobot.log"), logging.StreamHandler()]
+)
+
+SOURCES = ("email", "whatsapp", "web")
+RAW_CHECK_CHUNK = 500  # source items checked against raw_data per query
+
+_DONE = object()  # a source has finished
+_FLUSH = object()  # no item arrived within the linger time
+
+class StageStats:
+    """Throughput and latency counters of one pipeline stage."""
+    def __init__(self, name):
+        """Initialize empty counters.
+
+        Args:
+            name (str): Stage name.
+        """
+        self.name = name
+        self.items_in = 0
+        self.items_out = 0
+        self.batches = 0
+        self.busy = 0.0
+        self.max_latency = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, items_in, items_out, seconds):
+        """Count one batch passing through the stage.
+
+        Args:
+            items_in (int): Items the stage received.
+            items_out (int): Items it passed on.
+            seconds (float): Time spent on the batch.
+        """
+        with self._lock:
+            self.items_in += items_in
+            self.items_out += items_out
+            self.batches += 1
+            self.busy += seconds
+            self.max_latency = max(self.max_latency, seconds)
+
+    def snapshot(self):
+        """Current counters.
+
+        Returns:
+            dict: Items in and out, batches, busy seconds, items per busy
+                second and mean and maximum batch latency in milliseconds.
+        """
+        with self._lock:
+            return {
+                "stage": self.name,
+                "in": self.items_in,
+                "out": self.items_out,
+                "batches": self.batches,
+                "busy_s": round(self.busy, 3),
+                "items_per_s": round(self.items_in / self.busy, 1) if self.busy else 0.0,
+                "mean_ms": round(1000 * self.busy / self.batches, 1) if self.batches else 0.0,
+                "max_ms": round(1000 * self.max_latency, 1)
+            }
+
+class IngestPipeline:
+    """Headless ingestion: sources -> normalise -> bulk insert.
+
+    Every source runs on its own thread and feeds a bounded queue, so a
+    slow IMAP server does not hold up the WhatsApp export or the web
+    crawl. The consumer groups items into batches of up to
+    ingest_batch_size, flushing a partial batch when nothing arrives for
+    ingest_batch_linger seconds, and runs each batch through the stages:
+
+    - normalise: DataNormalizer.process_offers, resolving all missing
+      distances of the batch together;
+    - insert: one bulk insert for the offers, which drops those repeating
+      an offer of the dedup window or of the batch, and one for the raw
+      content.
+
+    After a batch is inserted, the items whose offer was stored, or that
+    had none, are acknowledged to their source, which only then moves its
+    sync position (the email UID mark, the WhatsApp checkpoint, the web
+    page validators) past them; a failed insert, a crash or an abandoned
+    poll leaves them to be fetched again.
+    WhatsApp messages and web rows whose text is already in raw_data are
+    dropped at the source, as EmailFetcher does for emails. Sources only
+    run concurrently on a pooled database; with a single connection they
+    run one after another on the calling thread.
+
+    run() polls every source once; serve() keeps polling each source on
+    its own schedule until stop() is called.
+    """
+    def __init__(self, db, normalizer=None, fetcher=None, batch_size=None, linger=None,
+                 queue_size=None, on_inserted=None):
+        """Initialize the pipeline.
+
+        Args:
+            db (Database): Database instance.
+            normalizer (DataNormalizer, optional): Normalizer, built on db if not given.
+            fetcher (EmailFetcher, optional): Email fetcher; one is connected
+                when the email source first runs if not given.
+            batch_size (int, optional): Maximum items per batch.
+            linger (float, optional): Seconds to wait for more items before
+                processing a partial batch.
+            queue_size (int, optional): Maximum items buffered between the
+                sources and the stages.
+            on_inserted (callable, optional): Called with the list of offers
+                inserted by each batch, with their "id" set.
+        """
+        self.db = db
+        self.normalizer = normalizer or DataNormalizer(db)
+        self.fetcher = fetcher
+        self.batch_size = batch_size or config["ingest_batch_size"]
+        self.linger = config["ingest_batch_linger"] if linger is None else linger
+        self.queue_size = queue_size or config["ingest_queue_size"]
+        self.drain_timeout = config["ingest_drain_timeout"]
+        self.on_inserted = on_inserted
+        self.source_stats = {}
+        self.stages = {name: StageStats(name) for name in ("normalise", "insert")}
+        self.end_to_end = StageStats("end_to_end")
+        self.failed_sources = []
+        self._stop = threading.Event()
+        self._abort = threading.Event()
+
+    def run(self, sources=None):
+        """Ingest new offers from the given sources once.
+
+        Args:
+            sources (list, optional): Source names, defaults to ingest_sources.
+
+        Returns:
+            dict: Run summary, see stats.
+        """
+        sources = [name for name in (sources or config["ingest_sources"]) if self._known_source(name)]
+        started = time.monotonic()
+        if self.db.pooled and len(sources) > 1:
+            items = self._concurrent_items(sources, self._poll_once)
+        else:
+            items = (item for name in sources for item in self._timed_source(name))
+        for batch in self._batches(items):
+            self._process(batch)
+        summary = self.stats()
+        summary["seconds"] = round(time.monotonic() - started, 3)
+        for entry in summary["sources"] + summary["stages"]:
+            logging.info(f"Ingest stage {entry}")
+        logging.info(f"Ingest finished in {summary['seconds']}s: {summary['inserted']} offers inserted.")
+        return summary
+
+    def serve(self, sources=None, intervals=None, jitter=None, drain_timeout=None):
+        """Poll sources on their own schedules until stop() is called.
+
+        Each source polls on its own thread, so a slow IMAP server never
+        delays the WhatsApp export or the web crawl. The IMAP connection and
+        the web crawler's HTTP session stay open between polls. After
+        stop(), no new polls start; polls already running may finish within
+        drain_timeout seconds, after which they are abandoned at the next
+        item. A poll blocked in a network call is only abandoned once the
+        call returns, which the email, LLM, routing, geocoding and web
+        timeouts bound. Everything the sources produced is still inserted
+        before serve returns. An abandoned poll's sync position (the email
+        UID mark, the WhatsApp checkpoint, the web page validators) only
+        covers inserted items, so what it did not hand on is fetched again
+        on the next poll.
+
+        Args:
+            sources (list, optional): Source names, defaults to ingest_sources.
+            intervals (dict, optional): Source name -> seconds between polls,
+                defaults to the ingest_interval_<source> settings.
+            jitter (float, optional): Fraction by which each interval is
+                randomly stretched or shortened, so polls drift apart.
+            drain_timeout (float, optional): Seconds to wait for running polls after stop().
+
+        Returns:
+            dict: Counters over the whole run, see stats.
+        """
+        if not self.db.pooled:
+            logging.error("Ingest daemon needs a pooled file database so sources can poll concurrently.")
+            return self.stats()
+        sources = [name for name in (sources or config["ingest_sources"]) if self._known_source(name)]
+        intervals = {name: (intervals or {}).get(name, config[f"ingest_interval_{name}"]) for name in sources}
+        jitter = config["ingest_poll_jitter"] if jitter is None else jitter
+        if drain_timeout is not None:
+            self.drain_timeout = drain_timeout
+        self._stop.clear()
+        self._abort.clear()
+        logging.info(f"Ingest daemon started, polling {intervals}.")
+
+        def poll_loop(name, items):
+            while not self._stop.is_set():
+                self._poll_once(name, items)
+                self._stop.wait(intervals[name] * random.uniform(1 - jitter, 1 + jitter))
+
+        stats_logged = time.monotonic()
+        for batch in self._batches(self._concurrent_items(sources, poll_loop)):
+            self._process(batch)
+            if time.monotonic() - stats_logged >= config["ingest_stats_interval"]:
+                stats_logged = time.monotonic()
+                summary = self.stats()
+                for entry in summary["sources"] + summary["stages"]:
+                    logging.info(f"Ingest stage {entry}")
+        logging.info("Ingest daemon drained and stopped.")
+        return self.stats()
+
+    def stop(self):
+        """Ask serve() to stop polling and drain; safe to call from a signal handler."""
+        self._stop.set()
+
+    def stats(self):
+        """Pipeline counters.
+
+        Returns:
+            dict: Per-source and per-stage counters, end-to-end latency of the
+                inserted items, offers inserted and sources that failed.
+        """
+        return {
+            "sources": [stats.snapshot() for stats in self.source_stats.values()],
+            "stages": [stats.snapshot() for stats in self.stages.values()] + [self.end_to_end.snapshot()],
+            "inserted": self.stages["insert"].snapshot()["out"],
+            "failed_sources": list(self.failed_sources)
+        }
+
+    def _known_source(self, name):
+        """Whether a source name is supported, logging it if not."""
+        if name in SOURCES:
+            return True
+        logging.error(f"Unknown ingest source {name!r}; expected one of {', '.join(SOURCES)}.")
+        self._source_failed(name)
+        return False
+
+    def _source_failed(self, name):
+        """Remember that a source failed, once per source."""
+        if name not in self.failed_sources:
+            self.failed_sources.append(name)
+
+    def _concurrent_items(self, sources, produce):
+        """Run produce(name, queue) for every source on its own thread and yield the queued items.
+
+        Yields _FLUSH when nothing arrived within the linger time. Once
+        stop() was called and the drain timeout has passed, the producers
+        are told to abandon their polls.
+
+        Yields:
+            tuple or object: Items as yielded by _timed_source, or _FLUSH.
+        """
+        items = queue.Queue(maxsize=self.queue_size)
+
+        def run(name):
+            try:
+                produce(name, items)
+            except Exception as e:
+                logging.error(f"Error in ingest source {name}: {e}")
+                self._source_failed(name)
+            finally:
+                items.put(_DONE)
+
+        threads = [threading.Thread(target=run, args=(name,), name=f"ingest-{name}", daemon=True)
+                   for name in sources]
+        for thread in threads:
+            thread.start()
+        running = len(threads)
+        stopping_since = None
+        while running:
+            if self._stop.is_set() and not self._abort.is_set():
+                stopping_since = stopping_since or time.monotonic()
+                if time.monotonic() - stopping_since >= self.drain_timeout:
+                    logging.warning("Drain timeout reached; abandoning running polls.")
+                    self._abort.set()
+            try:
+                item = items.get(timeout=self.linger or 1.0)
+            except queue.Empty:
+                yield _FLUSH
+                continue
+            if item is _DONE:
+                running -= 1
+            else:
+                yield item
+        for thread in threads:
+            thread.join()
+
+    def _poll_once(self, name, items):
+        """Poll one source and queue its items, stopping early if the drain was abandoned."""
+        source_items = self._timed_source(name)
+        try:
+            for item in source_items:
+                if self._abort.is_set():
+                    break
+                items.put(item)
+        finally:
+            source_items.close()
+
+    def _timed_source(self, name):
+        """Items of one source, counting its offers and the time the source took.
+
+        Yields:
+            tuple: (source, parsed offer or None, raw content, store_raw,
+                enqueue time, progress). An item without an offer only
+                carries progress; progress is None or a (tracker, position)
+                pair acknowledged once the item's batch has been inserted.
+        """
+        stats = self.source_stats.setdefault(name, StageStats(f"source:{name}"))
+        started = time.monotonic()
+        produced = 0
+        try:
+            for parsed, raw, store_raw, progress in getattr(self, f"_{name}_items")():
+                produced += parsed is not None
+                yield name, parsed, raw, store_raw, time.monotonic(), progress
+        except Exception as e:
+            logging.error(f"Error in ingest source {name}: {e}")
+            self._source_failed(name)
+        finally:
+            stats.record(produced, produced, time.monotonic() - started)
+
+    def _email_items(self):
+        """Every processed new email, with its offer if it has one and its UID as progress."""
+        if self.fetcher is None:
+            from email_fetcher import EmailFetcher
+            self.fetcher = EmailFetcher(self.db)
+        else:
+            self.fetcher.ensure_connected()
+        for parsed, raw, sync, uid in self.fetcher.iter_emails():
+            if not (parsed and parsed.get("loading_city") and parsed.get("unloading_city")):
+                parsed = None
+            yield parsed, raw, True, (sync, uid)
+
+    def _whatsapp_items(self):
+        """New WhatsApp offers, in chunks checked against the stored raw content.
+
+        Offers and the export's checkpoint markers carry their byte offset as
+        progress, so the checkpoint only moves past inserted batches.
+        """
+        chunk = []
+        for offer_data, checkpoint, offset in iter_whatsapp_offers(config["whatsapp_export_path"], self.db):
+            chunk.append((offer_data, (checkpoint, offset)))
+            if len(chunk) >= RAW_CHECK_CHUNK:
+                yield from self._skip_known_raw(chunk)
+                chunk = []
+        yield from self._skip_known_raw(chunk)
+
+    def _web_items(self):
+        """Offers from changed pages of the web platform not stored before."""
+        from web_scraper import PageStates, get_web_crawler, scrape_web_platform
+        page_states = PageStates(get_web_crawler(self.db))
+        offers = scrape_web_platform(config["web_platform_url"], self.db, page_states)
+        for i in range(0, len(offers), RAW_CHECK_CHUNK):
+            yield from self._skip_known_raw([(offer_data, None) for offer_data in offers[i:i + RAW_CHECK_CHUNK]])
+        yield None, None, False, (page_states, None)  # pages count as crawled once all offers are in
+
+    def _skip_known_raw(self, items):
+        """Drop offers whose raw content is already stored.
+
+        The raw content is the source's own text of the offer, the export
+        line with its timestamp or the listing's table row, so an offer
+        posted again later is not taken for one already processed; whether
+        it repeats a recent offer is left to the dedup window.
+
+        Args:
+            items (list): (parsed offer dict or None, progress) pairs; those
+                without an offer only carry progress and are kept.
+
+        Returns:
+            list: (parsed offer, raw content, store_raw, progress) tuples for
+                the new offers and the progress-only items.
+        """
+        raws = [offer_data["raw_message"] if offer_data else None for offer_data, _ in items]
+        hashes = [content_hash(raw) if raw is not None else None for raw in raws]
+        known = self.db.get_known_raw_hashes(digest for digest in hashes if digest) if any(hashes) else set()
+        fresh = []
+        for (offer_data, progress), raw, digest in zip(items, raws, hashes):
+            if not offer_data:
+                fresh.append((None, None, False, progress))
+            elif digest not in known:
+                known.add(digest)
+                fresh.append((offer_data, raw, True, progress))
+        return fresh
+
+    def _batches(self, items):
+        """Group items into batches of up to batch_size, flushing early on _FLUSH.
+
+        Yields:
+            list: Items.
+        """
+        batch = []
+        for item in items:
+            if item is not _FLUSH:
+                batch.append(item)
+            if batch and (item is _FLUSH or len(batch) >= self.batch_size):
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _process(self, batch):
+        """Run one batch through normalise and insert.
+
+        Args:
+            batch (list): Items from the sources.
+        """
+        self._insert(batch, self._normalise(batch))
+
+    def _normalise(self, batch):
+        """Resolve cities and distances for the offers of a batch.
+
+        Returns:
+            list: (processed offer, batch item) pairs for the offers that normalised.
+        """
+        started = time.monotonic()
+        batch = [item for item in batch if item[1] is not None]
+        processed = self.normalizer.process_offers(
+            [item[1] for item in batch],
+            [item[2] for item in batch]
+        ) if batch else []
+        offers = [(offer, item) for offer, item in zip(processed, batch) if offer]
+        self.stages["normalise"].record(len(batch), len(offers), time.monotonic() - started)
+        return offers
+
+    def _insert(self, batch, offers):
+        """Bulk insert the offers of a batch and the raw content of the items that are done with.
+
+        Raw content is stored for items whose offer was inserted or turned
+        out to be a duplicate, and for items without an offer. Items whose
+        offer failed to normalise or insert keep theirs out of raw_data, so
+        their content is not taken as processed when it arrives again. Only
+        the items that are done with are acknowledged to their source; if
+        the offers could not be inserted at all, e.g. because the database
+        is locked, nothing of the batch is stored or acknowledged.
+
+        Args:
+            batch (list): All items of the batch.
+            offers (list): (processed offer, batch item) pairs to insert.
+        """
+        started = time.monotonic()
+        ids, failures = self.db.insert_offers_bulk(offer for offer, _ in offers)
+        duplicates = {index for index, error in failures if error == DUPLICATE_OFFER}
+        if offers and not any(ids) and len(duplicates) < len(failures):
+            logging.error(f"Inserting a batch of {len(offers)} offers failed: {failures[0][1]}")
+            self._acknowledge(batch, set(), save=False)
+            self.stages["insert"].record(len(offers), 0, time.monotonic() - started)
+            return
+        handled = {id(item) for index, ((_, item), offer_id) in enumerate(zip(offers, ids))
+                   if offer_id or index in duplicates}
+        raws = [(item[0], item[2]) for item in batch
+                if item[3] and item[2] is not None and (item[1] is None or id(item) in handled)]
+        if raws:
+            self.db.insert_raw_data_bulk(raws)
+        self._acknowledge(batch, handled)
+        finished = time.monotonic()
+        inserted = []
+        for (offer, item), offer_id in zip(offers, ids):
+            if offer_id:
+                inserted.append(dict(offer, id=offer_id))
+                self.end_to_end.record(1, 1, finished - item[4])
+        self.stages["insert"].record(len(offers), len(inserted), finished - started)
+        if inserted and self.on_inserted:
+            self.on_inserted(inserted)
+
+    def _acknowledge(self, batch, handled, save=True):
+        """Tell the sources which items of an inserted batch are done, so they can advance.
+
+        Items without an offer and those in handled are acknowledged; the
+        rest, or every item if the batch is not saved, are held back, which
+        keeps their source from moving past them.
+
+        Args:
+            batch (list): All items of the batch.
+            handled (set): id() of the items whose offer was inserted or a duplicate.
+            save (bool): Whether the trackers store their new position.
+        """
+        trackers = {}
+        for item in batch:
+            if item[5]:
+                tracker, position = item[5]
+                if save and (item[1] is None or id(item) in handled):
+                    tracker.ack(position)
+                else:
+                    tracker.hold(position)
+                trackers[id(tracker)] = tracker
+        if save:
+            for tracker in trackers.values():
+                tracker.save()
+
+def main(argv=None):
+    """Run one ingestion pass, or the polling daemon, from the command line.
+
+    A single pass exits with status 1 if a source failed, so cron can
+    report it. The daemon runs until SIGTERM or SIGINT, then drains.
+
+    Args:
+        argv (list, optional): Command-line arguments, defaults to sys.argv[1:].
+
+    Returns:
+        int: Exit status.
+    """
+    parser = argparse.ArgumentParser(description="Ingest new offers without the interactive menu.")
+    parser.add_argument("--sources", default=",".join(config["ingest_sources"]),
+                        help=f"comma-separated sources out of {', '.join(SOURCES)}")
+    parser.add_argument("--batch-size", type=int, default=config["ingest_batch_size"],
+                        help="maximum offers per normalise/insert batch")
+    parser.add_argument("--daemon", action="store_true",
+                        help="keep polling every source on its INGEST_INTERVAL_<SOURCE> schedule")
+    args = parser.parse_args(argv)
+
+    db = Database(config["db_path"], pooled=True,
+                  cache_size_kb=config["db_cache_size_kb"], mmap_size=config["db_mmap_size"],
+                  dedup_window_hours=config["dedup_window_hours"])
+    pipeline = IngestPipeline(db, batch_size=args.batch_size)
+    sources = [name.strip() for name in args.sources.split(",") if name.strip()]
+    try:
+        if args.daemon:
+            for signum in (signal.SIGTERM, signal.SIGINT):
+                signal.signal(signum, lambda signum, frame: pipeline.stop())
+            pipeline.serve(sources)
+            return 0
+        summary = pipeline.run(sources)
+    finally:
+        if pipeline.fetcher is not None:
+            pipeline.fetcher.disconnect()
+        db.close()
+    return 1 if summary["failed_sources"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
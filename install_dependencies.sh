@@ -7,7 +7,7 @@ curl https://bootstrap.pypa.io/get-pip.py -o get-pip.py
 python3 get-pip.py
 
 # Install required packages
-python3 -m pip install openai beautifulsoup4 routingpy "urllib3<2.0.0"
+python3 -m pip install openai beautifulsoup4 routingpy numpy "urllib3<2.0.0"
 
 # Clean up
 rm get-pip.py
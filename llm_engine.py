@@ -0,0 +1,296 @@
+from gpt_api import (build_prompt, estimate_tokens, get_llm_client, get_response_cache, map_results,
+                     output_budget, pack_batches)
+from config import config
+import asyncio
+import logging
+import random
+import threading
+import time
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(levelname)s - %(message)s",
+    handlers=[logging.FileHandler("cargobot.log"), logging.StreamHandler()]
+)
+
+class LLMRequestError(Exception):
+    """Raised when an LLM request still fails after all retries."""
+
+class TokenBucket:
+    """Async token bucket refilled continuously at a per-minute rate."""
+    def __init__(self, rate_per_minute, capacity=None):
+        """Initialize a full bucket.
+
+        Args:
+            rate_per_minute (float): Refill rate; 0 disables the limit.
+            capacity (float, optional): Bucket size, defaults to one minute's worth.
+        """
+        self.rate = rate_per_minute / 60
+        self.capacity = capacity or rate_per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, amount=1):
+        """Wait until amount tokens are available and take them.
+
+        Waiters are served in arrival order. Requests larger than the bucket
+        are clamped to its capacity so they can still go through.
+
+        Args:
+            amount (float): Number of tokens to take.
+        """
+        if self.rate <= 0:
+            return
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+class LLMEngine:
+    """Concurrent LLM extraction on an asyncio event loop.
+
+    At most max_in_flight requests run at once, request and token rates are
+    held under their per-minute limits with token buckets, and failed calls
+    are retried with jittered exponential backoff. The event loop runs on a
+    background thread, so synchronous callers can submit work and consume
+    results as they complete.
+    """
+    def __init__(self, client=None, max_in_flight=None, requests_per_minute=None,
+                 tokens_per_minute=None, max_retries=None, retry_base_delay=None, timeout=None):
+        """Initialize the engine.
+
+        Args:
+            client (optional): LLM client, defaults to gpt_api.get_llm_client().
+                An acomplete(prompt, max_tokens) coroutine is used when present,
+                otherwise complete() runs in a worker thread.
+            max_in_flight (int, optional): Maximum concurrent requests.
+            requests_per_minute (float, optional): Request rate limit, 0 for none.
+            tokens_per_minute (float, optional): Prompt plus completion token rate limit, 0 for none.
+            max_retries (int, optional): Retries per request after the first attempt.
+            retry_base_delay (float, optional): Backoff base in seconds.
+            timeout (float, optional): Seconds after which an attempt counts
+                as failed, 0 for none; defaults to llm_timeout.
+        """
+        self.client = client
+        self.max_in_flight = max_in_flight or config["llm_workers"]
+        self.requests_per_minute = config["llm_requests_per_minute"] if requests_per_minute is None else requests_per_minute
+        self.tokens_per_minute = config["llm_tokens_per_minute"] if tokens_per_minute is None else tokens_per_minute
+        self.max_retries = config["llm_max_retries"] if max_retries is None else max_retries
+        self.retry_base_delay = config["llm_retry_base_delay"] if retry_base_delay is None else retry_base_delay
+        self.timeout = config["llm_timeout"] if timeout is None else timeout
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self._in_flight = None
+        self._loop = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def submit(self, email_bodies):
+        """Parse a list of emails in the background.
+
+        Args:
+            email_bodies (list): Email bodies.
+
+        Returns:
+            concurrent.futures.Future: Resolves to the parsed offers aligned
+                with email_bodies, None where an email has no offer; raises
+                LLMRequestError if a request failed for good.
+        """
+        return asyncio.run_coroutine_threadsafe(self.parse_emails(email_bodies), self._ensure_loop())
+
+    async def parse_emails(self, email_bodies):
+        """Parse a list of emails concurrently.
+
+        Args:
+            email_bodies (list): Email bodies.
+
+        Returns:
+            list: Parsed offers aligned with email_bodies.
+
+        Raises:
+            LLMRequestError: If a request failed after all retries.
+        """
+        results = [None] * len(email_bodies)
+        async for index, result in self.astream(email_bodies):
+            results[index] = result
+        return results
+
+    async def astream(self, email_bodies):
+        """Parse emails, yielding results as their batches complete.
+
+        Cached results are yielded first. The rest are packed into batches
+        by token budget; new batches are only started while fewer than
+        max_in_flight are running and the consumer keeps up.
+
+        Args:
+            email_bodies (list): Email bodies.
+
+        Yields:
+            tuple: (index into email_bodies, parsed offer or None).
+
+        Raises:
+            LLMRequestError: If a request failed after all retries; batches
+                still running are cancelled.
+        """
+        client = self.client or get_llm_client()
+        cache = get_response_cache()
+        model = getattr(client, "model", "")
+        pending = []
+        for index, body in enumerate(email_bodies):
+            if cache:
+                hit, result = cache.get(cache.key(model, body))
+                if hit:
+                    yield index, result
+                    continue
+            pending.append(index)
+        batches = iter([[pending[i] for i in batch] for batch in pack_batches([email_bodies[i] for i in pending])])
+        running = {}
+        try:
+            while True:
+                while len(running) < self.max_in_flight:
+                    indexes = next(batches, None)
+                    if indexes is None:
+                        break
+                    task = asyncio.ensure_future(self.parse_batch([email_bodies[i] for i in indexes], client))
+                    running[task] = indexes
+                if not running:
+                    break
+                finished, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in finished:
+                    indexes = running.pop(task)
+                    for index, result in zip(indexes, task.result()):
+                        if cache and result is not None:
+                            cache.put(cache.key(model, email_bodies[index]), result)
+                        yield index, result
+        finally:
+            for task in running:
+                task.cancel()
+
+    async def parse_batch(self, email_bodies, client=None):
+        """Parse one batch, bisecting it if the reply is malformed.
+
+        Args:
+            email_bodies (list): Email bodies in the batch.
+            client (optional): LLM client.
+
+        Returns:
+            list: Parsed offers aligned with email_bodies; a reply that stays
+                malformed down to a single email counts as no offer.
+
+        Raises:
+            LLMRequestError: If a request failed after all retries.
+        """
+        client = client or self.client or get_llm_client()
+        prompt = build_prompt(email_bodies)
+        text = await self._complete(client, prompt, output_budget(len(email_bodies)))
+        results = map_results(text, len(email_bodies))
+        if results is not None:
+            return results
+        if len(email_bodies) == 1:
+            logging.warning("Malformed LLM reply for a single email; giving up on it.")
+            return [None]
+        middle = len(email_bodies) // 2
+        logging.warning(f"Malformed LLM reply for a batch of {len(email_bodies)} emails; retrying in halves.")
+        halves = await asyncio.gather(self.parse_batch(email_bodies[:middle], client),
+                                      self.parse_batch(email_bodies[middle:], client))
+        return halves[0] + halves[1]
+
+    def stats(self):
+        """Engine counters.
+
+        Returns:
+            dict: Requests sent, retries and requests that failed for good.
+        """
+        return {"requests": self.requests, "retries": self.retries, "failures": self.failures}
+
+    def close(self):
+        """Stop the background event loop."""
+        with self._start_lock:
+            if self._loop is None:
+                return
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+            self._loop = None
+            self._thread = None
+
+    async def _complete(self, client, prompt, max_tokens):
+        """Run one rate-limited completion with retries.
+
+        Returns:
+            str: Completion text.
+
+        Raises:
+            LLMRequestError: If every attempt failed.
+        """
+        if self._in_flight is None:
+            self._setup()
+        for attempt in range(self.max_retries + 1):
+            async with self._in_flight:
+                await self._request_bucket.acquire(1)
+                await self._token_bucket.acquire(estimate_tokens(prompt) + max_tokens)
+                self.requests += 1
+                try:
+                    if hasattr(client, "acomplete"):
+                        request = client.acomplete(prompt, max_tokens)
+                    else:
+                        request = asyncio.to_thread(client.complete, prompt, max_tokens)
+                    return await asyncio.wait_for(request, self.timeout or None)
+                except Exception as e:
+                    error = e
+            if attempt < self.max_retries:
+                self.retries += 1
+                # Full jitter keeps retries from many batches from arriving in lockstep.
+                delay = random.uniform(0, min(60.0, self.retry_base_delay * 2 ** attempt))
+                logging.warning(f"LLM request failed ({error}); retrying in {delay:.1f}s.")
+                await asyncio.sleep(delay)
+        self.failures += 1
+        logging.error(f"Error parsing emails with GPT-4o Mini: {error}")
+        raise LLMRequestError(str(error)) from error
+
+    def _ensure_loop(self):
+        """Start the background event loop on first use.
+
+        Returns:
+            asyncio.AbstractEventLoop: Running loop.
+        """
+        with self._start_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._run_loop, daemon=True)
+                self._thread.start()
+            return self._loop
+
+    def _run_loop(self):
+        """Run the background event loop until close()."""
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    def _setup(self):
+        """Create the concurrency limit and rate limiters; they bind to the loop that first uses them."""
+        self._in_flight = asyncio.Semaphore(self.max_in_flight)
+        self._request_bucket = TokenBucket(self.requests_per_minute)
+        self._token_bucket = TokenBucket(self.tokens_per_minute)
+
+_engine = None
+_engine_lock = threading.Lock()
+
+def get_llm_engine():
+    """The process-wide LLM engine, so all callers share one set of rate limits.
+
+    Returns:
+        LLMEngine: Shared engine.
+    """
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = LLMEngine()
+        return _engine
@@ -1,12 +1,11 @@
 import logging
 from database import Database
-from email_fetcher import EmailFetcher
-from whatsapp_parser import process_whatsapp_file
-from web_scraper import scrape_web_platform
 from data_normalizer import DataNormalizer
+from ingest import IngestPipeline
+from offer_graph import format_offer
 from route_planner import RoutePlanner
 from risk_assessor import RiskAssessor
-from ui import display_menu, display_offer, display_route, display_database_menu
+from ui import city_names, display_menu, display_offer, display_offers, display_route, display_database_menu
 from config import config
 from colorama import Fore, Style
 
@@ -16,19 +15,34 @@ logging.basicConfig(
     handlers=[logging.FileHandler("cargobot.log"), logging.StreamHandler()]
 )
 
+def print_added_offers(offers, db):
+    """Print newly inserted offers, looking up their city names in one batch.
+
+    Args:
+        offers (list): Inserted offer dicts.
+        db (Database): Database instance.
+    """
+    names = city_names(offers, db)
+    print("\n".join(f"Added {offer['source']} offer: {offer['sender']} - "
+                    f"{names.get(offer['loading_city_id'], '?')} → {names.get(offer['unloading_city_id'], '?')}"
+                    for offer in offers))
+
 def main():
     """Main function to run the CargoBot application."""
     try:
-        db = Database(config["db_path"])
+        db = Database(config["db_path"], pooled=config["db_pooled"],
+                      cache_size_kb=config["db_cache_size_kb"], mmap_size=config["db_mmap_size"],
+                      dedup_window_hours=config["dedup_window_hours"])
         normalizer = DataNormalizer(db)
-        planner = RoutePlanner(db)
+        planner = None  # loads every active offer, so only built once a route option is chosen
         assessor = RiskAssessor(db)
-        fetcher = EmailFetcher(db)
+        fetcher = None  # connects to the mail server on the first fetch
 
         while True:
             choice = display_menu()
             if choice == "0":
-                fetcher.disconnect()
+                if fetcher:
+                    fetcher.disconnect()
                 db.close()
                 logging.info("CargoBot exited successfully.")
                 break
@@ -36,9 +50,9 @@ def main():
                 city = input("Enter current city: ")
                 city_data = normalizer.normalize_city(city)
                 if city_data:
+                    planner = planner or RoutePlanner(db)
                     offers = planner.find_single_load_anywhere(city_data[0])
-                    for offer in offers:
-                        display_offer(offer, db)
+                    display_offers(offers, db)
                 else:
                     print(f"{Fore.RED}City not found!{Style.RESET_ALL}")
             elif choice == "2":
@@ -47,17 +61,20 @@ def main():
                 start_data = normalizer.normalize_city(start)
                 end_data = normalizer.normalize_city(end)
                 if start_data and end_data:
+                    planner = planner or RoutePlanner(db)
                     routes = planner.find_single_load_a_to_b(start_data[0], end_data[0])
+                    names = city_names([segment for route in routes for segment in route["segments"]], db)
                     for route in routes:
-                        display_route({"segments": route if isinstance(route, list) else [route], 
-                                       "total_distance": sum(r["distance"] or 0 for r in (route if isinstance(route, list) else [route])), 
-                                       "total_revenue": sum(r["price"] or r["estimated_price"] or 0 for r in (route if isinstance(route, list) else [route]))}, db)
+                        display_route(route, db, names)
+                    if not routes:
+                        display_route(None, db)
                 else:
                     print(f"{Fore.RED}One or both cities not found!{Style.RESET_ALL}")
             elif choice == "3":
                 city = input("Enter starting city: ")
                 city_data = normalizer.normalize_city(city)
                 if city_data:
+                    planner = planner or RoutePlanner(db)
                     route = planner.find_multi_leg_route(city_data[0])
                     display_route(route, db)
                     if route and route["segments"]:
@@ -70,42 +87,18 @@ def main():
                 city_data = normalizer.normalize_city(city)
                 if city_data:
                     offers = db.get_offers_by_loading_city(city_data[0], days=5)
-                    for offer in offers:
-                        display_offer(planner._format_offer(offer), db)
+                    display_offers([format_offer(offer) for offer in offers], db)
                 else:
                     print(f"{Fore.RED}City not found!{Style.RESET_ALL}")
             elif choice == "5":
-                # Fetch email offers
-                parsed_offers, raw_messages = fetcher.fetch_and_process_emails()
-                for parsed_data, raw in zip(parsed_offers, raw_messages):
-                    if parsed_data and parsed_data.get("loading_city") and parsed_data.get("unloading_city"):
-                        offer = normalizer.process_offer(parsed_data, raw)
-                        if offer:
-                            offer_id = db.insert_offer(**offer)
-                            if offer_id:
-                                print(f"Added email offer: {offer['sender']} - {db.get_city_by_id(offer['loading_city_id'])[1]} → {db.get_city_by_id(offer['unloading_city_id'])[1]}")
-                    else:
-                        print(f"Skipped email: Missing loading/unloading city")
-
-                # Fetch WhatsApp offers
-                whatsapp_offers = process_whatsapp_file(config["whatsapp_export_path"])
-                for offer_data in whatsapp_offers:
-                    offer = normalizer.process_offer(offer_data)
-                    if offer:
-                        offer_id = db.insert_offer(**offer)
-                        if offer_id:
-                            print(f"Added WhatsApp offer: {offer['sender']} - {db.get_city_by_id(offer['loading_city_id'])[1]} → {db.get_city_by_id(offer['unloading_city_id'])[1]}")
-                            db.insert_raw_data("whatsapp", str(offer_data))
-
-                # Fetch web offers
-                web_offers = scrape_web_platform(config["web_platform_url"])
-                for offer_data in web_offers:
-                    offer = normalizer.process_offer(offer_data)
-                    if offer:
-                        offer_id = db.insert_offer(**offer)
-                        if offer_id:
-                            print(f"Added web offer: {offer['sender']} - {db.get_city_by_id(offer['loading_city_id'])[1]} → {db.get_city_by_id(offer['unloading_city_id'])[1]}")
-                            db.insert_raw_data("web", str(offer_data))
+                pipeline = IngestPipeline(db, normalizer, fetcher,
+                                          on_inserted=lambda offers: print_added_offers(offers, db))
+                pipeline.run()
+                fetcher = pipeline.fetcher
+                logging.info(f"Distance cache stats: {normalizer.distance_cache.stats()}")
+                logging.info(f"City resolver stats: {normalizer.resolver.stats()}")
+                if fetcher:
+                    logging.info(f"Email template stats: {fetcher.templates.stats()}")
             elif choice == "6":
                 while True:
                     db_choice = display_database_menu()
@@ -122,17 +115,16 @@ def main():
                     elif db_choice == "2":
                         offers = db.get_all_offers()
                         if offers:
-                            for offer in offers:
-                                formatted_offer = planner._format_offer(offer)
-                                display_offer(formatted_offer, db)
+                            display_offers([format_offer(offer) for offer in offers], db)
                         else:
                             print("No processed offers found.")
                     elif db_choice == "3":
                         recent_offers = db.get_recent_offers()
                         if recent_offers:
-                            for offer in recent_offers:
-                                formatted_offer = planner._format_offer(offer)
-                                display_offer(formatted_offer, db)
+                            formatted_offers = [format_offer(offer) for offer in recent_offers]
+                            names = city_names(formatted_offers, db)
+                            for offer, formatted_offer in zip(recent_offers, formatted_offers):
+                                display_offer(formatted_offer, db, names)
                                 verdict = input("Is this offer correct? (y/n): ").lower()
                                 if verdict == "n":
                                     db.log_unverified_offer(offer[0])
@@ -144,18 +136,17 @@ def main():
                         if offer_id.lower() == "list":
                             unverified = db.get_unverified_offers()
                             if unverified:
-                                for offer in unverified:
-                                    formatted_offer = planner._format_offer(offer)
-                                    display_offer(formatted_offer, db)
+                                display_offers([format_offer(offer) for offer in unverified], db)
                             else:
                                 print("No unverified offers found.")
                             offer_id = input("Enter offer ID to correct: ")
                         offer = db.get_offer_by_id(offer_id)
                         if offer:
-                            formatted_offer = planner._format_offer(offer)
-                            display_offer(formatted_offer, db)
-                            new_loading = input(f"New loading city (current: {db.get_city_by_id(offer[4])[1]}): ") or db.get_city_by_id(offer[4])[1]
-                            new_unloading = input(f"New unloading city (current: {db.get_city_by_id(offer[5])[1]}): ") or db.get_city_by_id(offer[5])[1]
+                            formatted_offer = format_offer(offer)
+                            names = city_names([formatted_offer], db)
+                            display_offer(formatted_offer, db, names)
+                            new_loading = input(f"New loading city (current: {names[offer[4]]}): ") or names[offer[4]]
+                            new_unloading = input(f"New unloading city (current: {names[offer[5]]}): ") or names[offer[5]]
                             new_price = input(f"New price (current: {offer[6]}): ") or offer[6]
                             db.update_offer(offer_id, new_loading, new_unloading, new_price)
                             print("Offer updated successfully.")
@@ -0,0 +1,192 @@
+from bisect import insort
+from collections import defaultdict
+from datetime import datetime, timedelta
+import heapq
+import logging
+import threading
+import time
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(levelname)s - %(message)s",
+    handlers=[logging.FileHandler("cargobot.log"), logging.StreamHandler()]
+)
+
+def format_offer(offer):
+    """Format an offer row for display or further processing.
+
+    Args:
+        offer (tuple): Offer data from the database.
+
+    Returns:
+        dict: Formatted offer data with price per km precomputed.
+    """
+    price = offer[6] or offer[10]  # price or estimated_price
+    distance = offer[9]
+    return {
+        "id": offer[0],
+        "timestamp": offer[2],
+        "loading_city_id": offer[4],
+        "unloading_city_id": offer[5],
+        "distance": distance,
+        "price": offer[6],
+        "estimated_price": offer[10],
+        "price_per_km": price / distance if price and distance else None,
+        "lf_number": offer[7],
+        "urgency": offer[8],
+        "additional_info": offer[11]
+    }
+
+def _rank(entry):
+    """Sort key placing the most profitable offers first."""
+    return -(entry["price_per_km"] or 0)
+
+class OfferGraph:
+    """In-memory index of active offers, keyed by loading city.
+
+    Offers inside the active window are held as adjacency lists sorted by
+    price per km, plus a lane index keyed by (loading, unloading) city pair,
+    so route queries never go back to the database. The graph registers
+    itself as an offer listener on the database and picks up inserts and
+    updates as they happen; mutations are serialised by a lock so a pooled
+    ingester thread can feed it while the planner reads.
+    """
+    def __init__(self, db, days=7, expire_interval=1.0):
+        """Initialize the graph and load the active offer window.
+
+        Args:
+            db (Database): Database instance.
+            days (int): Number of days an offer stays active.
+            expire_interval (float): Minimum seconds between expiry sweeps.
+        """
+        self.db = db
+        self.days = days
+        self.expire_interval = expire_interval
+        self._last_expire = 0.0
+        self._lock = threading.RLock()
+        self.adjacency = defaultdict(list)
+        self.lanes = defaultdict(list)
+        self.offers = {}
+        self._by_age = []
+        self.load()
+        db.add_offer_listener(self.add_offer)
+
+    def load(self):
+        """(Re)load all offers inside the active window from the database."""
+        offers = self.db.get_active_offers(self.days)
+        with self._lock:
+            self.adjacency.clear()
+            self.lanes.clear()
+            self.offers.clear()
+            self._by_age.clear()
+            for offer in offers:
+                self.add_offer(offer)
+        logging.info(f"Offer graph loaded with {len(self.offers)} active offers.")
+
+    def add_offer(self, offer):
+        """Add or replace a single offer.
+
+        Args:
+            offer (tuple): Offer data from the database.
+        """
+        try:
+            entry = format_offer(offer)
+            with self._lock:
+                if entry["id"] in self.offers:
+                    self.remove_offer(entry["id"])
+                if str(entry["timestamp"]) < self._cutoff():
+                    return
+                self.offers[entry["id"]] = entry
+                insort(self.adjacency[entry["loading_city_id"]], entry, key=_rank)
+                insort(self.lanes[(entry["loading_city_id"], entry["unloading_city_id"])], entry, key=_rank)
+                heapq.heappush(self._by_age, (str(entry["timestamp"]), entry["id"]))
+        except Exception as e:
+            logging.error(f"Error adding offer to graph: {e}")
+
+    def remove_offer(self, offer_id):
+        """Remove an offer from the graph.
+
+        Args:
+            offer_id (int): ID of the offer to remove.
+        """
+        with self._lock:
+            entry = self.offers.pop(offer_id, None)
+            if not entry:
+                return
+            self._discard(self.adjacency, entry["loading_city_id"], entry)
+            self._discard(self.lanes, (entry["loading_city_id"], entry["unloading_city_id"]), entry)
+
+    def offers_from(self, city_id):
+        """Active offers loading in a city, most profitable first.
+
+        Args:
+            city_id (int): ID of the loading city.
+
+        Returns:
+            list: Formatted offers.
+        """
+        self.expire()
+        return self.adjacency.get(city_id, [])
+
+    def offers_between(self, loading_city_id, unloading_city_id):
+        """Active offers on a single lane, most profitable first.
+
+        Args:
+            loading_city_id (int): ID of the loading city.
+            unloading_city_id (int): ID of the unloading city.
+
+        Returns:
+            list: Formatted offers.
+        """
+        self.expire()
+        return self.lanes.get((loading_city_id, unloading_city_id), [])
+
+    def best_price_per_km(self, city_id=None):
+        """Best €/km of the active offers loading in a city, or anywhere.
+
+        Args:
+            city_id (int, optional): ID of the loading city; all cities if omitted.
+
+        Returns:
+            float: Best price per km, 0 if there are no priced offers.
+        """
+        self.expire()
+        if city_id is not None:
+            offers = self.adjacency.get(city_id)
+            return (offers[0]["price_per_km"] or 0) if offers else 0
+        with self._lock:
+            return max((offers[0]["price_per_km"] or 0 for offers in self.adjacency.values()), default=0)
+
+    def expire(self):
+        """Drop offers that have fallen out of the active window.
+
+        Runs at most once per expire_interval seconds, so hot query loops
+        do not pay for it on every lookup.
+        """
+        now = time.monotonic()
+        if now - self._last_expire < self.expire_interval:
+            return
+        self._last_expire = now
+        cutoff = self._cutoff()
+        with self._lock:
+            while self._by_age and self._by_age[0][0] < cutoff:
+                timestamp, offer_id = heapq.heappop(self._by_age)
+                entry = self.offers.get(offer_id)
+                if entry and str(entry["timestamp"]) == timestamp:
+                    self.remove_offer(offer_id)
+
+    def _cutoff(self):
+        """Oldest timestamp still inside the active window, as stored by SQLite."""
+        return str(datetime.now() - timedelta(days=self.days))
+
+    def _discard(self, index, key, entry):
+        """Remove an entry from one of the index lists, dropping empty keys."""
+        bucket = index.get(key)
+        if not bucket:
+            return
+        for i, candidate in enumerate(bucket):
+            if candidate is entry:
+                del bucket[i]
+                break
+        if not bucket:
+            del index[key]
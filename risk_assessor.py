@@ -1,4 +1,3 @@
-from datetime import timedelta
 import logging
 
 logging.basicConfig(
@@ -28,12 +27,44 @@ class RiskAssessor:
             str: Risk level ('High', 'Medium', 'Low').
         """
         try:
-            count = self.db.count_offers_from_city(city_id, days)
-            if count < 3:
-                return "High"
-            elif count <= 10:
-                return "Medium"
-            return "Low"
+            return risk_level(self.db.count_offers_from_city(city_id, days))
         except Exception as e:
             logging.error(f"Error assessing return load risk for city {city_id}: {e}")
-            return "Unknown"
\ No newline at end of file
+            return "Unknown"
+
+    def assess_return_load_risks(self, city_ids, days=7):
+        """Assess the return load risk of many candidate cities at once.
+
+        Offer counts for all cities come from the per-day aggregates in a
+        few batched queries, so scoring thousands of end cities costs about
+        as much as scoring one.
+
+        Args:
+            city_ids (iterable): City IDs.
+            days (int): Number of days to look back.
+
+        Returns:
+            dict: City ID -> risk level ('High', 'Medium', 'Low', or 'Unknown' on error).
+        """
+        city_ids = list(city_ids)
+        try:
+            counts = self.db.count_offers_from_cities(city_ids, days)
+            return {city_id: risk_level(counts[city_id]) for city_id in city_ids}
+        except Exception as e:
+            logging.error(f"Error assessing return load risk for {len(city_ids)} cities: {e}")
+            return dict.fromkeys(city_ids, "Unknown")
+
+def risk_level(count):
+    """Map the number of recent offers from a city to a risk level.
+
+    Args:
+        count (int): Offers originating from the city in the window.
+
+    Returns:
+        str: Risk level ('High', 'Medium', 'Low').
+    """
+    if count < 3:
+        return "High"
+    elif count <= 10:
+        return "Medium"
+    return "Low"
@@ -1,4 +1,7 @@
 from config import config
+from geo_index import CityGridIndex
+from offer_graph import OfferGraph, format_offer
+import heapq
 import logging
 
 logging.basicConfig(
@@ -9,13 +12,19 @@ logging.basicConfig(
 
 class RoutePlanner:
     """Plans routes for loads based on offers in the database."""
-    def __init__(self, db):
+    def __init__(self, db, graph=None, geo_index=None):
         """Initialize RoutePlanner with a database connection.
 
         Args:
             db (Database): Database instance.
+            graph (OfferGraph, optional): Offer index to answer queries from.
+                Built from the database if not given.
+            geo_index (CityGridIndex, optional): Spatial index for deadhead lookups.
+                Built from the database if not given.
         """
         self.db = db
+        self.graph = graph or OfferGraph(db)
+        self.geo_index = geo_index or CityGridIndex(db)
 
     def find_single_load_anywhere(self, start_city_id):
         """Find the best loads from a starting city to anywhere.
@@ -27,13 +36,7 @@ class RoutePlanner:
             list: List of top offers, sorted by profitability.
         """
         try:
-            offers = self.db.get_offers_by_loading_city(start_city_id)
-            formatted_offers = [self._format_offer(offer) for offer in offers]
-            return sorted(
-                formatted_offers,
-                key=lambda x: x["price_per_km"] if x["price_per_km"] else 0,
-                reverse=True
-            )[:5]
+            return self.graph.offers_from(start_city_id)[:5]
         except Exception as e:
             logging.error(f"Error finding single load from city {start_city_id}: {e}")
             return []
@@ -46,28 +49,33 @@ class RoutePlanner:
             end_city_id (int): ID of the destination city.
 
         Returns:
-            list: List of routes (direct or indirect).
+            list: Routes with segments, total distance (including any empty
+                run), revenue and price per km, best first: one per direct
+                offer, or at most one indirect route if there is none.
         """
         try:
-            direct_offers = [o for o in self.db.get_offers_by_loading_city(start_city_id) if o[5] == end_city_id]
+            direct_offers = self.graph.offers_between(start_city_id, end_city_id)
             if direct_offers:
-                return [self._format_offer(o) for o in direct_offers]
+                return [self._route([offer]) for offer in direct_offers]
 
-            # Try indirect route (A → C → B)
+            # Try indirect route (A → C → B), allowing an empty run from C to a nearby C'
             intermediate_offers = []
-            for offer_a in self.db.get_offers_by_loading_city(start_city_id):
-                for offer_b in self.db.get_offers_by_loading_city(offer_a[5]):
-                    if offer_b[5] == end_city_id:
-                        route = self._combine_offers(offer_a, offer_b)
+            for offer_a in self.graph.offers_from(start_city_id):
+                transfer = offer_a["unloading_city_id"]
+                nearby = [(transfer, 0.0)] + self.geo_index.neighbors(transfer, config["search_radius"])
+                for city_id, empty_km in nearby:
+                    for offer_b in self.graph.offers_between(city_id, end_city_id):
+                        route = self._combine_offers(offer_a, offer_b, empty_km)
                         if route["price_per_km"] >= config["bad_rate"]:
                             intermediate_offers.append(route)
+            intermediate_offers.sort(key=lambda r: r["price_per_km"], reverse=True)
             return intermediate_offers[:1]
         except Exception as e:
             logging.error(f"Error finding route from {start_city_id} to {end_city_id}: {e}")
             return []
 
     def find_multi_leg_route(self, start_city_id, max_legs=3):
-        """Build a multi-leg route starting from a city.
+        """Build the best multi-leg route starting from a city.
 
         Args:
             start_city_id (int): ID of the starting city.
@@ -76,29 +84,154 @@ class RoutePlanner:
         Returns:
             dict: Multi-leg route with segments, total distance, and revenue.
         """
+        routes = self.find_best_routes(start_city_id, max_legs=max_legs, top_k=1)
+        return routes[0] if routes else None
+
+    def find_best_routes(self, start_city_id, max_legs=3, top_k=None, beam_width=None, branching=None,
+                         radius_km=None):
+        """Find the top routes of up to max_legs legs, ranked by total revenue per total km.
+
+        Runs a beam search over the offer graph. At each depth only the best
+        beam_width partial routes are extended, each by its branching most
+        profitable departures, and partial routes whose upper bound cannot beat
+        the current top_k are pruned. A leg may start from any city within
+        radius_km of the previous unloading city; the empty kilometres driven
+        to get there count towards the route's total distance.
+
+        Args:
+            start_city_id (int): ID of the starting city.
+            max_legs (int): Maximum number of legs in a route.
+            top_k (int, optional): Number of routes to return.
+            beam_width (int, optional): Partial routes kept per depth.
+            branching (int, optional): Offers considered per city.
+            radius_km (float, optional): Deadhead radius, defaults to the search_radius setting.
+
+        Returns:
+            list: Routes with segments, total distance, revenue and price per km, best first.
+        """
+        top_k = top_k or config["route_top_k"]
+        beam_width = beam_width or config["route_beam_width"]
+        branching = branching or config["route_branching"]
+        radius_km = config["search_radius"] if radius_km is None else radius_km
         try:
-            route = {"segments": [], "total_distance": 0, "total_revenue": 0}
-            current_city = start_city_id
-            for _ in range(max_legs):
-                offers = self.db.get_offers_by_loading_city(current_city)
-                if not offers:
+            results = []  # min-heap of (price_per_km, seq, segments, revenue, distance, deadhead)
+            departures = {}
+            global_best = self.graph.best_price_per_km()
+            bounds = {}
+            seq = 0
+            beam = [((), 0.0, 0.0, 0.0, start_city_id)]
+            for legs_left in range(max_legs, 0, -1):
+                candidates = []
+                for segments, revenue, distance, deadhead, city in beam:
+                    for empty_km, offer in self._departures(city, branching, radius_km, departures):
+                        if any(s["id"] == offer["id"] for s in segments):
+                            continue
+                        if empty_km:
+                            offer = dict(offer, deadhead_km=empty_km)
+                        new_segments = segments + (offer,)
+                        new_revenue = revenue + (offer["price"] or offer["estimated_price"])
+                        new_distance = distance + empty_km + offer["distance"]
+                        new_deadhead = deadhead + empty_km
+                        price_per_km = new_revenue / new_distance
+                        seq += 1
+                        candidate = (price_per_km, seq, new_segments, new_revenue, new_distance, new_deadhead)
+                        if len(results) < top_k:
+                            heapq.heappush(results, candidate)
+                        elif price_per_km > results[0][0]:
+                            heapq.heapreplace(results, candidate)
+                        if legs_left > 1:
+                            candidates.append(candidate)
+                threshold = results[0][0] if len(results) == top_k else 0
+                candidates = [
+                    c for c in candidates
+                    if max(c[0], self._upper_bound(c[2][-1]["unloading_city_id"], legs_left - 1,
+                                                   radius_km, global_best, bounds)) > threshold
+                ]
+                beam = [
+                    (segments, revenue, distance, deadhead, segments[-1]["unloading_city_id"])
+                    for _, _, segments, revenue, distance, deadhead in heapq.nlargest(beam_width, candidates)
+                ]
+                if not beam:
                     break
-                best_offer = max([self._format_offer(o) for o in offers], 
-                                key=lambda x: x["price_per_km"] if x["price_per_km"] else 0, 
-                                default=None)
-                if not best_offer:
-                    break
-                route["segments"].append(best_offer)
-                route["total_distance"] += best_offer["distance"] or 0
-                route["total_revenue"] += best_offer["price"] or best_offer["estimated_price"] or 0
-                current_city = best_offer["unloading_city_id"]
-            if route["total_distance"] > 0 and route["segments"]:
-                route["price_per_km"] = route["total_revenue"] / route["total_distance"]
-                return route
-            return None
+            return [
+                {
+                    "segments": list(segments),
+                    "total_distance": distance,
+                    "total_revenue": revenue,
+                    "deadhead_distance": deadhead,
+                    "price_per_km": price_per_km
+                }
+                for price_per_km, _, segments, revenue, distance, deadhead in sorted(results, reverse=True)
+            ]
         except Exception as e:
-            logging.error(f"Error building multi-leg route from {start_city_id}: {e}")
-            return None
+            logging.error(f"Error finding best routes from {start_city_id}: {e}")
+            return []
+
+    def _departures(self, city_id, branching, radius_km, cache):
+        """Best offers a truck standing in a city can take, including deadhead moves.
+
+        Args:
+            city_id (int): ID of the city the truck is in.
+            branching (int): Number of departures to return.
+            radius_km (float): Deadhead radius.
+            cache (dict): Memo of city_id -> departures for this search.
+
+        Returns:
+            list: (deadhead_km, offer) tuples, best effective €/km first.
+        """
+        if city_id not in cache:
+            sources = [(0.0, self.graph.offers_from(city_id))]
+            sources += [(empty_km, self.graph.offers_from(neighbor_id))
+                        for neighbor_id, empty_km in self.geo_index.neighbors(city_id, radius_km)]
+            # Merge the per-city lists best raw €/km first; an offer's effective
+            # €/km never exceeds its raw €/km, so stop once no head can make the cut.
+            heads = [(-offers[0]["price_per_km"], i, 0) for i, (_, offers) in enumerate(sources)
+                     if offers and offers[0]["price_per_km"]]
+            heapq.heapify(heads)
+            best = []  # min-heap of (effective price_per_km, seq, deadhead_km, offer)
+            seq = 0
+            while heads:
+                neg_price_per_km, i, pos = heapq.heappop(heads)
+                if len(best) == branching and -neg_price_per_km <= best[0][0]:
+                    break
+                empty_km, offers = sources[i]
+                offer = offers[pos]
+                effective = (offer["price"] or offer["estimated_price"]) / (offer["distance"] + empty_km)
+                seq += 1
+                if len(best) < branching:
+                    heapq.heappush(best, (effective, seq, empty_km, offer))
+                elif effective > best[0][0]:
+                    heapq.heapreplace(best, (effective, seq, empty_km, offer))
+                if pos + 1 < len(offers) and offers[pos + 1]["price_per_km"]:
+                    heapq.heappush(heads, (-offers[pos + 1]["price_per_km"], i, pos + 1))
+            cache[city_id] = [(empty_km, offer) for _, _, empty_km, offer in sorted(best, reverse=True)]
+        return cache[city_id]
+
+    def _upper_bound(self, city_id, legs, radius_km, global_best, bounds):
+        """Best price per km any extension of up to `legs` legs from a city can reach.
+
+        The €/km of a route never exceeds the best €/km of its legs. For a
+        single remaining leg that is the best offer loading in or around the
+        city; beyond that it is the best offer anywhere in the graph.
+
+        Args:
+            city_id (int): ID of the city the extension starts from.
+            legs (int): Number of legs still available.
+            radius_km (float): Deadhead radius.
+            global_best (float): Best €/km of any active offer.
+            bounds (dict): Memo of city_id -> single-leg bound for this search.
+
+        Returns:
+            float: Upper bound on price per km.
+        """
+        if legs <= 0:
+            return 0
+        if legs > 1:
+            return global_best
+        if city_id not in bounds:
+            cities = [city_id] + [neighbor_id for neighbor_id, _ in self.geo_index.neighbors(city_id, radius_km)]
+            bounds[city_id] = max(self.graph.best_price_per_km(c) for c in cities)
+        return bounds[city_id]
 
     def _format_offer(self, offer):
         """Format an offer for display or further processing.
@@ -110,46 +243,51 @@ class RoutePlanner:
             dict: Formatted offer data.
         """
         try:
-            price = offer[6] or offer[10]  # price or estimated_price
-            distance = offer[9]
-            price_per_km = price / distance if price and distance else None
-            return {
-                "loading_city_id": offer[4],
-                "unloading_city_id": offer[5],
-                "distance": distance,
-                "price": offer[6],
-                "estimated_price": offer[10],
-                "price_per_km": price_per_km,
-                "lf_number": offer[7],
-                "urgency": offer[8],
-                "additional_info": offer[11]
-            }
+            return format_offer(offer)
         except Exception as e:
             logging.error(f"Error formatting offer: {e}")
             return {}
 
-    def _combine_offers(self, offer_a, offer_b):
+    def _combine_offers(self, offer_a, offer_b, deadhead_km=0.0):
         """Combine two offers into a single route.
 
         Args:
-            offer_a (tuple): First offer (A → C).
-            offer_b (tuple): Second offer (C → B).
+            offer_a (dict): First formatted offer (A → C).
+            offer_b (dict): Second formatted offer (C → B).
+            deadhead_km (float): Empty kilometres driven between the two offers.
 
         Returns:
             dict: Combined route data.
         """
+        if deadhead_km:
+            offer_b = dict(offer_b, deadhead_km=deadhead_km)
+        return self._route([offer_a, offer_b])
+
+    def _route(self, segments):
+        """Build a route from its segments.
+
+        Args:
+            segments (list): Formatted offers in driving order; a "deadhead_km"
+                entry is the empty run before that offer.
+
+        Returns:
+            dict: Route with segments, total distance including empty runs,
+                total revenue, deadhead distance and price per km.
+        """
         try:
-            total_distance = (offer_a[9] or 0) + (offer_b[9] or 0)
-            total_revenue = (offer_a[6] or offer_a[10] or 0) + (offer_b[6] or offer_b[10] or 0)
+            deadhead = sum(segment.get("deadhead_km") or 0 for segment in segments)
+            total_distance = sum(segment["distance"] or 0 for segment in segments) + deadhead
+            total_revenue = sum(segment["price"] or segment["estimated_price"] or 0 for segment in segments)
             return {
-                "segments": [self._format_offer(offer_a), self._format_offer(offer_b)],
+                "segments": segments,
                 "total_distance": total_distance,
                 "total_revenue": total_revenue,
+                "deadhead_distance": deadhead,
                 "price_per_km": total_revenue / total_distance if total_distance else 0
             }
         except Exception as e:
             logging.error(f"Error combining offers: {e}")
-            return {"segments": [], "total_distance": 0, "total_revenue": 0, "price_per_km": 0}
+            return {"segments": [], "total_distance": 0, "total_revenue": 0, "deadhead_distance": 0, "price_per_km": 0}
 
 class ConcurrentModificationException(Exception):
     """Combine two offers into a single route.
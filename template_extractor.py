@@ -0,0 +1,153 @@
+from collections import Counter
+import logging
+import re
+import threading
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(levelname)s - %(message)s",
+    handlers=[logging.FileHandler("cargobot.log"), logging.StreamHandler()]
+)
+
+KEYWORDS = r"(?:Price|Preis|Unloading|Loading|Date|Datum|Urgency|LF|EUR)\b"
+# A capitalised word, optionally followed by up to two more capitalised words
+# or lowercase particles ("Frankfurt am Main"), but never a field keyword.
+CITY = (r"[A-ZÄÖÜ][\w\-.'äöüß]*"
+        rf"(?: (?!{KEYWORDS})(?:[A-ZÄÖÜ][\w\-.'äöüß]*|am|an der|im|upon|sur|de|la))" r"{0,2}")
+PRICE = r"\d{1,3}(?:[.,' ]\d{3})*(?:[.,]\d{1,2})?|\d+(?:[.,]\d{1,2})?"
+EMAIL_ADDRESS = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+OPTIONAL_FIELDS = ("sender", "additional_info")  # every other group of a template must match
+
+# Known carrier email layouts, tried in order. Bodies arrive cleaned, i.e. on
+# a single line with whitespace collapsed, and must match a template as a
+# whole. Named groups map to offer fields; keywords match in any case, city
+# names must be capitalised.
+TEMPLATES = [
+    # "Load from Berlin to Hamburg, 595€, LF8, today, extra info"
+    ("load_from_to", re.compile(
+        rf"(?i:\bLoad from) (?P<loading_city>{CITY}) (?i:to) (?P<unloading_city>{CITY})"
+        rf"(?:, (?P<price>{PRICE}) ?(?:€|EUR))?(?:, (?P<lf_number>(?i:LF) ?\d+))?(?:, (?P<urgency>\w+))?(?:, (?P<additional_info>(?!.*(?i:\bLoad from\b)).*))?")),
+    # "Loading: Berlin Unloading: Hamburg Price: 595 EUR LF: 8 Date: today"
+    ("key_value", re.compile(
+        rf"(?i:\bLoading(?: city| place)?:) (?P<loading_city>{CITY}),? (?i:Unloading(?: city| place)?:) (?P<unloading_city>{CITY})"
+        rf"(?:,? (?i:Price:) (?P<price>{PRICE}) ?(?:€|EUR)?)?(?:,? (?i:LF|Loading meters): ?(?P<lf_number>\d+))?"
+        rf"(?:,? (?i:Date|Urgency): (?P<urgency>[\w.\-/]+))?")),
+    # "Berlin -> Hamburg 595€ LF8 today"
+    ("arrow", re.compile(
+        rf"(?:\w+: )?(?P<loading_city>{CITY}) ?(?:->|→|=>) ?(?P<unloading_city>{CITY})"
+        rf"(?:,? (?P<price>{PRICE}) ?(?:€|EUR))?(?:,? (?P<lf_number>(?i:LF) ?\d+))?(?:,? (?P<urgency>(?i:today|tomorrow|heute|morgen)))?")),
+    # "Ladung von Berlin nach Hamburg, 595 €, LF8, heute"
+    ("von_nach", re.compile(
+        rf"(?i:\bLadung von) (?P<loading_city>{CITY}) (?i:nach) (?P<unloading_city>{CITY})"
+        rf"(?:, (?P<price>{PRICE}) ?(?:€|EUR))?(?:, (?P<lf_number>(?i:LF) ?\d+))?(?:, (?P<urgency>\w+))?")),
+]
+
+def parse_price(text):
+    """Parse a price such as "1.200", "1,200.50" or "595,5".
+
+    Args:
+        text (str): Price text.
+
+    Returns:
+        float: Price or None if it cannot be parsed.
+    """
+    if not text:
+        return None
+    match = re.fullmatch(r"(.*?)(?:[.,](\d{1,2}))?", re.sub(r"[ ']", "", text))
+    whole = re.sub(r"[.,]", "", match.group(1))
+    try:
+        return float(f"{whole}.{match.group(2)}" if match.group(2) else whole)
+    except ValueError:
+        return None
+
+def normalize_lf(text):
+    """Normalize an LF number such as "lf 8" or a bare "8" to "LF8".
+
+    Args:
+        text (str): LF text.
+
+    Returns:
+        str: Normalized LF number or None.
+    """
+    digits = re.search(r"\d+", text or "")
+    return f"LF{digits.group()}" if digits else None
+
+class TemplateExtractor:
+    """Extracts offers from emails that follow a known template, without the LLM."""
+    def __init__(self, templates=None):
+        """Initialize the extractor.
+
+        Args:
+            templates (list, optional): (name, compiled pattern) pairs, defaults to TEMPLATES.
+        """
+        self.templates = list(templates or TEMPLATES)
+        self.hits = Counter()
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def add_template(self, name, pattern):
+        """Register another template.
+
+        Args:
+            name (str): Template name used in the hit counters.
+            pattern (str or re.Pattern): Pattern with loading_city and
+                unloading_city groups and any of price, lf_number, urgency,
+                sender and additional_info. It must match the whole body and
+                fill every group except sender and additional_info.
+        """
+        self.templates.append((name, re.compile(pattern)))
+
+    def extract(self, body):
+        """Extract an offer from an email body if it matches a template.
+
+        A template matches only if it covers the whole body and fills all
+        of its fields but sender and additional_info, so a body with more
+        in it than the template knows about, such as a second offer, is
+        left to the LLM.
+
+        Args:
+            body (str): Cleaned email body, without the subject.
+
+        Returns:
+            dict: Offer data shaped like the LLM output, or None if no template matches.
+        """
+        for name, pattern in self.templates:
+            match = pattern.fullmatch(body)
+            if not match:
+                continue
+            fields = match.groupdict()
+            if any(value is None for key, value in fields.items() if key not in OPTIONAL_FIELDS):
+                continue
+            sender = fields.get("sender")
+            if not sender:
+                address = EMAIL_ADDRESS.search(body)
+                sender = address.group() if address else None
+            with self._lock:
+                self.hits[name] += 1
+            return {
+                "sender": sender,
+                "loading_city": fields["loading_city"].strip(),
+                "unloading_city": fields["unloading_city"].strip(),
+                "price": parse_price(fields.get("price")),
+                "lf_number": normalize_lf(fields.get("lf_number")),
+                "urgency": fields.get("urgency"),
+                "additional_info": fields.get("additional_info")
+            }
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def stats(self):
+        """Template counters.
+
+        Returns:
+            dict: Hits per template, misses and the share of emails that skipped the LLM.
+        """
+        with self._lock:
+            matched = sum(self.hits.values())
+            total = matched + self.misses
+            return {
+                "hits": dict(self.hits),
+                "misses": self.misses,
+                "hit_ratio": matched / total if total else 0.0
+            }
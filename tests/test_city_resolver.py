@@ -0,0 +1,44 @@
+import unittest
+
+from city_resolver import CityResolver
+from database import Database
+
+class OfflineGeocoder:
+    """Stand-in for Nominatim without a network: every lookup fails and is recorded."""
+    def __init__(self):
+        self.queries = []
+
+    def geocode(self, name):
+        self.queries.append(name)
+        raise ConnectionError("network unreachable")
+
+class CityResolverTest(unittest.TestCase):
+    def setUp(self):
+        self.db = Database(":memory:")
+        self.kiel = self.db.insert_city("Kiel", "DE", 54.32, 10.14)
+        self.bonn = self.db.insert_city("Bonn", "DE", 50.74, 7.10)
+        self.ulm = self.db.insert_city("Ulm", "DE", 48.40, 9.99)
+        self.hamburg = self.db.insert_city("Hamburg", "DE", 53.55, 9.99)
+        self.geocoder = OfflineGeocoder()
+        self.resolver = CityResolver(self.db, geocoder=self.geocoder, min_interval=0)
+
+    def tearDown(self):
+        self.db.close()
+
+    def test_short_names_with_a_known_normalized_key_resolve_locally(self):
+        for name, city_id in [("kiel", self.kiel), ("Kiel ", self.kiel), ("BONN", self.bonn), ("ulm", self.ulm)]:
+            city = self.resolver.resolve(name)
+            self.assertIsNotNone(city, name)
+            self.assertEqual(city[0], city_id)
+        self.assertEqual(self.geocoder.queries, [])
+
+    def test_short_misspellings_still_go_to_the_geocoder(self):
+        self.assertIsNone(self.resolver.resolve("Kielx"))
+        self.assertEqual(self.geocoder.queries, ["Kielx"])
+
+    def test_long_misspellings_match_approximately(self):
+        self.assertEqual(self.resolver.resolve("Hamburgg")[0], self.hamburg)
+        self.assertEqual(self.geocoder.queries, [])
+
+if __name__ == "__main__":
+    unittest.main()
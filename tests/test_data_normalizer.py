@@ -0,0 +1,88 @@
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from config import config
+from data_normalizer import DataNormalizer
+from database import Database
+
+class FakeOSRM:
+    """Stand-in for routingpy's OSRM: 100 km per degree of latitude, recording every call."""
+    def __init__(self, fail_matrix=False, fail_route=False):
+        self.fail_matrix = fail_matrix
+        self.fail_route = fail_route
+        self.matrix_calls = []
+        self.route_calls = []
+
+    def matrix(self, locations, profile, sources, destinations, annotations):
+        self.matrix_calls.append(len(locations))
+        if self.fail_matrix:
+            raise RuntimeError("table service unavailable")
+        return SimpleNamespace(distances=[[self._meters(locations[i], locations[j]) for j in destinations]
+                                          for i in sources])
+
+    def route(self, locations, profile):
+        self.route_calls.append(locations)
+        if self.fail_route:
+            raise RuntimeError("route service unavailable")
+        return SimpleNamespace(distance=self._meters(*locations))
+
+    def _meters(self, a, b):
+        return abs(a[1] - b[1]) * 100000
+
+class ResolveDistancesTest(unittest.TestCase):
+    def setUp(self):
+        self.db = Database(":memory:")
+        self.cities = [self.db.get_city_by_name(name) for name in self._insert_cities(6)]
+
+    def tearDown(self):
+        self.db.close()
+
+    def _insert_cities(self, count):
+        names = [f"City {i}" for i in range(count)]
+        for i, name in enumerate(names):
+            self.db.insert_city(name, "DE", 48.0 + i, 10.0)
+        return names
+
+    def _pairs(self):
+        return [(a, b) for a in self.cities[:3] for b in self.cities[3:]]
+
+    def test_pairs_are_split_into_tables_within_the_location_limit(self):
+        router = FakeOSRM()
+        with mock.patch.dict(config, {"osrm_table_max_locations": 4}):
+            distances = DataNormalizer(self.db, router=router).resolve_distances(self._pairs())
+        self.assertGreater(len(router.matrix_calls), 1)
+        self.assertTrue(all(count <= 4 for count in router.matrix_calls))
+        self.assertEqual(router.route_calls, [])
+        self.assertEqual(len(distances), 9)
+        self.assertAlmostEqual(distances[(self.cities[0][0], self.cities[5][0])], 500)
+
+    def test_failed_table_falls_back_to_single_routes(self):
+        router = FakeOSRM(fail_matrix=True)
+        distances = DataNormalizer(self.db, router=router).resolve_distances(self._pairs())
+        self.assertEqual(len(router.matrix_calls), 1)
+        self.assertEqual(len(router.route_calls), 9)
+        self.assertAlmostEqual(distances[(self.cities[1][0], self.cities[3][0])], 200)
+
+    def test_failed_routes_leave_pairs_unresolved_and_pause_the_router(self):
+        router = FakeOSRM(fail_matrix=True, fail_route=True)
+        normalizer = DataNormalizer(self.db, router=router)
+        with mock.patch.dict(config, {"osrm_max_workers": 1}):
+            self.assertEqual(normalizer.resolve_distances(self._pairs()), {})
+        self.assertEqual(len(router.route_calls), 1)
+        self.assertEqual(normalizer.resolve_distances(self._pairs()), {})
+        self.assertEqual(len(router.matrix_calls), 1)
+
+    def test_process_offers_caches_resolved_distances(self):
+        router = FakeOSRM()
+        normalizer = DataNormalizer(self.db, router=router)
+        offers = [{"loading_city": "City 0", "unloading_city": "City 4", "price": 400},
+                  {"loading_city": "City 1", "unloading_city": "City 4", "price": 300}]
+        processed = normalizer.process_offers(offers)
+        self.assertEqual([offer["distance"] for offer in processed], [400, 300])
+        self.assertEqual(router.matrix_calls, [3])
+        normalizer.process_offers(offers)
+        self.assertEqual(router.matrix_calls, [3])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+import sqlite3
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+from database import DUPLICATE_RAW_DATA, Database
+from risk_assessor import RiskAssessor, risk_level
+
+NOW = datetime(2026, 10, 17, 12, 0)
+
+class Clock(datetime):
+    """datetime whose now() is set by the test."""
+    current = NOW
+
+    @classmethod
+    def now(cls, tz=None):
+        return cls.current
+
+class InsertBulkTest(unittest.TestCase):
+    def setUp(self):
+        self.db = Database(":memory:")
+        self.statements = []
+        self.db._write_conn.set_trace_callback(self.statements.append)
+
+    def tearDown(self):
+        self.db.close()
+
+    def _transaction_statements(self):
+        return [s for s in self.statements if s.split()[0] in ("BEGIN", "COMMIT", "ROLLBACK")]
+
+    def test_chunks_are_committed_together(self):
+        ids, failures = self.db.insert_raw_data_bulk([("whatsapp", f"line {i}") for i in range(5)], chunk_size=2)
+        self.assertEqual(failures, [])
+        self.assertEqual(len(ids), 5)
+        self.assertEqual(self.statements.count("SAVEPOINT bulk_chunk"), 3)
+        self.assertEqual(self._transaction_statements(), ["BEGIN", "COMMIT"])
+
+    def test_failing_row_is_rolled_back_alone(self):
+        self.db.insert_raw_data("whatsapp", "line 3")
+        ids, failures = self.db.insert_raw_data_bulk([("whatsapp", f"line {i}") for i in range(5)], chunk_size=2)
+        self.assertEqual(failures, [(3, DUPLICATE_RAW_DATA)])
+        self.assertEqual(sum(raw_id is not None for raw_id in ids), 4)
+        self.assertEqual(self.db.cursor.execute("SELECT COUNT(*) FROM raw_data").fetchone()[0], 5)
+
+class CityOfferCountsTest(unittest.TestCase):
+    def setUp(self):
+        self.db = Database(":memory:")
+        self.berlin = self.db.insert_city("Berlin", "DE", 52.52, 13.40)
+        self.hamburg = self.db.insert_city("Hamburg", "DE", 53.55, 9.99)
+        self.clock = mock.patch("database.datetime", Clock)
+        self.clock.start()
+        # Around the cutoff seven days back at noon: before it on its day, after it, and whole days later.
+        for hours in (240, 169, 167, 72, 1):
+            Clock.current = NOW - timedelta(hours=hours)
+            self.db.insert_offers_bulk([
+                {"source": "email", "loading_city_id": self.berlin, "unloading_city_id": self.hamburg,
+                 "price": 500, "lf_number": f"LF{hours}", "raw_message": None},
+                {"source": "email", "loading_city_id": self.berlin, "unloading_city_id": self.hamburg,
+                 "price": 600, "lf_number": f"LF{hours}", "raw_message": None},
+            ])
+            self.db.insert_offer("whatsapp", "g", self.hamburg, self.berlin, price=700, lf_number=f"LF{hours}")
+        Clock.current = NOW
+
+    def tearDown(self):
+        self.clock.stop()
+        self.db.close()
+
+    def _expected(self, city_id, days=7):
+        return self.db.cursor.execute("SELECT COUNT(*) FROM offers WHERE loading_city_id = ? AND timestamp >= ?",
+                                      (city_id, NOW - timedelta(days=days))).fetchone()[0]
+
+    def test_counts_match_the_offers_across_the_cutoff_day(self):
+        self.assertEqual(self._expected(self.berlin), 6)
+        self.assertEqual(self._expected(self.hamburg), 3)
+        for days in (1, 3, 7, 10, 11):
+            expected = {city_id: self._expected(city_id, days) for city_id in (self.berlin, self.hamburg)}
+            self.assertEqual(self.db.count_offers_from_cities([self.berlin, self.hamburg], days), expected)
+            for city_id, count in expected.items():
+                self.assertEqual(self.db.count_offers_from_city(city_id, days), count)
+
+    def test_deleted_offers_are_no_longer_counted(self):
+        with self.db._writer() as cursor:
+            cursor.execute("DELETE FROM offers WHERE loading_city_id = ? AND lf_number = 'LF72'", (self.berlin,))
+        self.assertEqual(self.db.count_offers_from_city(self.berlin), self._expected(self.berlin))
+
+    def test_failing_count_update_rolls_the_offers_back(self):
+        before = self.db.count_offers_from_cities([self.berlin])
+        offers = [{"source": "email", "loading_city_id": self.berlin, "unloading_city_id": self.hamburg,
+                   "price": 800, "lf_number": f"LF9{i}"} for i in range(5)]
+        with mock.patch.object(self.db, "_count_new_offers", side_effect=sqlite3.OperationalError("disk I/O error")):
+            ids, failures = self.db.insert_offers_bulk(offers, chunk_size=2)
+        self.assertEqual(ids, [None] * 5)
+        self.assertEqual(len(failures), 5)
+        self.assertEqual(self._expected(self.berlin), 6)
+        self.assertEqual(self.db.count_offers_from_cities([self.berlin]), before)
+
+    def test_return_load_risks_follow_the_counts(self):
+        assessor = RiskAssessor(self.db)
+        risks = assessor.assess_return_load_risks([self.berlin, self.hamburg])
+        self.assertEqual(risks, {self.berlin: risk_level(6), self.hamburg: risk_level(3)})
+        self.assertEqual(risks, {self.berlin: "Medium", self.hamburg: "Medium"})
+        for city_id, risk in risks.items():
+            self.assertEqual(assessor.assess_return_load_risk(city_id), risk)
+
+if __name__ == "__main__":
+    unittest.main()
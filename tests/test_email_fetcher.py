@@ -0,0 +1,116 @@
+import threading
+import time
+import unittest
+from concurrent.futures import Future
+from unittest import mock
+
+from config import config
+from database import Database
+from email_fetcher import EmailFetcher
+
+class FakeIMAP:
+    """Stand-in for an imaplib client over one folder, with a delay on every UID FETCH."""
+    def __init__(self, uids, uidvalidity=7, delay=0.05):
+        self.messages = {uid: f"Subject: Load {uid}\r\n\r\nTruck wanted, ref {uid}\r\n".encode() for uid in uids}
+        self.uidvalidity = uidvalidity
+        self.delay = delay
+        self.fetches = []  # (UID set, start time, end time) per FETCH
+
+    def select(self, folder, readonly=False):
+        return "OK", [str(len(self.messages)).encode()]
+
+    def response(self, code):
+        return code, [str(self.uidvalidity).encode()]
+
+    def uid(self, command, *args):
+        if command == "SEARCH":
+            low = int(args[1].split()[1].split(":")[0])
+            found = [uid for uid in sorted(self.messages) if uid >= low] or [max(self.messages)]
+            return "OK", [b" ".join(str(uid).encode() for uid in found)]
+        start = time.monotonic()
+        time.sleep(self.delay)
+        data = []
+        for uid in self._uids(args[0]):
+            data.append((f"{uid} (UID {uid} BODY[] {{{len(self.messages[uid])}}}".encode(), self.messages[uid]))
+            data.append(b")")
+        self.fetches.append((args[0], start, time.monotonic()))
+        return "OK", data
+
+    def logout(self):
+        pass
+
+    def _uids(self, message_set):
+        uids = []
+        for part in message_set.split(","):
+            first, _, last = part.partition(":")
+            uids.extend(range(int(first), int(last or first) + 1))
+        return [uid for uid in uids if uid in self.messages]
+
+class FakeEngine:
+    """Stand-in for the shared LLM engine: one offer per body, failing batches that mention a given ref."""
+    def __init__(self, fail_ref=None):
+        self.fail_ref = fail_ref
+        self.submits = []  # (bodies, time) per batch
+        self._lock = threading.Lock()
+
+    def submit(self, bodies):
+        with self._lock:
+            self.submits.append((bodies, time.monotonic()))
+        future = Future()
+        if self.fail_ref and any(f"ref {self.fail_ref}" in body for body in bodies):
+            future.set_exception(RuntimeError("malformed reply"))
+        else:
+            future.set_result([{"lf_number": body.rsplit(" ", 1)[-1]} for body in bodies])
+        return future
+
+class StreamEmailsTest(unittest.TestCase):
+    def setUp(self):
+        self.db = Database(":memory:")
+        self.settings = mock.patch.dict(config, {"email_fetch_chunk": 2, "llm_max_batch": 2,
+                                                 "email_folders": ["INBOX"]})
+        self.settings.start()
+
+    def tearDown(self):
+        self.settings.stop()
+        self.db.close()
+
+    def _stream(self, mail, engine):
+        with mock.patch("email_fetcher.get_llm_engine", return_value=engine):
+            return list(EmailFetcher(self.db, mail=mail).stream_emails())
+
+    def test_every_message_is_fetched_in_chunks_and_extracted(self):
+        mail = FakeIMAP(range(1, 7))
+        engine = FakeEngine()
+        offers = self._stream(mail, engine)
+        self.assertEqual(sorted(parsed["lf_number"] for parsed, _ in offers), [str(uid) for uid in range(1, 7)])
+        self.assertTrue(all(parsed["source"] == "email" for parsed, _ in offers))
+        self.assertEqual([message_set for message_set, _, _ in mail.fetches], ["1:2", "3:4", "5:6"])
+        self.assertTrue(all(len(bodies) <= 2 for bodies, _ in engine.submits))
+        self.assertEqual(self.db.get_email_sync_state("INBOX"), (7, 6))
+
+    def test_extraction_starts_before_the_last_fetch_ends(self):
+        mail = FakeIMAP(range(1, 9))
+        engine = FakeEngine()
+        self._stream(mail, engine)
+        _, _, last_fetch_end = mail.fetches[-1]
+        self.assertLess(engine.submits[0][1], last_fetch_end)
+
+    def test_failed_batch_keeps_the_sync_mark_below_it(self):
+        mail = FakeIMAP(range(1, 7))
+        offers = self._stream(mail, FakeEngine(fail_ref=3))
+        self.assertEqual(sorted(parsed["lf_number"] for parsed, _ in offers), ["1", "2", "5", "6"])
+        self.assertEqual(self.db.get_email_sync_state("INBOX"), (7, 2))
+        offers = self._stream(mail, FakeEngine())
+        self.assertEqual(sorted(parsed["lf_number"] for parsed, _ in offers), ["3", "4"])
+        self.assertEqual(self.db.get_email_sync_state("INBOX"), (7, 6))
+
+    def test_mails_recurring_word_for_word_are_told_apart_by_message_id(self):
+        mail = FakeIMAP(range(1, 3))
+        mail.messages = {uid: f"Message-ID: <{uid}@fracht.test>\r\nSubject: Daily load\r\n\r\nTruck wanted, ref 9\r\n"
+                         .encode() for uid in mail.messages}
+        offers = self._stream(mail, FakeEngine())
+        self.assertEqual(len(offers), 2)
+        self.assertEqual(self.db.cursor.execute("SELECT COUNT(*) FROM raw_data").fetchone()[0], 2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest import mock
+
+from config import config
+from data_normalizer import DataNormalizer
+from database import Database
+from ingest import IngestPipeline
+
+class FakeOSRM:
+    """Stand-in for routingpy's OSRM: 100 km per degree of latitude."""
+    def matrix(self, locations, profile, sources, destinations, annotations):
+        return SimpleNamespace(distances=[[abs(locations[i][1] - locations[j][1]) * 100000 for j in destinations]
+                                          for i in sources])
+
+    def route(self, locations, profile):
+        return SimpleNamespace(distance=abs(locations[0][1] - locations[1][1]) * 100000)
+
+class ThreeDaysAgo(datetime):
+    """datetime whose now() lies three days back, beyond the dedup window."""
+    @classmethod
+    def now(cls, tz=None):
+        return datetime.now(tz) - timedelta(days=3)
+
+class WhatsAppIngestTest(unittest.TestCase):
+    def setUp(self):
+        self.db = Database(":memory:")
+        self.db.insert_city("Berlin", "DE", 52.52, 13.40)
+        self.db.insert_city("Hamburg", "DE", 53.55, 9.99)
+        self.workdir = tempfile.TemporaryDirectory()
+        self.export = os.path.join(self.workdir.name, "chat.txt")
+        open(self.export, "w").close()
+        self.settings = mock.patch.dict(config, {"whatsapp_export_path": self.export})
+        self.settings.start()
+
+    def tearDown(self):
+        self.settings.stop()
+        self.workdir.cleanup()
+        self.db.close()
+
+    def _post(self, day):
+        with open(self.export, "a", encoding="utf-8") as f:
+            f.write(f"{day}.10.26, 09:00 - [Fracht DE] Load from Berlin to Hamburg, 595€, LF8\n")
+
+    def _run(self):
+        pipeline = IngestPipeline(self.db, normalizer=DataNormalizer(self.db, router=FakeOSRM()), linger=0)
+        return pipeline.run(["whatsapp"])["inserted"]
+
+    def test_offer_posted_again_after_the_dedup_window_is_inserted(self):
+        self._post(14)
+        with mock.patch("database.datetime", ThreeDaysAgo):
+            self.assertEqual(self._run(), 1)
+        self._post(17)
+        self.assertEqual(self._run(), 1)
+        self.assertEqual(self.db.cursor.execute("SELECT COUNT(*) FROM offers").fetchone()[0], 2)
+
+    def test_messages_read_again_are_skipped(self):
+        self._post(14)
+        with mock.patch("database.datetime", ThreeDaysAgo):
+            self.assertEqual(self._run(), 1)
+        self.db.cursor.execute("DELETE FROM file_checkpoints")
+        self.db.conn.commit()
+        self.assertEqual(self._run(), 0)
+        self.assertEqual(self.db.cursor.execute("SELECT COUNT(*) FROM raw_data").fetchone()[0], 1)
+
+    def test_failed_insert_leaves_the_checkpoint_before_the_batch(self):
+        self._post(14)
+        self._post(15)
+        insert_offers_bulk = self.db.insert_offers_bulk
+
+        def locked(offers):
+            with mock.patch.object(self.db, "_writer", side_effect=sqlite3.OperationalError("database is locked")):
+                return insert_offers_bulk(offers)
+
+        with mock.patch.object(self.db, "insert_offers_bulk", side_effect=locked):
+            self.assertEqual(self._run(), 0)
+        self.assertIsNone(self.db.get_file_checkpoint(os.path.abspath(self.export)))
+        self.assertEqual(self._run(), 1)
+        self.assertEqual(self.db.cursor.execute("SELECT COUNT(*) FROM raw_data").fetchone()[0], 2)
+
+    def test_unresolved_offer_holds_the_checkpoint_back(self):
+        with open(self.export, "a", encoding="utf-8") as f:
+            f.write("14.10.26, 09:00 - [Fracht DE] Load from Nowhere to Hamburg, 595€, LF8\n")
+        self._post(15)
+        with mock.patch("city_resolver.get_geolocator", side_effect=ConnectionError("offline")):
+            self.assertEqual(self._run(), 1)
+        self.assertIsNone(self.db.get_file_checkpoint(os.path.abspath(self.export)))
+
+if __name__ == "__main__":
+    unittest.main()
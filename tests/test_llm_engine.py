@@ -0,0 +1,110 @@
+import asyncio
+import json
+import re
+import tempfile
+import unittest
+from unittest import mock
+
+from config import config
+from gpt_api import ResponseCache, estimate_tokens, pack_batches
+from llm_engine import LLMEngine, LLMRequestError
+
+class FakeLLM:
+    """Stand-in LLM client: one offer per email, garbling every reply that covers a "garbled" email."""
+    model = "fake"
+
+    def __init__(self, failures=0):
+        self.failures = failures  # calls that raise before the client starts answering
+        self.prompts = []
+
+    def complete(self, prompt, max_tokens):
+        self.prompts.append(prompt)
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("connection reset")
+        emails = self._emails(prompt)
+        if any("garbled" in body for _, body in emails):
+            return '[{"index": 0, "loading_city": '
+        return json.dumps([{"index": int(index), "lf_number": body} for index, body in emails])
+
+    def batch_sizes(self):
+        return [len(self._emails(prompt)) for prompt in self.prompts]
+
+    def _emails(self, prompt):
+        return re.findall(r"Email (\d+):\n(.*?)(?=\n---\n|\n\nProvide the output)", prompt, re.DOTALL)
+
+class PackBatchesTest(unittest.TestCase):
+    def test_batches_stay_within_the_token_budget(self):
+        bodies = ["x" * 396] * 7  # 100 estimated tokens each
+        self.assertEqual(pack_batches(bodies, token_budget=250, max_batch=20), [[0, 1], [2, 3], [4, 5], [6]])
+
+    def test_batches_stay_within_the_email_limit(self):
+        self.assertEqual(pack_batches(["a", "b", "c", "d", "e"], token_budget=3000, max_batch=2),
+                         [[0, 1], [2, 3], [4]])
+
+    def test_oversized_email_gets_a_batch_of_its_own(self):
+        bodies = ["short", "x" * 4000, "short"]
+        self.assertGreater(estimate_tokens(bodies[1]), 250)
+        self.assertEqual(pack_batches(bodies, token_budget=250, max_batch=20), [[0], [1], [2]])
+
+class LLMEngineTest(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.cache = ResponseCache(self.cache_dir.name)
+        self.patches = [mock.patch("llm_engine.get_response_cache", return_value=self.cache),
+                        mock.patch.dict(config, {"llm_token_budget": 3000, "llm_max_batch": 4})]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in reversed(self.patches):
+            patch.stop()
+        self.cache_dir.cleanup()
+
+    def _engine(self, client, max_retries=2):
+        return LLMEngine(client=client, max_in_flight=2, requests_per_minute=0, tokens_per_minute=0,
+                         max_retries=max_retries, retry_base_delay=0, timeout=5)
+
+    def test_emails_are_parsed_in_packed_batches(self):
+        client = FakeLLM()
+        bodies = [f"LF{i}" for i in range(10)]
+        results = asyncio.run(self._engine(client).parse_emails(bodies))
+        self.assertEqual([result["lf_number"] for result in results], bodies)
+        self.assertEqual(sorted(client.batch_sizes()), [2, 4, 4])
+
+    def test_malformed_reply_is_bisected_down_to_the_bad_email(self):
+        client = FakeLLM()
+        bodies = ["LF0", "LF1 garbled", "LF2", "LF3"]
+        results = asyncio.run(self._engine(client).parse_emails(bodies))
+        self.assertEqual([result and result["lf_number"] for result in results], ["LF0", None, "LF2", "LF3"])
+        self.assertEqual(sorted(client.batch_sizes()), [1, 1, 2, 2, 4])
+
+    def test_failed_requests_are_retried(self):
+        client = FakeLLM(failures=2)
+        engine = self._engine(client)
+        results = asyncio.run(engine.parse_emails(["LF1"]))
+        self.assertEqual(results[0]["lf_number"], "LF1")
+        self.assertEqual(engine.stats(), {"requests": 3, "retries": 2, "failures": 0})
+
+    def test_request_error_after_the_last_retry(self):
+        engine = self._engine(FakeLLM(failures=3), max_retries=1)
+        with self.assertRaises(LLMRequestError):
+            asyncio.run(engine.parse_emails(["LF1"]))
+        self.assertEqual(engine.stats(), {"requests": 2, "retries": 1, "failures": 1})
+
+    def test_cached_results_skip_the_llm(self):
+        client = FakeLLM()
+        asyncio.run(self._engine(client).parse_emails(["LF1", "LF2"]))
+        self.assertEqual(len(client.prompts), 1)
+        results = asyncio.run(self._engine(client).parse_emails(["LF2", "LF3", "LF1"]))
+        self.assertEqual([result["lf_number"] for result in results], ["LF2", "LF3", "LF1"])
+        self.assertEqual(client.batch_sizes(), [2, 1])
+        self.assertEqual(self.cache.hits, 2)
+
+    def test_cache_keys_depend_on_the_model(self):
+        self.cache.put(self.cache.key("fake", "LF1"), {"lf_number": "LF1"})
+        self.assertEqual(self.cache.get(self.cache.key("fake", "LF1")), (True, {"lf_number": "LF1"}))
+        self.assertEqual(self.cache.get(self.cache.key("other", "LF1")), (False, None))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import io
+import unittest
+from contextlib import redirect_stdout
+
+from database import Database
+from route_planner import RoutePlanner
+from ui import display_route
+
+class FindSingleLoadAToBTest(unittest.TestCase):
+    def setUp(self):
+        self.db = Database(":memory:")
+        self.berlin = self.db.insert_city("Berlin", "DE", 52.52, 13.40)
+        self.hamburg = self.db.insert_city("Hamburg", "DE", 53.55, 9.99)
+        self.bremen = self.db.insert_city("Bremen", "DE", 53.08, 8.80)
+        self.cologne = self.db.insert_city("Cologne", "DE", 50.94, 6.96)
+
+    def tearDown(self):
+        self.db.close()
+
+    def test_direct_offers_are_routes(self):
+        self.db.insert_offer("email", "a", self.berlin, self.hamburg, price=600, distance=290)
+        routes = RoutePlanner(self.db).find_single_load_a_to_b(self.berlin, self.hamburg)
+        self.assertEqual(len(routes), 1)
+        self.assertEqual(len(routes[0]["segments"]), 1)
+        self.assertEqual(routes[0]["total_distance"], 290)
+        self.assertEqual(routes[0]["total_revenue"], 600)
+
+    def test_indirect_route(self):
+        self.db.insert_offer("email", "a", self.berlin, self.hamburg, price=600, distance=290)
+        self.db.insert_offer("email", "b", self.hamburg, self.cologne, price=800, distance=430)
+        routes = RoutePlanner(self.db).find_single_load_a_to_b(self.berlin, self.cologne)
+        self.assertEqual(len(routes), 1)
+        route = routes[0]
+        self.assertEqual([s["unloading_city_id"] for s in route["segments"]], [self.hamburg, self.cologne])
+        self.assertEqual(route["total_distance"], 720)
+        self.assertEqual(route["total_revenue"], 1400)
+        self.assertEqual(route["deadhead_distance"], 0)
+        output = io.StringIO()
+        with redirect_stdout(output):
+            display_route(route, self.db)
+        self.assertIn("720.0 km", output.getvalue())
+        self.assertNotIn("Error", output.getvalue())
+
+    def test_indirect_route_counts_empty_run(self):
+        self.db.insert_offer("email", "a", self.berlin, self.hamburg, price=600, distance=290)
+        self.db.insert_offer("email", "b", self.bremen, self.cologne, price=800, distance=320)
+        routes = RoutePlanner(self.db).find_single_load_a_to_b(self.berlin, self.cologne)
+        self.assertEqual(len(routes), 1)
+        route = routes[0]
+        deadhead = route["segments"][1]["deadhead_km"]
+        self.assertGreater(deadhead, 50)
+        self.assertAlmostEqual(route["deadhead_distance"], deadhead)
+        self.assertAlmostEqual(route["total_distance"], 290 + deadhead + 320)
+        self.assertAlmostEqual(route["price_per_km"], 1400 / route["total_distance"])
+
+    def test_no_route(self):
+        self.db.insert_offer("email", "a", self.berlin, self.hamburg, price=600, distance=290)
+        self.assertEqual(RoutePlanner(self.db).find_single_load_a_to_b(self.berlin, self.cologne), [])
+
+if __name__ == "__main__":
+    unittest.main()
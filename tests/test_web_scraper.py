@@ -0,0 +1,97 @@
+import threading
+import unittest
+from types import SimpleNamespace
+
+from database import Database
+from web_scraper import PageStates, WebCrawler
+
+URL = "http://fracht.test/offers"
+
+def page(offers, pages=3):
+    """Result page with one offer row per (loading city, unloading city) pair and links to every page."""
+    rows = "".join(f"<tr><td>1</td><td>DE, {a}</td><td>DE, {b}</td><td>500 EUR</td><td>today</td></tr>"
+                   for a, b in offers)
+    links = "".join(f'<a href="?page={number}">{number}</a>' for number in range(1, pages + 1))
+    return f"<html><body><table><tr><th>#</th></tr>{rows}</table>{links}</body></html>".encode()
+
+class FakeSession:
+    """Stand-in for requests.Session serving pages by URL, answering 304 when the ETag still matches."""
+    def __init__(self, pages, etags=True):
+        self.pages = pages
+        self.etags = etags
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def get(self, url, headers=None, timeout=None):
+        body = self.pages[url]
+        etag = f'"{hash(body)}"' if self.etags else None
+        with self._lock:
+            self.requests.append((url, dict(headers or {})))
+        if etag and (headers or {}).get("If-None-Match") == etag:
+            return self._response(304, b"", etag)
+        return self._response(200, body, etag)
+
+    def _response(self, status_code, content, etag):
+        return SimpleNamespace(status_code=status_code, content=content,
+                               headers={"ETag": etag} if etag else {}, raise_for_status=lambda: None)
+
+class WebCrawlerTest(unittest.TestCase):
+    def setUp(self):
+        self.db = Database(":memory:")
+        self.pages = {URL: page([("Berlin", "Hamburg")]),
+                      f"{URL}?page=2": page([("Bremen", "Cologne")]),
+                      f"{URL}?page=3": page([("Munich", "Leipzig"), ("Dresden", "Kiel")])}
+
+    def tearDown(self):
+        self.db.close()
+
+    def _crawler(self, session):
+        return WebCrawler(self.db, session=session, max_workers=2)
+
+    def test_first_crawl_parses_every_page(self):
+        offers = self._crawler(FakeSession(self.pages)).crawl(URL)
+        self.assertEqual([offer["loading_city"] for offer in offers], ["Berlin", "Bremen", "Munich", "Dresden"])
+        self.assertEqual(offers[0]["raw_message"], "1 | DE, Berlin | DE, Hamburg | 500 EUR | today")
+        self.assertEqual(self.db.get_web_page_state(URL)[3], 3)
+
+    def test_not_modified_pages_are_skipped(self):
+        session = FakeSession(self.pages)
+        self._crawler(session).crawl(URL)
+        crawler = self._crawler(session)
+        self.assertEqual(crawler.crawl(URL), [])
+        self.assertEqual(crawler.stats(), {"fetched": 3, "not_modified": 3, "unchanged": 0})
+        self.assertTrue(all("If-None-Match" in headers for _, headers in session.requests[3:]))
+
+    def test_unchanged_pages_without_validators_are_not_parsed(self):
+        session = FakeSession(self.pages, etags=False)
+        self._crawler(session).crawl(URL)
+        self.pages[f"{URL}?page=2"] = page([("Bremen", "Rostock")])
+        crawler = self._crawler(session)
+        offers = crawler.crawl(URL)
+        self.assertEqual([offer["unloading_city"] for offer in offers], ["Rostock"])
+        self.assertEqual(crawler.stats(), {"fetched": 3, "not_modified": 0, "unchanged": 2})
+
+    def test_page_states_are_stored_only_once_acknowledged(self):
+        session = FakeSession(self.pages)
+        crawler = self._crawler(session)
+        page_states = PageStates(crawler)
+        self.assertEqual(len(crawler.crawl(URL, page_states)), 4)
+        page_states.save()
+        self.assertIsNone(self.db.get_web_page_state(URL))
+        self.assertEqual(len(crawler.crawl(URL, page_states)), 4)
+        page_states.ack()
+        page_states.save()
+        self.assertEqual(crawler.crawl(URL), [])
+        self.assertEqual(crawler.stats()["not_modified"], 3)
+
+    def test_held_page_states_are_not_stored(self):
+        crawler = self._crawler(FakeSession(self.pages))
+        page_states = PageStates(crawler)
+        crawler.crawl(URL, page_states)
+        page_states.hold()
+        page_states.ack()
+        page_states.save()
+        self.assertIsNone(self.db.get_web_page_state(URL))
+
+if __name__ == "__main__":
+    unittest.main()
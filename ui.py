@@ -1,5 +1,6 @@
 from colorama import init, Fore, Style
 import logging
+import sys
 
 init()
 
@@ -39,55 +40,104 @@ def display_database_menu():
     print("0. Back to main menu")
     return input("Enter your choice (0-4): ")
 
-def display_offer(offer, db):
-    """Display a single offer in a formatted way.
+def city_names(offers, db):
+    """Look up the city names of many offers with one batched query.
 
     Args:
-        offer (dict): Offer data.
+        offers (iterable): Offer dicts with loading_city_id and unloading_city_id.
         db (Database): Database instance for city lookups.
+
+    Returns:
+        dict: City ID -> city name.
+    """
+    ids = set()
+    for offer in offers:
+        ids.add(offer.get("loading_city_id"))
+        ids.add(offer.get("unloading_city_id"))
+    return {city_id: city[1] for city_id, city in db.get_cities_by_ids(ids).items()}
+
+def render_offer(offer, names):
+    """Render a single offer as one colored line.
+
+    Args:
+        offer (dict): Offer data.
+        names (dict): City ID -> city name.
+
+    Returns:
+        str: Formatted line.
     """
     try:
-        loading_city = db.get_city_by_id(offer["loading_city_id"])[1]
-        unloading_city = db.get_city_by_id(offer["unloading_city_id"])[1]
         price = offer["price"] or offer["estimated_price"]
         distance = offer["distance"]
         price_per_km = offer["price_per_km"]
         color = Fore.GREEN if price_per_km and price_per_km >= 2.0 else Fore.YELLOW if price_per_km and price_per_km >= 1.5 else Fore.RED
-        print(f"{color}{loading_city} → {unloading_city}", end=" ")
+        parts = [f"{color}{names[offer['loading_city_id']]} → {names[offer['unloading_city_id']]}"]
         if distance:
-            print(f"({distance:.1f} km)", end=" ")
+            parts.append(f"({distance:.1f} km)")
         if price:
-            print(f"- {price}€", end=" ")
+            parts.append(f"- {price}€")
         if price_per_km:
-            print(f"({price_per_km:.2f} €/km)", end=" ")
+            parts.append(f"({price_per_km:.2f} €/km)")
         if offer["lf_number"]:
-            print(f"LF: {offer['lf_number']}", end=" ")
+            parts.append(f"LF: {offer['lf_number']}")
         if offer["urgency"]:
-            print(f"Urgency: {offer['urgency']}", end=" ")
+            parts.append(f"Urgency: {offer['urgency']}")
+        line = " ".join(parts) + " "
         if offer["additional_info"]:
-            print(f"Info: {offer['additional_info']}", end="")
-        print(f"{Style.RESET_ALL}")
+            line += f"Info: {offer['additional_info']}"
+        return f"{line}{Style.RESET_ALL}"
     except Exception as e:
         logging.error(f"Error displaying offer: {e}")
-        print(f"{Fore.RED}Error displaying offer.{Style.RESET_ALL}")
+        return f"{Fore.RED}Error displaying offer.{Style.RESET_ALL}"
+
+def display_offers(offers, db, names=None):
+    """Display many offers, resolving their city names in one batch and printing them in one write.
+
+    Args:
+        offers (list): Offer dicts.
+        db (Database): Database instance for city lookups.
+        names (dict, optional): City ID -> city name already looked up.
+    """
+    if not offers:
+        return
+    names = names if names is not None else city_names(offers, db)
+    sys.stdout.write("".join(render_offer(offer, names) + "\n" for offer in offers))
+    sys.stdout.flush()
+
+def display_offer(offer, db, names=None):
+    """Display a single offer in a formatted way.
+
+    Args:
+        offer (dict): Offer data.
+        db (Database): Database instance for city lookups.
+        names (dict, optional): City ID -> city name already looked up,
+            e.g. with city_names for a whole listing.
+    """
+    display_offers([offer], db, names)
 
-def display_route(route, db):
+def display_route(route, db, names=None):
     """Display a route with all segments.
 
     Args:
         route (dict): Route data with segments.
         db (Database): Database instance for city lookups.
+        names (dict, optional): City ID -> city name already looked up.
     """
     try:
         if not route or not route["segments"]:
             print(f"{Fore.YELLOW}No route found!{Style.RESET_ALL}")
             return
+        names = names if names is not None else city_names(route["segments"], db)
         total_price_per_km = route["total_revenue"] / route["total_distance"] if route["total_distance"] else 0
         color = Fore.GREEN if total_price_per_km >= 2.0 else Fore.YELLOW if total_price_per_km >= 1.5 else Fore.RED
-        print(f"\n{color}Total: {route['total_distance']:.1f} km, {route['total_revenue']}€ "
-              f"({total_price_per_km:.2f} €/km){Style.RESET_ALL}")
+        lines = [f"\n{color}Total: {route['total_distance']:.1f} km, {route['total_revenue']}€ "
+                 f"({total_price_per_km:.2f} €/km){Style.RESET_ALL}"]
         for seg in route["segments"]:
-            display_offer(seg, db)
+            if seg.get("deadhead_km"):
+                lines.append(f"  ... empty run {seg['deadhead_km']:.1f} km")
+            lines.append(render_offer(seg, names))
+        sys.stdout.write("\n".join(lines) + "\n")
+        sys.stdout.flush()
     except Exception as e:
         logging.error(f"Error displaying route: {e}")
-        print(f"{Fore.RED}Error displaying route.{Style.RESET_ALL}")
\ No newline at end of file
+        print(f"{Fore.RED}Error displaying route.{Style.RESET_ALL}")
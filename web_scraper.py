@@ -1,5 +1,11 @@
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlencode, urljoin, urlparse, urlunparse
+from requests.adapters import HTTPAdapter
+import hashlib
 import requests
+import threading
+import weakref
 from config import config
 import logging
 
@@ -9,28 +15,236 @@ logging.basicConfig(
     handlers=[logging.FileHandler("cargobot.log"), logging.StreamHandler()]
 )
 
-def scrape_web_platform(url):
-    """Scrape the web platform to extract offers.
+try:
+    import lxml  # noqa: F401
+    PARSER = "lxml"
+except ImportError:
+    PARSER = "html.parser"
+
+# Only the offer table and the pagination links are needed from a page.
+PAGE_PARTS = SoupStrainer(["table", "a"])
+
+class PageStates:
+    """Page validators found by a crawl, held back until its offers are handled.
+
+    Storing a page's validators means it is skipped until it changes, so
+    they are only stored once the caller acknowledges that everything the
+    crawl returned was dealt with.
+    """
+    def __init__(self, crawler):
+        """Start collecting validators for a crawler.
+
+        Args:
+            crawler (WebCrawler): Crawler that stores them.
+        """
+        self.crawler = crawler
+        self.states = []
+        self.done = False
+        self.held = False
+        self._lock = threading.Lock()
+
+    def add(self, url, state):
+        """Hold back the new validators of a page."""
+        with self._lock:
+            self.states.append((url, state))
+
+    def ack(self, position=None):
+        """Mark the crawl's offers as handled.
+
+        Args:
+            position: Ignored; a crawl is acknowledged as a whole.
+        """
+        with self._lock:
+            self.done = not self.held
+
+    def hold(self, position=None):
+        """Keep the validators from being stored, as an offer of the crawl could not be stored.
+
+        Args:
+            position: Ignored; a crawl is held back as a whole.
+        """
+        with self._lock:
+            self.held = True
+            self.done = False
+
+    def save(self):
+        """Store the held-back validators once the crawl was acknowledged."""
+        with self._lock:
+            if not self.done:
+                return
+            states, self.states = self.states, []
+        for url, state in states:
+            self.crawler._set_state(url, state)
+
+class WebCrawler:
+    """Crawls the paginated offer listing of the web platform.
+
+    Pages are fetched over one pooled keep-alive session, the pages after
+    the first concurrently. Each page is requested conditionally with the
+    ETag and Last-Modified seen last time, and a page whose body checksum
+    has not changed is not parsed again.
+    """
+    def __init__(self, db=None, session=None, max_workers=None, timeout=None, max_pages=None):
+        """Initialize the crawler.
+
+        Args:
+            db (Database, optional): Database keeping page validators between
+                runs; kept in memory if not given.
+            session (requests.Session, optional): HTTP session, e.g. for a
+                local fixture server. A pooled session is created if not given.
+            max_workers (int, optional): Pages fetched concurrently.
+            timeout (float, optional): Request timeout in seconds.
+            max_pages (int, optional): Maximum number of result pages to crawl.
+        """
+        self.db = db
+        self.max_workers = max_workers or config["web_max_workers"]
+        self.timeout = timeout or config["web_timeout"]
+        self.max_pages = max_pages or config["web_max_pages"]
+        self.session = session or self._build_session()
+        self.page_states = {}
+        self.fetched = 0
+        self.not_modified = 0
+        self.unchanged = 0
+        self._lock = threading.Lock()
+
+    def crawl(self, url, page_states=None):
+        """Fetch all result pages and parse the offers on the ones that changed.
+
+        Args:
+            url (str): URL of the first result page.
+            page_states (PageStates, optional): Collects the new page
+                validators instead of storing them right away.
+
+        Returns:
+            list: Parsed offers, in page order.
+        """
+        store = page_states.add if page_states is not None else self._set_state
+        state = self._get_state(url)
+        offers, new_state, page_count = self._fetch_page(url, state, first=True)
+        if new_state is None:
+            return []
+        if page_count is None:
+            page_count = state[3] if state and state[3] else 1  # first page unchanged
+        page_count = min(page_count, self.max_pages)
+        store(url, new_state[:3] + (page_count,))
+
+        urls = [self._page_url(url, page) for page in range(2, page_count + 1)]
+        states = [self._get_state(page_url) for page_url in urls]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = list(executor.map(self._fetch_page, urls, states))
+        for page_url, (page_offers, page_state, _) in zip(urls, results):
+            offers.extend(page_offers)
+            if page_state is not None:
+                store(page_url, page_state[:3] + (None,))
+        logging.info(f"Crawled {page_count} pages of {url}: {len(offers)} offers from changed pages.")
+        return offers
+
+    def stats(self):
+        """Crawler counters.
+
+        Returns:
+            dict: Pages fetched, answered 304 Not Modified, and returned unchanged.
+        """
+        with self._lock:
+            return {"fetched": self.fetched, "not_modified": self.not_modified, "unchanged": self.unchanged}
+
+    def _fetch_page(self, url, state, first=False):
+        """Fetch one page conditionally and parse it if it changed.
+
+        Runs in worker threads, so it does not touch the database.
+
+        Args:
+            url (str): Page URL.
+            state (tuple): Stored (etag, last_modified, checksum, page_count) or None.
+            first (bool): Whether this is the first page, whose links give the page count.
+
+        Returns:
+            tuple: (offers, new (etag, last_modified, checksum) or None on
+                error, page count found on the page or None).
+        """
+        headers = {}
+        if state and state[0]:
+            headers["If-None-Match"] = state[0]
+        if state and state[1]:
+            headers["If-Modified-Since"] = state[1]
+        try:
+            response = self.session.get(url, headers=headers, timeout=self.timeout)
+            with self._lock:
+                self.fetched += 1
+            if response.status_code == 304:
+                with self._lock:
+                    self.not_modified += 1
+                return [], state[:3], None
+            response.raise_for_status()
+            checksum = hashlib.sha256(response.content).hexdigest()
+            new_state = (response.headers.get("ETag"), response.headers.get("Last-Modified"), checksum)
+            if state and state[2] == checksum:
+                with self._lock:
+                    self.unchanged += 1
+                return [], new_state, None
+            soup = BeautifulSoup(response.content, PARSER, parse_only=PAGE_PARTS)
+            return parse_offers(soup), new_state, self._page_count(soup, url) if first else None
+        except Exception as e:
+            logging.error(f"Error scraping web platform page {url}: {e}")
+            return [], None, None
+
+    def _page_count(self, soup, url):
+        """Highest page number linked from a result page."""
+        pages = 1
+        for link in soup.find_all("a", href=True):
+            values = parse_qs(urlparse(urljoin(url, link["href"])).query).get(config["web_page_param"])
+            if values and values[0].isdigit():
+                pages = max(pages, int(values[0]))
+        return pages
+
+    def _page_url(self, url, page):
+        """URL of a result page."""
+        parts = urlparse(url)
+        query = parse_qs(parts.query)
+        query[config["web_page_param"]] = [str(page)]
+        return urlunparse(parts._replace(query=urlencode(query, doseq=True)))
+
+    def _get_state(self, url):
+        """Stored validators of a page."""
+        if self.db is not None:
+            return self.db.get_web_page_state(url)
+        return self.page_states.get(url)
+
+    def _set_state(self, url, state):
+        """Store the validators of a page."""
+        if self.db is not None:
+            self.db.set_web_page_state(url, *state)
+        else:
+            self.page_states[url] = state
+
+    def _build_session(self):
+        """Keep-alive session with a connection pool sized for the workers."""
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.headers["User-Agent"] = "CargoBot"
+        return session
+
+def parse_offers(soup):
+    """Parse the offer table of a result page.
 
     Args:
-        url (str): URL of the web platform.
+        soup (BeautifulSoup): Parsed page.
 
     Returns:
-        list: List of parsed offers.
+        list: Parsed offers, each with the text of its table row as raw_message.
     """
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, "html.parser")
-        table = soup.find("table")  # Adjust based on actual HTML structure
-        if not table:
-            logging.warning("No table found on web platform.")
-            return []
-        offers = []
-        for row in table.find_all("tr")[1:]:  # Skip header row
-            cols = row.find_all("td")
-            if len(cols) < 5:
-                continue
+    table = soup.find("table")  # Adjust based on actual HTML structure
+    if not table:
+        logging.warning("No table found on web platform.")
+        return []
+    offers = []
+    for row in table.find_all("tr")[1:]:  # Skip header row
+        cols = row.find_all("td")
+        if len(cols) < 5:
+            continue
+        try:
             offers.append({
                 "source": "web",
                 "sender": "Fracht",
@@ -39,9 +253,53 @@ def scrape_web_platform(url):
                 "price": float(cols[3].text.replace(" EUR", "").replace(",", "")) if cols[3].text else None,
                 "lf_number": None,  # Not provided in table
                 "urgency": cols[4].text if cols[4].text else None,  # Load from date as urgency
-                "additional_info": None
+                "additional_info": None,
+                "raw_message": " | ".join(col.get_text(" ", strip=True) for col in cols)
             })
-        return offers
+        except (IndexError, ValueError) as e:
+            logging.warning(f"Skipping malformed web offer row: {e}")
+    return offers
+
+_crawlers = weakref.WeakKeyDictionary()
+_default_crawler = None
+_crawlers_lock = threading.Lock()
+
+def get_web_crawler(db=None):
+    """Return the process-wide WebCrawler for a database, so its session is reused.
+
+    Args:
+        db (Database, optional): Database keeping page validators.
+
+    Returns:
+        WebCrawler: Shared crawler.
+    """
+    global _default_crawler
+    with _crawlers_lock:
+        if db is None:
+            if _default_crawler is None:
+                _default_crawler = WebCrawler()
+            return _default_crawler
+        crawler = _crawlers.get(db)
+        if crawler is None:
+            crawler = WebCrawler(db)
+            _crawlers[db] = crawler
+        return crawler
+
+def scrape_web_platform(url, db=None, page_states=None):
+    """Scrape the web platform to extract offers.
+
+    Args:
+        url (str): URL of the web platform.
+        db (Database, optional): Database keeping page validators, so pages
+            unchanged since the last run are skipped across restarts.
+        page_states (PageStates, optional): Collects the new page validators
+            instead of storing them, see WebCrawler.crawl.
+
+    Returns:
+        list: List of parsed offers.
+    """
+    try:
+        return get_web_crawler(db).crawl(url, page_states)
     except Exception as e:
         logging.error(f"Error scraping web platform: {e}")
-        return []
\ No newline at end of file
+        return []
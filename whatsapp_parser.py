@@ -1,4 +1,9 @@
+import hashlib
+import io
+import mmap
+import os
 import re
+import threading
 from config import config
 import logging
 
@@ -8,6 +13,19 @@ logging.basicConfig(
     handlers=[logging.FileHandler("cargobot.log"), logging.StreamHandler()]
 )
 
+# Example format: "[Group Name] Load from Berlin to Hamburg, 595€, LF8, today, extra info"
+OFFER_PATTERN = re.compile(r"\[(.*?)\].*?from (\w+) to (\w+)(?:, (\d+)€)?(?:, (LF\d+))?(?:, (\w+))?(?:, (.*))?")
+# A line opening a new message: "[Group Name] ...", "[17.10.26, 10:15:03] ..." or "17.10.26, 10:15 - ...".
+# Any other line continues the previous message.
+MESSAGE_START = re.compile(r"\[|\d{1,2}[./-]\d{1,2}[./-]\d{2,4},? ")
+MESSAGE_START_BYTES = re.compile(MESSAGE_START.pattern.encode())
+# Separators for packing parsed fields in worker processes; lines never contain
+# a newline after decoding, and the unit separator does not appear in chat text.
+FIELD_SEP = "\x1f"
+RECORD_SEP = "\n"
+FINGERPRINT_BYTES = 1024
+CHECKPOINT_EVERY = 1000
+
 def parse_whatsapp_message(message):
     """Parse a WhatsApp message to extract offer details.
 
@@ -15,12 +33,11 @@ def parse_whatsapp_message(message):
         message (str): WhatsApp message text.
 
     Returns:
-        dict: Parsed offer data or None if parsing fails.
+        dict: Parsed offer data, with the message itself as raw_message, or
+            None if parsing fails.
     """
     try:
-        # Example format: "[Group Name] Load from Berlin to Hamburg, 595€, LF8, today, extra info"
-        pattern = r"\[(.*?)\].*?from (\w+) to (\w+)(?:, (\d+)€)?(?:, (LF\d+))?(?:, (\w+))?(?:, (.*))?"
-        match = re.search(pattern, message)
+        match = OFFER_PATTERN.search(message)
         if match:
             return {
                 "source": "whatsapp",
@@ -30,31 +47,328 @@ def parse_whatsapp_message(message):
                 "price": float(match.group(4)) if match.group(4) else None,
                 "lf_number": match.group(5) if match.group(5) else None,
                 "urgency": match.group(6) if match.group(6) else None,
-                "additional_info": match.group(7) if match.group(7) else None
+                "additional_info": match.group(7) if match.group(7) else None,
+                "raw_message": message
             }
         return None
     except Exception as e:
         logging.error(f"Error parsing WhatsApp message: {e}")
         return None
 
-def process_whatsapp_file(file_path):
+def iter_messages(f, offset=0):
+    """Read messages from an export opened in binary mode, one at a time.
+
+    Continuation lines are joined to their message with a space. A trailing
+    line without a newline is still being written and is left for the next
+    run; continuation lines at the very start (after resuming) are skipped.
+
+    Args:
+        f (file): Export file opened in binary mode and positioned at offset.
+        offset (int): Current byte offset of f.
+
+    Yields:
+        tuple: (message text, byte offset just past the message).
+    """
+    parts = []
+    end = offset
+    for line in f:
+        if not line.endswith(b"\n"):
+            break
+        text = line.decode("utf-8", errors="replace").strip().lstrip("\ufeff\u200e")
+        if MESSAGE_START.match(text):
+            if parts:
+                yield " ".join(parts), end
+            parts = [text]
+        elif parts and text:
+            parts.append(text)
+        end += len(line)
+    if parts:
+        yield " ".join(parts), end
+
+class FileCheckpoint:
+    """Resume position of one export, advanced as its messages are acknowledged.
+
+    The stored offset only moves once the caller acknowledges that the
+    messages before it were handled, and only if the file on disk is still
+    the one that was read. Once a message is held back, later
+    acknowledgements are ignored, so the next read starts before it.
+    """
+    def __init__(self, db, path, stat):
+        """Start tracking an export being read.
+
+        Args:
+            db (Database): Database holding the checkpoint, or None to keep none.
+            path (str): Absolute path of the file.
+            stat (os.stat_result): fstat of the file as it was opened.
+        """
+        self.db = db
+        self.path = path
+        self.stat = stat
+        self.offset = 0
+        self.held = False
+        self._saved = 0
+        self._lock = threading.Lock()
+
+    def ack(self, offset):
+        """Mark the file as handled up to a byte offset.
+
+        Args:
+            offset (int): Byte offset just past the handled messages, or None.
+        """
+        if offset is None:
+            return
+        with self._lock:
+            if not self.held:
+                self.offset = max(self.offset, offset)
+
+    def hold(self, offset=None):
+        """Keep the offset where it is for the rest of this read, as a message could not be stored.
+
+        Args:
+            offset (int): Byte offset just past the message, or None.
+        """
+        with self._lock:
+            self.held = True
+
+    def save(self):
+        """Store the acknowledged offset if it moved and the file was not replaced meanwhile."""
+        with self._lock:
+            offset = self.offset
+            if not self.db or offset <= self._saved:
+                return
+            self._saved = offset
+        stored = self.db.get_file_checkpoint(self.path)
+        if stored and stored[:2] == (self.stat.st_dev, self.stat.st_ino) and stored[3] >= offset:
+            return  # a later read of the same file got further already
+        try:
+            with open(self.path, "rb") as f:
+                stat = os.fstat(f.fileno())
+                if (stat.st_dev, stat.st_ino) != (self.stat.st_dev, self.stat.st_ino) or stat.st_size < offset:
+                    logging.warning(f"WhatsApp export {self.path} changed while it was read; checkpoint not saved.")
+                    return
+                _save_checkpoint(self.db, self.path, f, stat, offset)
+        except OSError as e:
+            logging.error(f"Error saving checkpoint of WhatsApp file {self.path}: {e}")
+
+def stream_whatsapp_offers(file_path, db=None, checkpoint_every=CHECKPOINT_EVERY):
+    """Parse offers from a WhatsApp export, resuming where the last run stopped.
+
+    The checkpoint only advances past messages whose offers the caller has
+    consumed, see iter_whatsapp_offers.
+
+    Args:
+        file_path (str): Path to the WhatsApp export file.
+        db (Database, optional): Database holding the checkpoint; without it
+            the whole file is read.
+        checkpoint_every (int): Messages between checkpoint writes.
+
+    Yields:
+        dict: Parsed offer data.
+    """
+    for parsed, checkpoint, offset in iter_whatsapp_offers(file_path, db, checkpoint_every):
+        if parsed:
+            yield parsed
+        checkpoint.ack(offset)
+        if parsed is None:
+            checkpoint.save()
+
+def iter_whatsapp_offers(file_path, db=None, checkpoint_every=CHECKPOINT_EVERY):
+    """Parse offers from a WhatsApp export, leaving the checkpoint to the caller.
+
+    Exports are append-only, so with a database the byte offset reached is
+    stored in file_checkpoints together with the file's identity, and the
+    next run only reads what was appended since. Every offer comes with the
+    offset just past its message; every checkpoint_every messages, and once
+    at the end, an item without an offer carries the offset reached. The
+    caller acknowledges offsets on the FileCheckpoint once it has handled
+    everything before them and calls its save() to store the checkpoint. A
+    file that was truncated or replaced by a different chat is read from the
+    start. Memory use does not depend on the file size, except on a first
+    read of a file of at least whatsapp_parallel_min_bytes with more than
+    one worker available, which is parsed with parse_whatsapp_file_parallel;
+    its offers carry no offset, only the final item does.
+
+    Args:
+        file_path (str): Path to the WhatsApp export file.
+        db (Database, optional): Database holding the checkpoint; without it
+            the whole file is read and nothing is saved.
+        checkpoint_every (int): Messages between items without an offer.
+
+    Yields:
+        tuple: (parsed offer or None, FileCheckpoint, byte offset or None).
+    """
+    path = os.path.abspath(file_path)
+    try:
+        f = open(path, "rb")
+    except OSError as e:
+        logging.error(f"Error processing WhatsApp file {file_path}: {e}")
+        return
+    with f:
+        stat = os.fstat(f.fileno())
+        checkpoint = FileCheckpoint(db, path, stat)
+        offset = _resume_offset(db, path, f, stat) if db else 0
+        if offset == 0 and stat.st_size >= config["whatsapp_parallel_min_bytes"] and _worker_count() > 1:
+            # First import of a large archive: parse it across cores instead.
+            # On a single worker the chunked parser is no faster (benchmarks/whatsapp_parse.py).
+            offers, offset = parse_whatsapp_file_parallel(path)
+            for parsed in offers:
+                yield parsed, checkpoint, None
+            yield None, checkpoint, offset
+            return
+        f.seek(offset)
+        messages = 0
+        for message, end in iter_messages(f, offset):
+            parsed = parse_whatsapp_message(message)
+            offset = end
+            messages += 1
+            if parsed:
+                yield parsed, checkpoint, offset
+            if messages % checkpoint_every == 0:
+                yield None, checkpoint, offset
+        yield None, checkpoint, offset
+        logging.info(f"Read {messages} new WhatsApp messages from {file_path}.")
+
+def process_whatsapp_file(file_path, db=None):
     """Process a WhatsApp export file to extract offers.
 
     Args:
         file_path (str): Path to the WhatsApp export file.
+        db (Database, optional): Database holding the resume checkpoint, see
+            stream_whatsapp_offers.
 
     Returns:
         list: List of parsed offers.
     """
+    return list(stream_whatsapp_offers(file_path, db))
+
+def parse_whatsapp_file_parallel(file_path, workers=None, chunks_per_worker=4):
+    """Parse a whole WhatsApp export across a process pool.
+
+    The file is memory-mapped and cut into chunks at message boundaries;
+    each worker maps the file itself and parses its byte range, so only
+    offers cross process boundaries.
+
+    Args:
+        file_path (str): Path to the WhatsApp export file.
+        workers (int, optional): Worker processes, defaults to whatsapp_workers.
+        chunks_per_worker (int): Chunks per worker, to even out uneven chunks.
+
+    Returns:
+        tuple: (offers in file order, byte offset just past the last complete message).
+    """
+    workers = workers or _worker_count()
     try:
-        with open(file_path, "r") as f:
-            messages = f.readlines()
+        with open(file_path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                return [], 0
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                bounds = _chunk_bounds(mm, size, workers * chunks_per_worker)
         offers = []
-        for msg in messages:
-            parsed = parse_whatsapp_message(msg.strip())
-            if parsed:
-                offers.append(parsed)
-        return offers
+        last = 0
+        if workers == 1 or len(bounds) == 1:
+            for start, end in bounds:
+                packed, last = _parse_chunk(file_path, start, end)
+                offers.extend(_unpack_offers(packed))
+            return offers, last
+        from concurrent.futures import ProcessPoolExecutor  # only large first imports need it
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # Results arrive in chunk order; unpacking one overlaps with parsing the next.
+            for packed, end in pool.map(_parse_chunk, [file_path] * len(bounds),
+                                        [start for start, _ in bounds], [end for _, end in bounds]):
+                offers.extend(_unpack_offers(packed))
+                last = max(last, end)
+        return offers, last
     except Exception as e:
         logging.error(f"Error processing WhatsApp file {file_path}: {e}")
-        return []
\ No newline at end of file
+        return [], 0
+
+def _worker_count():
+    """Worker processes for parallel parsing: whatsapp_workers, or one per core."""
+    return config["whatsapp_workers"] or os.cpu_count() or 1
+
+def _chunk_bounds(mm, size, chunks):
+    """Split a mapped export into byte ranges that start at the beginning of a message."""
+    bounds = []
+    start = 0
+    target = max(size // chunks, 1)
+    while start < size:
+        end = start + target
+        while end < size:
+            newline = mm.find(b"\n", end)
+            if newline < 0:
+                end = size
+                break
+            end = newline + 1
+            if MESSAGE_START_BYTES.match(mm, end):
+                break
+        end = min(end, size)
+        bounds.append((start, end))
+        start = end
+    return bounds
+
+def _parse_chunk(file_path, start, end):
+    """Parse the messages in one byte range of an export (runs in a worker process).
+
+    Returns:
+        tuple: (OFFER_PATTERN groups and message text of the offers packed
+            into one string, byte offset just past the last complete message). A single string
+            is far cheaper to send back to the parent than many small objects.
+    """
+    with open(file_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        data = io.BytesIO(mm[start:end])
+    records = []
+    last = start
+    for message, message_end in iter_messages(data, start):
+        match = OFFER_PATTERN.search(message)
+        if match:
+            records.append(FIELD_SEP.join([*(field or "" for field in match.groups()), message]))
+        last = message_end
+    return RECORD_SEP.join(records), last
+
+def _unpack_offers(packed):
+    """Turn the packed output of _parse_chunk back into offer data."""
+    if not packed:
+        return []
+    offers = []
+    for record in packed.split(RECORD_SEP):
+        sender, loading_city, unloading_city, price, lf_number, urgency, additional_info, message = record.split(FIELD_SEP)
+        offers.append({
+            "source": "whatsapp",
+            "sender": sender,
+            "loading_city": loading_city,
+            "unloading_city": unloading_city,
+            "price": float(price) if price else None,
+            "lf_number": lf_number or None,
+            "urgency": urgency or None,
+            "additional_info": additional_info or None,
+            "raw_message": message
+        })
+    return offers
+
+def _file_fingerprint(f, offset):
+    """Hash the first and last bytes before offset, identifying the processed prefix."""
+    f.seek(0)
+    head = f.read(min(FINGERPRINT_BYTES, offset))
+    f.seek(max(0, offset - FINGERPRINT_BYTES))
+    tail = f.read(min(FINGERPRINT_BYTES, offset))
+    return hashlib.sha1(head + b"\0" + tail).hexdigest()
+
+def _resume_offset(db, path, f, stat):
+    """Offset to resume reading from, or 0 if the checkpoint does not fit this file."""
+    checkpoint = db.get_file_checkpoint(path)
+    if not checkpoint:
+        return 0
+    device, inode, head_hash, offset = checkpoint
+    if offset > stat.st_size or _file_fingerprint(f, offset) != head_hash:
+        logging.info(f"WhatsApp export {path} was truncated or replaced; reading it from the start.")
+        return 0
+    if (device, inode) != (stat.st_dev, stat.st_ino):
+        logging.info(f"WhatsApp export {path} was replaced by a longer copy; resuming at byte {offset}.")
+    return offset
+
+def _save_checkpoint(db, path, f, stat, offset):
+    """Store the offset reached together with the file's identity."""
+    position = f.tell()
+    db.set_file_checkpoint(path, stat.st_dev, stat.st_ino, _file_fingerprint(f, offset), offset)
+    f.seek(position)